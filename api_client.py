@@ -1,12 +1,78 @@
+import re
 import requests
+import threading
 import time
+from urllib.parse import urlsplit
+
+import metrics
 from config import HEADERS
+from response_cache import get_response_cache
+
+_local = threading.local()
+
+HTTP_SECONDS = metrics.histogram("fetch_http_request_seconds", "Blockstream API request latency",
+                                 ("endpoint", "status"))
+HTTP_BYTES = metrics.counter("fetch_http_bytes_total", "Response bytes downloaded", ("endpoint",))
+HTTP_RETRIES = metrics.counter("fetch_http_retries_total", "Requests retried, by cause", ("reason",))
+HTTP_RETRY_WAIT = metrics.counter("fetch_http_retry_wait_seconds_total", "Seconds slept before retries",
+                                  ("reason",))
+HTTP_FAILURES = metrics.counter("fetch_http_failures_total", "Requests given up after max_retries",
+                                ("endpoint",))
+CACHE_HITS = metrics.counter("fetch_cache_hits_total", "Responses served from the response cache")
+
+_HASH = re.compile(r"/[0-9a-fA-F]{64}")
+_NUMBER = re.compile(r"/\d+")
+
+
+def endpoint_label(url):
+    """Low-cardinality metric label for a URL: /block/{hash}/txs/{n}."""
+    path = _HASH.sub("/{hash}", urlsplit(url).path)
+    return _NUMBER.sub("/{n}", path)
+
+
+def get_session():
+    """One keep-alive Session per thread, so pages reuse TCP/TLS connections."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        _local.session = session
+    return session
+
 
 def get_api_data(url, max_retries=5):
     """Fetch JSON with built-in retries, 429 detection, and exponential backoff."""
+    cache = get_response_cache()
+    if cache is None or not cache.cacheable(url):
+        return _get(url, max_retries, lambda response: response.json())
+
+    data = cache.get(url)
+    if data is not None:
+        CACHE_HITS.inc()
+        return data
+
+    def decode_and_store(response):
+        data = response.json()
+        if data:
+            cache.put(url, response.content)
+        return data
+
+    return _get(url, max_retries, decode_and_store)
+
+
+def get_api_text(url, max_retries=5):
+    """Same as get_api_data for plain-text endpoints (e.g. /block-height/{h}, /blocks/tip/height)."""
+    return _get(url, max_retries, lambda response: response.text.strip())
+
+
+def _get(url, max_retries, decode):
+    endpoint = endpoint_label(url)
     for attempt in range(max_retries):
+        start = time.perf_counter()
         try:
-            response = requests.get(url, headers=HEADERS, timeout=45)
+            response = get_session().get(url, timeout=45)
+            HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=response.status_code)
+            HTTP_BYTES.inc(len(response.content), endpoint=endpoint)
             
             # Dynamic 429 (Rate Limit) Detection
             if response.status_code == 429:
@@ -15,21 +81,28 @@ def get_api_data(url, max_retries=5):
                 wait_time = int(retry_after) if retry_after and retry_after.isdigit() else (2 ** attempt * 5)
                 
                 print(f"\n   ⚠️ Rate Limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                HTTP_RETRIES.inc(reason="rate_limited")
+                HTTP_RETRY_WAIT.inc(wait_time, reason="rate_limited")
                 time.sleep(wait_time)
                 continue # Retry the loop
             
             response.raise_for_status()
-            return response.json()
+            return decode(response)
             
         except requests.exceptions.HTTPError as e:
             print(f"\n   ❌ HTTP Error: {e}")
+            reason = "http_error"
         except (requests.exceptions.RequestException, requests.exceptions.Timeout) as e:
             print(f"\n   ❌ Connection Error: {e}")
+            reason = "connection_error"
+            HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status="error")
             
         # Standard backoff for other errors
         if attempt < max_retries - 1:
             wait_time = (attempt + 1) * 3
+            HTTP_RETRIES.inc(reason=reason)
+            HTTP_RETRY_WAIT.inc(wait_time, reason=reason)
             time.sleep(wait_time)
             
+    HTTP_FAILURES.inc(endpoint=endpoint)
     return None
-
@@ -1,86 +1,228 @@
-from flask import Flask, render_template, abort
-import psycopg2
+import time
+from flask import Flask, Response, render_template, abort, jsonify, make_response, request, g
 from psycopg2.extras import RealDictCursor
-from config import DB_CONFIG
+import metrics
+from config import EXPLORER_CONFIG, PAGE_CACHE_CONFIG
+from db_pool import get_pool, pooled_connection
+from explorer_api import api
+from explorer_data import QUERY_SECONDS, db_key, load_block, load_transaction, present
+from page_cache import get_page_cache
 
 app = Flask(__name__)
+app.register_blueprint(api)
 
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+REQUEST_SECONDS = metrics.histogram("explorer_request_seconds", "Explorer response time by route",
+                                    ("route", "status"))
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    """Route latency (streamed bodies: until headers are ready) keyed by the URL rule, not the path."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, status=response.status_code)
+    return response
+
+# Home page listing: compact projection, tx counts from the precomputed
+# bitcoin_block_stats, keyset pagination on the unique height index.
+BLOCK_LIST_COLUMNS = """
+    b.height, b.block_hash, b.timestamp, b.version, b.bits, COALESCE(s.tx_count, 0) AS tx_count
+    FROM bitcoin_blocks b
+    LEFT JOIN bitcoin_block_stats s ON s.block_hash = b.block_hash
+"""
+BLOCK_LIST_LATEST = f"SELECT {BLOCK_LIST_COLUMNS} ORDER BY b.height DESC LIMIT %s;"
+BLOCK_LIST_OLDER = f"SELECT {BLOCK_LIST_COLUMNS} WHERE b.height < %s ORDER BY b.height DESC LIMIT %s;"
+BLOCK_LIST_NEWER = f"SELECT {BLOCK_LIST_COLUMNS} WHERE b.height > %s ORDER BY b.height ASC LIMIT %s;"
+
+# Address page: totals from bitcoin_address_stats, history walked newest first
+# along the (address, height, txid) primary key with a keyset cursor.
+ADDRESS_SUMMARY = "SELECT * FROM bitcoin_address_stats WHERE address = %s;"
+ADDRESS_HISTORY_LATEST = """
+    SELECT height, txid, received_sats, spent_sats FROM bitcoin_address_txs
+    WHERE address = %s
+    ORDER BY height DESC, txid DESC LIMIT %s;
+"""
+ADDRESS_HISTORY_BEFORE = """
+    SELECT height, txid, received_sats, spent_sats FROM bitcoin_address_txs
+    WHERE address = %s AND (height, txid) < (%s, %s)
+    ORDER BY height DESC, txid DESC LIMIT %s;
+"""
+
+def page_response(entry):
+    """Serve a cached page with its ETag; 304 when the client's copy is current."""
+    if request.if_none_match.contains(entry.etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(entry.body)
+        response.mimetype = "text/html"
+    response.set_etag(entry.etag)
+    if entry.deep:
+        response.headers["Cache-Control"] = f"public, max-age={PAGE_CACHE_CONFIG['deep_max_age']}"
+    else:
+        # Near the tip (or still changing): clients revalidate with If-None-Match
+        response.headers["Cache-Control"] = "public, no-cache"
+    return response
+
+def cached_page(cache):
+    """The cached entry for this request path, if any."""
+    return cache.get(request.path) if cache is not None else None
 
 @app.route('/')
 def index():
+    limit = request.args.get('limit', EXPLORER_CONFIG['page_size'], type=int)
+    limit = max(1, min(limit, EXPLORER_CONFIG['max_page_size']))
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT * FROM bitcoin_blocks ORDER BY height DESC;")
-        blocks = cur.fetchall()
-        cur.close(); conn.close()
-        return render_template('index.html', blocks=blocks)
+        with pooled_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            # Fetch one extra row to learn whether another page exists
+            if after is not None:
+                with QUERY_SECONDS.time(query="block_list"):
+                    cur.execute(BLOCK_LIST_NEWER, (after, limit + 1))
+                    blocks = cur.fetchall()
+                has_newer = len(blocks) > limit
+                blocks = blocks[:limit][::-1]
+                has_older = True
+            else:
+                with QUERY_SECONDS.time(query="block_list"):
+                    if before is not None:
+                        cur.execute(BLOCK_LIST_OLDER, (before, limit + 1))
+                    else:
+                        cur.execute(BLOCK_LIST_LATEST, (limit + 1,))
+                    blocks = cur.fetchall()
+                has_older = len(blocks) > limit
+                blocks = blocks[:limit]
+                has_newer = before is not None
+            cur.close()
+        blocks = [present(b) for b in blocks]
+
+        older_url = newer_url = None
+        if blocks and has_older:
+            older_url = f"/?before={blocks[-1]['height']}&limit={limit}"
+        if blocks and has_newer:
+            newer_url = f"/?after={blocks[0]['height']}&limit={limit}"
+        return render_template('index.html', blocks=blocks, older_url=older_url, newer_url=newer_url)
     except Exception as e:
         return str(e), 500
 
 @app.route('/block/<block_hash>')
 def block_details(block_hash):
+    key = db_key(block_hash)
+    cache = get_page_cache()
+    entry = cached_page(cache)
+    if entry is not None:
+        return page_response(entry)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT * FROM bitcoin_blocks WHERE block_hash = %s;", (block_hash,))
-        block = cur.fetchone()
-        if not block: abort(404)
-
-        
-        cur.execute("SELECT * FROM bitcoin_transactions WHERE block_hash = %s ORDER BY tx_index ASC;", (block_hash,))
-
-        transactions = cur.fetchall()
-        cur.close(); conn.close()
-        return render_template('block_details.html', block=block, transactions=transactions)
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            block, transactions = load_block(cur, key)
+            cur.close()
+            if not block: abort(404)
+        html = render_template('block_details.html', block=block, transactions=transactions)
+        if cache is None:
+            return html
+        return page_response(cache.put(request.path, html.encode(), block['height']))
     except Exception as e:
         return str(e), 500
 
 @app.route('/tx/<txid>')
 def transaction_details(txid):
     """View details of a single transaction including Vins and Vouts."""
+    key = db_key(txid)
+    height = request.args.get('height', type=int)
+    cache = get_page_cache()
+    entry = cached_page(cache)
+    if entry is not None:
+        return page_response(entry)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # 1. Fetch transaction header
-        cur.execute("SELECT * FROM bitcoin_transactions WHERE txid = %s;", (txid,))
-        tx = cur.fetchone()
-        if not tx: abort(404)
-        
-        # 2. Fetch Outputs
-        cur.execute("SELECT * FROM bitcoin_outputs WHERE txid = %s ORDER BY output_index;", (txid,))
-        vouts = cur.fetchall()
-
-        
-        # 3. Fetch Inputs
-        cur.execute("SELECT * FROM bitcoin_inputs WHERE txid = %s ORDER BY input_index;", (txid,))
-        vins = cur.fetchall()
-
-        # 4. Fetch Witnesses
-        cur.execute("""
-            SELECT input_index, witness_index, witness_data 
-            FROM bitcoin_witnesses 
-            WHERE txid = %s 
-            ORDER BY input_index, witness_index
-        """, (txid,))
-        witness_rows = cur.fetchall()
-        
-        # Group witnesses by input_index
-        witnesses = {}
-        for row in witness_rows:
-            if row['input_index'] not in witnesses:
-                witnesses[row['input_index']] = []
-            witnesses[row['input_index']].append(row['witness_data'])
-        
-        cur.close(); conn.close()
-        return render_template('transaction_details.html', tx=tx, vouts=vouts, vins=vins, witnesses=witnesses)
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            tx, vouts, vins = load_transaction(cur, key, height)
+            cur.close()
+            if not tx: abort(404)
+        html = render_template('transaction_details.html', tx=tx, vouts=vouts, vins=vins)
+        if cache is None:
+            return html
+        # Spend status of unspent outputs changes as new blocks arrive
+        unspent = any(v['spent_by_txid'] is None and v['script_pubkey_type'] != 'op_return' for v in vouts)
+        # The page also shows its spenders, so it is as deep as the newest spending block and a rollback
+        # of that block must drop it
+        height = max([tx['block_height']] + [v['spent_height'] for v in vouts if v['spent_height'] is not None])
+        return page_response(cache.put(request.path, html.encode(), height, mutable=unspent))
+
 
+    except Exception as e:
+        return str(e), 500
 
+@app.route('/address/<address>')
+def address_details(address):
+    """Balance summary and paginated transaction history of one address."""
+    if len(address) > 100:
+        abort(404)
+    limit = request.args.get('limit', EXPLORER_CONFIG['address_page_size'], type=int)
+    limit = max(1, min(limit, EXPLORER_CONFIG['max_page_size']))
+    before = request.args.get('before', '')
+    if before:
+        # Cursor is "<height>:<txid>" of the last row on the previous page
+        height, _, txid = before.partition(':')
+        if not height.isdigit():
+            abort(404)
+        cursor_key = (int(height), db_key(txid))
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            with QUERY_SECONDS.time(query="address_summary"):
+                cur.execute(ADDRESS_SUMMARY, (address,))
+                stats = cur.fetchone()
+            history = []
+            if stats is not None:
+                with QUERY_SECONDS.time(query="address_history"):
+                    if before:
+                        cur.execute(ADDRESS_HISTORY_BEFORE, (address, *cursor_key, limit + 1))
+                    else:
+                        cur.execute(ADDRESS_HISTORY_LATEST, (address, limit + 1))
+                    history = cur.fetchall()
+            cur.close()
     except Exception as e:
         return str(e), 500
+    if stats is None:
+        abort(404)
+    has_older = len(history) > limit
+    history = [present(row) for row in history[:limit]]
+    stats['balance_sats'] = stats['received_sats'] - stats['spent_sats']
+
+    older_url = None
+    if has_older:
+        last = history[-1]
+        older_url = f"/address/{address}?before={last['height']}:{last['txid']}&limit={limit}"
+    return render_template('address.html', address=address, stats=stats, history=history,
+                           older_url=older_url, first_page=not before)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Route and query latency histograms plus pool/cache gauges, Prometheus text format."""
+    return Response(metrics.REGISTRY.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/debug/metrics')
+def metrics_snapshot():
+    """The same metrics as JSON, with per-second rates and p50/p99 bucket bounds."""
+    return jsonify(metrics.REGISTRY.snapshot())
+
+@app.route('/debug/pool')
+def pool_stats():
+    """Connection pool sizing counters: checkouts, wait and connect times."""
+    return jsonify(get_pool().stats())
+
+@app.route('/debug/cache')
+def page_cache_stats():
+    """Page cache hit ratio, entry count and memory footprint."""
+    cache = get_page_cache()
+    return jsonify(cache.snapshot() if cache is not None else {"enabled": False})
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
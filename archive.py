@@ -0,0 +1,240 @@
+import glob
+import gzip
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+from db_operations import (
+    PAGE_SIZE, begin_block_sync, flatten_transactions, insert_flattened_rows,
+    insert_transaction_batch, merge_flattened_rows
+)
+
+# Block archives are NDJSON, one file per block, compressed with gzip or zstd:
+#
+#   {"type": "header", "block": {...}}              (first line)
+#   {"type": "page", "index": 0, "txs": [...]}      (one per 25-tx page, any order)
+#
+# Files are written as <height>-<hash>.ndjson.<ext>.part and renamed only when
+# every page of the block is stored, so neither a crash nor a block left with
+# failed pages leaves a truncated archive behind. Blocks resumed from an earlier
+# run are not archived: only their missing pages would be fetched.
+
+EXTENSIONS = {"gzip": "gz", "zstd": "zst"}
+
+
+def _open_write(path, compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd archives require the zstandard package")
+        raw = open(path, "wb")
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(raw), encoding="utf-8")
+    return gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+
+
+def open_archive(path):
+    """Open an archive for reading, picking the codec from the file extension."""
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstd archives require the zstandard package")
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+
+def archive_paths(target):
+    """Expand a directory or glob into archive files, ordered by height."""
+    if os.path.isdir(target):
+        paths = glob.glob(os.path.join(target, "*.ndjson.*"))
+    else:
+        paths = glob.glob(target)
+    paths = [p for p in paths if not p.endswith(".part")]
+    return sorted(paths, key=lambda p: int(os.path.basename(p).split("-", 1)[0]))
+
+
+class ArchiveRecorder:
+    """Records fetched headers and tx pages into per-block archives.
+
+    Safe to call from several fetch threads at once.
+    """
+
+    def __init__(self, directory, compression="gzip"):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.directory = directory
+        self.compression = compression
+        self._open = {}   # block_hash -> (file, final path)
+        self._lock = threading.Lock()
+        self.blocks_written = 0
+        self.blocks_resumed = []      # heights not archived: an earlier run stored some pages
+        self.blocks_incomplete = []   # heights whose archive was dropped: pages still missing
+        os.makedirs(directory, exist_ok=True)
+
+    def record_header(self, block, missing=None):
+        """Start (or continue) the archive of a block; must precede its pages.
+
+        `missing` are the page indices this run will fetch. Unless that is every
+        page, the block is not archived. Returns whether the block is recorded.
+        """
+        with self._lock:
+            if block['id'] in self._open:
+                return True
+            if missing is not None and len(missing) < (block['tx_count'] + PAGE_SIZE - 1) // PAGE_SIZE:
+                self.blocks_resumed.append(block['height'])
+                return False
+            name = f"{block['height']}-{block['id']}.ndjson.{EXTENSIONS[self.compression]}"
+            path = os.path.join(self.directory, name)
+            f = _open_write(path + ".part", self.compression)
+            f.write(json.dumps({"type": "header", "block": block}, separators=(",", ":")) + "\n")
+            self._open[block['id']] = (f, path)
+            return True
+
+    def record_page(self, block_hash, idx, transactions):
+        line = json.dumps({"type": "page", "index": idx, "txs": transactions}, separators=(",", ":")) + "\n"
+        with self._lock:
+            entry = self._open.get(block_hash)
+            if entry is None:
+                raise RuntimeError(f"record_header() was not called for block {block_hash}")
+            entry[0].write(line)
+
+    def is_recording(self, block_hash):
+        with self._lock:
+            return block_hash in self._open
+
+    def finish_block(self, block_hash, complete=True):
+        """Publish the block's archive, or drop it when the block still has missing pages."""
+        with self._lock:
+            entry = self._open.pop(block_hash, None)
+            if entry is None:
+                return
+            f, path = entry
+            f.close()
+            if complete:
+                os.replace(path + ".part", path)
+                self.blocks_written += 1
+            else:
+                os.remove(path + ".part")
+                self.blocks_incomplete.append(int(os.path.basename(path).split("-", 1)[0]))
+
+    def close(self):
+        """Drop the archives of blocks that never completed."""
+        for block_hash in list(self._open):
+            self.finish_block(block_hash, complete=False)
+
+    def summary(self):
+        line = f"📼 Recorded {self.blocks_written} block archive(s) into {self.directory}"
+        if self.blocks_resumed:
+            line += (f"; {len(self.blocks_resumed)} resumed block(s) not archived "
+                     f"(#{', #'.join(map(str, sorted(self.blocks_resumed)))})")
+        if self.blocks_incomplete:
+            line += (f"; {len(self.blocks_incomplete)} incomplete block(s) dropped "
+                     f"(#{', #'.join(map(str, sorted(self.blocks_incomplete)))})")
+        return line
+
+
+_recorder = None
+
+
+def get_recorder():
+    """The process-wide recorder, or None when not recording."""
+    return _recorder
+
+
+def start_recording(directory, compression="gzip"):
+    global _recorder
+    _recorder = ArchiveRecorder(directory, compression)
+    return _recorder
+
+
+def read_archive(path):
+    """Return (header, {base_index: transactions}) for one archive."""
+    header, pages = None, {}
+    with open_archive(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "header":
+                header = record["block"]
+            elif record["type"] == "page":
+                pages[record["index"]] = record["txs"]
+    if header is None:
+        raise ValueError(f"{path} has no header record")
+    return header, pages
+
+
+def count_rows(transactions):
+    """Rows a page produces across the transaction/output/input/witness tables."""
+    return sum(
+        1 + len(tx.get('vout', [])) + sum(1 + len(vin.get('witness') or []) for vin in tx.get('vin', []))
+        for tx in transactions
+    )
+
+
+def replay_archive(path, write_mode="copy"):
+    """Load one archive through the normal write path. Returns (txs, rows) written."""
+    header, pages = read_archive(path)
+    missing = set(begin_block_sync(header))
+    absent = missing - pages.keys()
+    if absent:
+        raise ValueError(f"archive of block #{header['height']} lacks {len(absent)} missing page(s) "
+                         f"(first at index {min(absent)})")
+    pages = {idx: txs for idx, txs in pages.items() if idx in missing}
+    if not pages:
+        return 0, 0
+
+    if write_mode == "rows":
+        rows = 0
+        for idx, txs in sorted(pages.items()):
+            insert_transaction_batch(txs, header['id'], base_index=idx)
+            rows += count_rows(txs)
+        return sum(len(t) for t in pages.values()), rows
+
+    flat = {}
+    for idx, txs in sorted(pages.items()):
+        merge_flattened_rows(flat, flatten_transactions(txs, header['id'], idx))
+    insert_flattened_rows(flat, pages=[(header['id'], idx) for idx in pages])
+    return sum(len(t) for t in pages.values()), sum(len(r) for r in flat.values())
+
+
+def replay_archives(target, write_mode="copy", workers=4):
+    """Replay every archive under `target` at full speed and report throughput."""
+    paths = archive_paths(target)
+    if not paths:
+        print(f"❌ No archives found at {target}")
+        return None
+
+    print(f"📼 Replaying {len(paths)} archive(s) with {workers} worker(s), write mode '{write_mode}'")
+    start = time.perf_counter()
+    txs = rows = 0
+    failures = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(replay_archive, p, write_mode): p for p in paths}
+        for future, path in futures.items():
+            try:
+                t, r = future.result()
+                txs += t
+                rows += r
+            except Exception as e:
+                failures.append(f"{os.path.basename(path)}: {e}")
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "archives": len(paths),
+        "transactions": txs,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "tx_per_sec": round(txs / elapsed, 1) if elapsed else 0.0,
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else 0.0,
+        "failures": failures,
+    }
+    print(f"🏁 {txs} txs / {rows} rows in {elapsed:.2f}s → {result['tx_per_sec']:.0f} tx/s, "
+          f"{result['rows_per_sec']:.0f} rows/s")
+    for line in failures:
+        print(f"   ❌ {line}")
+    return result
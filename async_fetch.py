@@ -0,0 +1,199 @@
+import asyncio
+import json
+import time
+from email.utils import parsedate_to_datetime
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency, only needed for --engine async
+    aiohttp = None
+
+from api_client import (
+    CACHE_HITS, HTTP_BYTES, HTTP_FAILURES, HTTP_RETRIES, HTTP_RETRY_WAIT, HTTP_SECONDS, endpoint_label
+)
+from config import API_BASE_URL, ASYNC_FETCH_CONFIG, HEADERS
+from response_cache import get_response_cache
+
+PAGE_SIZE = 25
+
+
+def parse_retry_after(value):
+    """Retry-After may be delta-seconds or an HTTP date; return seconds or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveTokenBucket:
+    """Token-bucket rate limiter that backs off on 429s (AIMD).
+
+    Every throttle halves the refill rate and pauses all callers until the
+    server's Retry-After has elapsed; every success adds `increase` req/s back,
+    up to `max_rate`.
+    """
+
+    def __init__(self, rate, burst, min_rate, max_rate, increase):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        now = time.monotonic()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0.0
+        self._updated = now
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self._paused_until = max(self._paused_until, now + pause)
+
+
+class AsyncBlockFetcher:
+    """Fetches Blockstream pages over a single keep-alive aiohttp session.
+
+    Use as `async with AsyncBlockFetcher() as fetcher: ...`. Concurrency is
+    capped by a semaphore; request pacing is left to the adaptive token bucket.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, **overrides):
+        if aiohttp is None:
+            raise RuntimeError("The async engine requires aiohttp (pip install aiohttp)")
+        settings = dict(ASYNC_FETCH_CONFIG, **overrides)
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = settings["concurrency"]
+        self.max_retries = settings["max_retries"]
+        self.timeout = settings["timeout"]
+        self.bucket = AdaptiveTokenBucket(
+            settings["rate"], settings["burst"], settings["min_rate"],
+            settings["max_rate"], settings["rate_increase"]
+        )
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "failed": 0}
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def get_json(self, path):
+        """GET base_url + path as JSON, adapting to 429s. Returns None when retries run out."""
+        url = f"{self.base_url}{path}"
+        cache = get_response_cache()
+        if cache is not None and cache.cacheable(url):
+            data = cache.get(url)
+            if data is not None:
+                CACHE_HITS.inc()
+                return data
+        else:
+            cache = None
+
+        endpoint = endpoint_label(url)
+        for attempt in range(self.max_retries):
+            await self.bucket.acquire()
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                start = time.perf_counter()
+                try:
+                    async with self._session.get(url) as response:
+                        if response.status == 429:
+                            HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=429)
+                            HTTP_RETRIES.inc(reason="rate_limited")
+                            self.stats["throttled"] += 1
+                            self.bucket.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+                            continue
+                        response.raise_for_status()
+                        raw = await response.read()
+                        HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=response.status)
+                        HTTP_BYTES.inc(len(raw), endpoint=endpoint)
+                        data = json.loads(raw)
+                        self.bucket.on_success()
+                        if cache is not None and data:
+                            cache.put(url, raw)
+                        return data
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    self.stats["errors"] += 1
+                    HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status="error")
+                    print(f"\n   ❌ {url}: {e!r} (attempt {attempt + 1}/{self.max_retries})")
+            # Non-429 failure: back off outside the semaphore so others can proceed
+            if attempt < self.max_retries - 1:
+                HTTP_RETRIES.inc(reason="error")
+                HTTP_RETRY_WAIT.inc((attempt + 1) * 3, reason="error")
+                await asyncio.sleep((attempt + 1) * 3)
+        self.stats["failed"] += 1
+        HTTP_FAILURES.inc(endpoint=endpoint)
+        return None
+
+    async def fetch_block_pages(self, block_hash, total_txs, store=None, executor=None, indices=None):
+        """Fetch every /block/{hash}/txs/{idx} page concurrently.
+
+        `store(tx_data, idx)` is a blocking DB writer; it runs in `executor` as
+        soon as each page arrives, so network and database work overlap.
+        Returns [(idx, count, stage, error)] in completion order, where `stage`
+        is None, "fetch" or "store"; without `store` the second element is the
+        fetched page itself.
+        """
+        loop = asyncio.get_running_loop()
+        if indices is None:
+            indices = range(0, total_txs, PAGE_SIZE)
+
+        async def one_page(idx):
+            tx_data = await self.get_json(f"/block/{block_hash}/txs/{idx}")
+            if not tx_data:
+                return idx, 0, "fetch", f"Batch starting at index {idx} failed (API limit or error)"
+            if store is None:
+                return idx, tx_data, None, None
+            try:
+                count = await loop.run_in_executor(executor, store, tx_data, idx)
+                return idx, count, None, None
+            except Exception as e:
+                return idx, 0, "store", f"Batch store failed at index {idx}: {e}"
+
+        return [await result for result in asyncio.as_completed([one_page(idx) for idx in indices])]
+
+
+def fetch_block_pages(block_hash, total_txs, store=None, executor=None, indices=None, **overrides):
+    """Synchronous entry point: run the async fetcher for a single block."""
+    async def run():
+        async with AsyncBlockFetcher(**overrides) as fetcher:
+            results = await fetcher.fetch_block_pages(block_hash, total_txs, store, executor, indices)
+            return results, fetcher.stats
+    return asyncio.run(run())
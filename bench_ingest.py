@@ -0,0 +1,88 @@
+import argparse
+import time
+
+from db_pool import pooled_connection
+from db_operations import (
+    encode_hex, insert_block_header, insert_transaction_batch,
+    insert_transaction_batch_copy, insert_block_transactions_copy, flatten_transactions,
+    remove_height_range
+)
+from synthetic_chain import make_block, paginate
+
+# Heights far above the real chain so benchmark blocks never collide with indexed data.
+BENCH_HEIGHT_BASE = 2_000_000_000
+
+
+def delete_block(block_hash):
+    """Remove a benchmark block with everything written for it (spend links and partitions included)."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT height FROM bitcoin_blocks WHERE block_hash = %s", (encode_hex(block_hash),))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+    if row:
+        remove_height_range(row[0], row[0])
+
+
+def count_rows(transactions, block_hash):
+    rows = flatten_transactions(transactions, block_hash)
+    return sum(len(r) for r in rows.values())
+
+
+def run_mode(mode, header, transactions):
+    """Write one synthetic block with the given mode and return elapsed seconds."""
+    block_hash = header['id']
+    insert_block_header(header)
+    try:
+        start = time.perf_counter()
+        if mode == "rows":
+            for idx, page in paginate(transactions):
+                insert_transaction_batch(page, block_hash, base_index=idx)
+        elif mode == "copy":
+            for idx, page in paginate(transactions):
+                insert_transaction_batch_copy(page, block_hash, base_index=idx)
+        else:
+            insert_block_transactions_copy(dict(paginate(transactions)), block_hash)
+        return time.perf_counter() - start
+    finally:
+        delete_block(block_hash)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-row vs COPY ingestion throughput.")
+    parser.add_argument("--txs", type=int, default=3000, help="transactions per synthetic block")
+    parser.add_argument("--inputs", type=int, default=2)
+    parser.add_argument("--outputs", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["rows", "copy", "block"])
+    args = parser.parse_args(argv)
+
+    print(f"🏁 Ingestion benchmark: {args.txs} txs/block, {args.inputs} in / {args.outputs} out, "
+          f"{args.rounds} round(s)\n")
+
+    results = {}
+    for mode in args.modes:
+        elapsed = 0.0
+        rows = 0
+        for r in range(args.rounds):
+            header, transactions = make_block(
+                BENCH_HEIGHT_BASE + r, args.txs,
+                n_inputs=args.inputs, n_outputs=args.outputs
+            )
+            rows += count_rows(transactions, header['id'])
+            elapsed += run_mode(mode, header, transactions)
+        results[mode] = (rows, elapsed)
+        print(f"   {mode:<6} {rows:>9} rows in {elapsed:8.2f}s  →  {rows / elapsed:>10.0f} rows/sec")
+
+    if "rows" in results:
+        base = results["rows"][0] / results["rows"][1]
+        print()
+        for mode, (rows, elapsed) in results.items():
+            if mode != "rows":
+                print(f"   {mode:<6} speedup vs rows: {rows / elapsed / base:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import config
+import metrics
+from bench_ingest import BENCH_HEIGHT_BASE, count_rows, run_mode
+from bench_tx_detail import summarize
+from config import ASYNC_FETCH_CONFIG, PAGE_CACHE_CONFIG, PARTITION_CONFIG, SCHEMA_VARIANT
+from db_operations import remove_height_range
+from stub_server import API_PREFIX, make_handler, write_fixture
+from synthetic_chain import make_block, paginate
+
+# End-to-end benchmark on synthetic, Blockstream-shaped blocks against the
+# local PostgreSQL from config.py:
+#
+#   write   - each write mode's DB path alone (insert_transaction_batch & co.)
+#   ingest  - sync_full_block[_async] fetching from an in-process stub server
+#   routes  - explorer HTML and JSON routes over the ingested blocks
+#
+# Results (rows/sec, route p50/p99, peak RSS per stage) are printed and saved
+# as JSON; `--compare` prints the ratios against an earlier run. Benchmark
+# blocks live at BENCH_HEIGHT_BASE and above and are removed at the end.
+
+DEFAULT_SIZES = (1, 50, 500, 4000)   # near-empty block .. full block
+ROUTES = (
+    ("index", "/"),
+    ("block_details", "/block/{block}"),
+    ("transaction_details", "/tx/{txid}?height={height}"),
+    ("address_details", "/address/{address}"),
+    ("api_block_txs", "/api/block/{block}/txs"),
+    ("api_tx", "/api/tx/{txid}?height={height}"),
+)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class SyntheticChain:
+    """Synthetic blocks at consecutive heights from BENCH_HEIGHT_BASE."""
+
+    def __init__(self, args):
+        self.args = args
+        self.next_height = BENCH_HEIGHT_BASE
+        self.previous_hash = None
+
+    def block(self, tx_count):
+        header, transactions = make_block(
+            self.next_height, tx_count, self.previous_hash,
+            n_inputs=self.args.inputs, n_outputs=self.args.outputs,
+            witness_items=self.args.witness_items, witness_size=self.args.witness_size
+        )
+        self.next_height += 1
+        self.previous_hash = header["id"]
+        return header, transactions
+
+
+def run_write_stage(chain, args):
+    """Time each write mode's DB path on fresh blocks of every size (no HTTP)."""
+    results = []
+    for mode in args.modes:
+        for size in args.sizes:
+            header, transactions = chain.block(size)
+            rows = count_rows(transactions, header["id"])
+            elapsed = run_mode(mode, header, transactions)   # removes the block again
+            results.append({"mode": mode, "txs": size, "rows": rows, "seconds": round(elapsed, 4),
+                            "rows_per_sec": round(rows / elapsed, 1) if elapsed else None})
+            print(f"   ✍️  {mode:<6} {size:>5} txs  {rows:>8} rows in {elapsed:7.2f}s  →  "
+                  f"{rows / elapsed if elapsed else 0:>10.0f} rows/sec")
+    return results
+
+
+def start_stub_api(root):
+    """Serve `root` like the Esplora API on a free local port; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(root))
+    threading.Thread(target=server.serve_forever, name="bench-stub-api", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}{API_PREFIX}"
+
+
+def run_ingest_stage(chain, args, root):
+    """Sync fresh blocks of every size through the real ingestion path, fetching from the stub.
+
+    Returns (results, ingested) where `ingested` lists (header, transactions)
+    kept in the database for the route stage.
+    """
+    blocks = []
+    for mode in args.modes:
+        for size in args.sizes:
+            header, transactions = chain.block(size)
+            write_fixture(root, f"{API_PREFIX}/block/{header['id']}", header)
+            for idx, page in paginate(transactions):
+                write_fixture(root, f"{API_PREFIX}/block/{header['id']}/txs/{idx}", page)
+            blocks.append((mode, header, transactions))
+
+    server, base_url = start_stub_api(root)
+    # The ingester binds API_BASE_URL when it is imported, so point it at the stub first
+    config.API_BASE_URL = base_url
+    ASYNC_FETCH_CONFIG.update(rate=args.api_rate, burst=args.api_rate, max_rate=args.api_rate)
+    from dataFetch import sync_full_block, sync_full_block_async
+    sync = sync_full_block_async if args.engine == "async" else sync_full_block
+
+    results, ingested = [], []
+    try:
+        for mode, header, transactions in blocks:
+            rows = count_rows(transactions, header["id"])
+            start = time.perf_counter()
+            complete = sync(header, write_mode=mode)
+            elapsed = time.perf_counter() - start
+            results.append({"mode": mode, "engine": args.engine, "txs": header["tx_count"], "rows": rows,
+                            "seconds": round(elapsed, 4), "complete": complete,
+                            "rows_per_sec": round(rows / elapsed, 1) if elapsed else None})
+            ingested.append((header, transactions))
+            print(f"   📥 {mode:<6} {header['tx_count']:>5} txs  {rows:>8} rows in {elapsed:7.2f}s  →  "
+                  f"{rows / elapsed if elapsed else 0:>10.0f} rows/sec{'' if complete else '  (incomplete)'}")
+    finally:
+        server.shutdown()
+    return results, ingested
+
+
+def route_samples(ingested):
+    """URL parameters per block size: the block, its busiest non-coinbase tx and one of its addresses."""
+    samples = {}
+    for header, transactions in ingested:
+        tx = max(transactions[1:] or transactions, key=lambda t: len(t["vin"]))
+        address = next((v["scriptpubkey_address"] for v in tx["vout"] if v.get("scriptpubkey_address")), None)
+        samples[header["tx_count"]] = {"block": header["id"], "height": header["height"],
+                                       "txid": tx["txid"], "address": address}
+    return samples
+
+
+def run_route_stage(args, samples):
+    """p50/p99 latency of every explorer route, per block size, through the Flask test client."""
+    if not args.page_cache:
+        PAGE_CACHE_CONFIG["enabled"] = False   # measure the database path, not cache hits
+    from app import app
+    client = app.test_client()
+
+    results = []
+    for size, params in sorted(samples.items()):
+        for route, template in ROUTES:
+            if "{address}" in template and params["address"] is None:
+                continue
+            url = template.format(**params)
+            client.get(url)   # warm-up: plan caches, connection pool
+            latencies = []
+            status = None
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                response = client.get(url)
+                response.get_data()
+                latencies.append((time.perf_counter() - start) * 1000)
+                status = response.status_code
+            stats = summarize(latencies)
+            results.append({"route": route, "txs": size, "status": status, "requests": args.requests,
+                            **{k: round(v, 3) for k, v in stats.items()}})
+            print(f"   🌐 {route:<20} {size:>5} txs  p50 {stats['p50']:8.2f} ms  p99 {stats['p99']:8.2f} ms"
+                  f"{'' if status == 200 else f'  (HTTP {status})'}")
+    return results
+
+
+def compare(report, baseline_path):
+    """Print this run's numbers as ratios of a saved run (>1.0 = faster now)."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n⚖️  Compared with {baseline_path} ({baseline.get('commit')}):")
+    for stage in ("write", "ingest"):
+        before = {(r["mode"], r["txs"]): r for r in baseline.get(stage, [])}
+        for row in report.get(stage, []):
+            old = before.get((row["mode"], row["txs"]))
+            if old and old["rows_per_sec"] and row["rows_per_sec"]:
+                print(f"   {stage:<7} {row['mode']:<6} {row['txs']:>5} txs  rows/sec "
+                      f"{old['rows_per_sec']:>10.0f} → {row['rows_per_sec']:>10.0f}  "
+                      f"({row['rows_per_sec'] / old['rows_per_sec']:.2f}x)")
+    before = {(r["route"], r["txs"]): r for r in baseline.get("routes", [])}
+    for row in report.get("routes", []):
+        old = before.get((row["route"], row["txs"]))
+        if old and row["p50"] and row["p99"]:
+            print(f"   route   {row['route']:<20} {row['txs']:>5} txs  p50 {old['p50'] / row['p50']:.2f}x  "
+                  f"p99 {old['p99'] / row['p99']:.2f}x")
+    for stage, mb in report["peak_rss_mb"].items():
+        old = baseline.get("peak_rss_mb", {}).get(stage)
+        if old:
+            print(f"   peak RSS after {stage:<7} {old:>8.1f} MB → {mb:>8.1f} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic-chain benchmark of ingestion and explorer routes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="transactions per synthetic block (one block per size and mode)")
+    parser.add_argument("--inputs", type=int, default=2, help="inputs per non-coinbase tx")
+    parser.add_argument("--outputs", type=int, default=2, help="outputs per tx")
+    parser.add_argument("--witness-items", type=int, default=2, help="witness items per input")
+    parser.add_argument("--witness-size", type=int, default=72, help="bytes per witness item")
+    parser.add_argument("--modes", nargs="+", default=["rows", "copy", "block"], choices=("rows", "copy", "block"))
+    parser.add_argument("--engine", choices=("threads", "async"), default="async",
+                        help="ingest engine (threads includes sync_full_block's fixed 1.2s per page)")
+    parser.add_argument("--api-rate", type=float, default=200.0, help="async engine request rate against the stub")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per route and block size")
+    parser.add_argument("--stages", nargs="+", default=["write", "ingest", "routes"],
+                        choices=("write", "ingest", "routes"))
+    parser.add_argument("--page-cache", action="store_true", help="keep the explorer page cache on for routes")
+    parser.add_argument("--output", default=None, help="results JSON (default: bench_results/<commit>-<time>.json)")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="print ratios against an earlier results file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    commit = git_revision()
+    report = {
+        "commit": commit,
+        "started_at": int(time.time()),
+        "schema": SCHEMA_VARIANT,
+        "partitioned": PARTITION_CONFIG["enabled"],
+        "args": vars(args),
+        "peak_rss_mb": {"start": peak_rss_mb()},
+    }
+    print(f"🏁 Benchmark suite @ {commit}: blocks of {', '.join(map(str, args.sizes))} txs, "
+          f"{args.inputs} in / {args.outputs} out, modes {', '.join(args.modes)}\n")
+
+    chain = SyntheticChain(args)
+    try:
+        if "write" in args.stages:
+            print("✍️  Write paths (DB only):")
+            report["write"] = run_write_stage(chain, args)
+            report["peak_rss_mb"]["write"] = peak_rss_mb()
+        if "ingest" in args.stages or "routes" in args.stages:
+            print(f"\n📥 Ingestion ({args.engine} engine, stub API):")
+            with tempfile.TemporaryDirectory(prefix="bench-api-") as root:
+                report["ingest"], ingested = run_ingest_stage(chain, args, root)
+            report["peak_rss_mb"]["ingest"] = peak_rss_mb()
+            if "routes" in args.stages:
+                print(f"\n🌐 Explorer routes ({args.requests} requests each):")
+                report["routes"] = run_route_stage(args, route_samples(ingested))
+                report["peak_rss_mb"]["routes"] = peak_rss_mb()
+    finally:
+        removed = remove_height_range(BENCH_HEIGHT_BASE)
+        print(f"\n🧹 Removed {len(removed)} benchmark block(s)")
+
+    report["metrics"] = metrics.REGISTRY.snapshot()
+    output = args.output or os.path.join("bench_results", f"{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {output} (peak RSS {max(report['peak_rss_mb'].values()):.1f} MB)")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
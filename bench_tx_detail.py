@@ -0,0 +1,119 @@
+import argparse
+import statistics
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from bench_ingest import BENCH_HEIGHT_BASE, delete_block
+from db_operations import decode_hex, encode_hex, insert_block_header, insert_block_transactions_copy
+from db_pool import pooled_connection
+from explorer_data import load_block, load_transaction, present
+from synthetic_chain import make_block, paginate
+
+# Compares the explorer's single-query transaction/block loaders with the
+# previous four-query version (plus Python-side witness grouping) on a
+# synthetic block holding one transaction with many inputs.
+
+LEGACY_TX_QUERIES = (
+    "SELECT * FROM bitcoin_transactions WHERE txid = %s;",
+    "SELECT * FROM bitcoin_outputs WHERE txid = %s ORDER BY output_index;",
+    "SELECT * FROM bitcoin_inputs WHERE txid = %s ORDER BY input_index;",
+    """
+    SELECT input_index, witness_index, witness_data
+    FROM bitcoin_witnesses
+    WHERE txid = %s
+    ORDER BY input_index, witness_index
+    """,
+)
+LEGACY_BLOCK_QUERIES = (
+    "SELECT * FROM bitcoin_blocks WHERE block_hash = %s;",
+    "SELECT * FROM bitcoin_transactions WHERE block_hash = %s ORDER BY tx_index ASC;",
+)
+
+
+def load_transaction_legacy(cur, key):
+    """The former transaction_details data path: four round trips, grouping in Python."""
+    tx_sql, outputs_sql, inputs_sql, witnesses_sql = LEGACY_TX_QUERIES
+    cur.execute(tx_sql, (key,))
+    tx = cur.fetchone()
+    cur.execute(outputs_sql, (key,))
+    vouts = [present(v) for v in cur.fetchall()]
+    cur.execute(inputs_sql, (key,))
+    vins = [present(v) for v in cur.fetchall()]
+    cur.execute(witnesses_sql, (key,))
+    witnesses = {}
+    for row in cur.fetchall():
+        if row['input_index'] not in witnesses:
+            witnesses[row['input_index']] = []
+        witnesses[row['input_index']].append(decode_hex(row['witness_data']))
+    return present(tx), vouts, vins, witnesses
+
+
+def load_block_legacy(cur, key):
+    block_sql, transactions_sql = LEGACY_BLOCK_QUERIES
+    cur.execute(block_sql, (key,))
+    block = cur.fetchone()
+    cur.execute(transactions_sql, (key,))
+    return present(block), [present(tx) for tx in cur.fetchall()]
+
+
+def time_loader(loader, key, rounds, cursor_factory=None):
+    """Per-call latencies (ms) of loader(cur, key), each on a pooled connection."""
+    samples = []
+    for _ in range(rounds):
+        with pooled_connection() as conn:
+            cur = conn.cursor(cursor_factory=cursor_factory)
+            start = time.perf_counter()
+            loader(cur, key)
+            samples.append((time.perf_counter() - start) * 1000)
+            cur.close()
+            conn.rollback()
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "p50": statistics.median(ordered),
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "mean": statistics.fmean(ordered),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Single-query vs multi-query explorer detail loaders.")
+    parser.add_argument("--inputs", type=int, default=3000, help="inputs of the synthetic transaction")
+    parser.add_argument("--witness-items", type=int, default=2)
+    parser.add_argument("--txs", type=int, default=2000, help="transactions in the synthetic block")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    # Coinbase + one wide transaction, then filler so the block page has work to do too
+    header, transactions = make_block(BENCH_HEIGHT_BASE, 2, n_inputs=args.inputs,
+                                      witness_items=args.witness_items)
+    _, filler = make_block(BENCH_HEIGHT_BASE, max(args.txs - 2, 0) + 1)
+    transactions += filler[1:]
+    wide_txid = transactions[1]['txid']
+
+    print(f"🏁 Detail-page benchmark: tx with {args.inputs} inputs x {args.witness_items} witness items, "
+          f"block with {len(transactions)} txs, {args.rounds} round(s)\n")
+    insert_block_header(header)
+    try:
+        insert_block_transactions_copy(dict(paginate(transactions)), header['id'])
+        cases = [
+            ("transaction", encode_hex(wide_txid), load_transaction_legacy, load_transaction),
+            ("block", encode_hex(header['id']), load_block_legacy, load_block),
+        ]
+        for name, key, legacy, single in cases:
+            before = summarize(time_loader(legacy, key, args.rounds, cursor_factory=RealDictCursor))
+            after = summarize(time_loader(single, key, args.rounds))
+            print(f"   {name:<12} {'queries':<10}{'p50':>10}{'p99':>10}{'mean':>10}")
+            print(f"   {'':<12} {'multi':<10}{before['p50']:>8.2f}ms{before['p99']:>8.2f}ms{before['mean']:>8.2f}ms")
+            print(f"   {'':<12} {'single':<10}{after['p50']:>8.2f}ms{after['p99']:>8.2f}ms{after['mean']:>8.2f}ms")
+            print(f"   {'':<12} speedup (p50): {before['p50'] / after['p50']:.1f}x\n")
+    finally:
+        delete_block(header['id'])
+
+
+if __name__ == "__main__":
+    main()
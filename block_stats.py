@@ -1,88 +1,150 @@
+import argparse
 import psycopg2
-from config import DB_CONFIG
+from config import DB_CONFIG, EXPORT_CONFIG
 from datetime import datetime
+from db_operations import decode_hex
+from dbSetup import create_block_stats
 
 def create_view(cur):
-    """Creates or replaces the aggregated statistics view."""
-    print("🔨 Building SQL View: block_stats_view...")
+    """Ensures the stats table and the view over it exist."""
+    print("🔨 Ensuring bitcoin_block_stats and block_stats_view...")
+    create_block_stats(cur)
+
+def rebuild_block_stats(cur):
+    """Recomputes bitcoin_block_stats from the raw tables.
+
+    Only needed once for data ingested before stats were maintained at write
+    time (or after manual edits); normal syncs keep the table up to date.
+    """
+    print("♻️  Rebuilding bitcoin_block_stats from raw tables...")
     cur.execute("""
-        CREATE OR REPLACE VIEW block_stats_view AS
-        SELECT 
-            b.height,
+        INSERT INTO bitcoin_block_stats (
+            block_hash, height, tx_count, fee_sats,
+            output_count, output_volume_sats, input_count, witness_count
+        )
+        SELECT
             b.block_hash,
-            b.timestamp,
-            COUNT(DISTINCT t.txid) AS transaction_count,
-            COALESCE(SUM(o.value), 0) AS total_volume_sats,
-            (COALESCE(SUM(o.value), 0) / 100000000.0) AS total_volume_btc
-        FROM 
-            bitcoin_blocks b
-        LEFT JOIN 
-            bitcoin_transactions t ON b.block_hash = t.block_hash
-        LEFT JOIN 
-            bitcoin_outputs o ON t.txid = o.txid
-        GROUP BY 
-            b.height, b.block_hash, b.timestamp
-        ORDER BY 
-            b.height DESC;
+            b.height,
+            (SELECT COUNT(*) FROM bitcoin_transactions t WHERE t.block_hash = b.block_hash),
+            (SELECT COALESCE(SUM(t.fee), 0) FROM bitcoin_transactions t WHERE t.block_hash = b.block_hash),
+            (SELECT COUNT(*) FROM bitcoin_outputs o JOIN bitcoin_transactions t USING (txid)
+             WHERE t.block_hash = b.block_hash),
+            (SELECT COALESCE(SUM(o.value), 0) FROM bitcoin_outputs o JOIN bitcoin_transactions t USING (txid)
+             WHERE t.block_hash = b.block_hash),
+            (SELECT COUNT(*) FROM bitcoin_inputs i JOIN bitcoin_transactions t USING (txid)
+             WHERE t.block_hash = b.block_hash),
+            (SELECT COUNT(*) FROM bitcoin_witnesses w JOIN bitcoin_transactions t USING (txid)
+             WHERE t.block_hash = b.block_hash)
+        FROM bitcoin_blocks b
+        ON CONFLICT (block_hash) DO UPDATE SET
+            tx_count = EXCLUDED.tx_count,
+            fee_sats = EXCLUDED.fee_sats,
+            output_count = EXCLUDED.output_count,
+            output_volume_sats = EXCLUDED.output_volume_sats,
+            input_count = EXCLUDED.input_count,
+            witness_count = EXCLUDED.witness_count,
+            updated_at = now()
     """)
+    print(f"   {cur.rowcount} block(s) recomputed")
+
+def format_row(row):
+    """Readable cells for one block_stats_view row."""
+    r = list(row)
+    # Format Timestamp (Index 2)
+    r[2] = datetime.fromtimestamp(r[2]).strftime('%Y-%m-%d %H:%M:%S')
+    # Truncate Hash (Index 1) for better display
+    r[1] = decode_hex(r[1])
+    r[1] = r[1][:8] + "..." + r[1][-8:]
+    # Format Volume BTC (Index 5) to 8 decimals
+    r[5] = f"{r[5]:.8f}"
+    return [str(item) for item in r]
 
 def format_table(rows, headers):
     """Formats data as a clean ASCII table."""
     if not rows:
         return "No data found."
+    formatted_rows = [format_row(row) for row in rows]
+    return "\n".join(_table_lines(formatted_rows, headers, _column_widths(formatted_rows, headers)))
 
-    # Convert timestamps to readable dates and format numbers
-    formatted_rows = []
-    for row in rows:
-        r = list(row)
-        # Format Timestamp (Index 2)
-        r[2] = datetime.fromtimestamp(r[2]).strftime('%Y-%m-%d %H:%M:%S')
-        # Truncate Hash (Index 1) for better display
-        r[1] = r[1][:8] + "..." + r[1][-8:]
-        # Format Volume BTC (Index 5) to 8 decimals
-        r[5] = f"{r[5]:.8f}"
-        formatted_rows.append([str(item) for item in r])
-
-    # Calculate column widths
+def _column_widths(formatted_rows, headers):
     col_widths = [len(h) for h in headers]
     for row in formatted_rows:
         for i, cell in enumerate(row):
             col_widths[i] = max(col_widths[i], len(cell))
+    return col_widths
+
+def _separator(col_widths):
+    return "+" + "+".join("-" * (w + 2) for w in col_widths) + "+"
 
+def _table_lines(formatted_rows, headers, col_widths):
     # Build DB Table string
-    separator = "+" + "+".join("-" * (w + 2) for w in col_widths) + "+"
+    separator = _separator(col_widths)
     header_row = "|" + "|".join(f" {h:<{w}} " for h, w in zip(headers, col_widths)) + "|"
-    
+
     table_str = [separator, header_row, separator]
-    
-    for row in formatted_rows:
-        data_row = "|" + "|".join(f" {cell:<{w}} " for cell, w in zip(row, col_widths)) + "|"
-        table_str.append(data_row)
-    
+    table_str.extend(_data_lines(formatted_rows, col_widths))
     table_str.append(separator)
-    return "\n".join(table_str)
+    return table_str
+
+def _data_lines(formatted_rows, col_widths):
+    return ["|" + "|".join(f" {cell:<{w}} " for cell, w in zip(row, col_widths)) + "|"
+            for row in formatted_rows]
+
+def stream_table(cur, chunk_size):
+    """Yields the ASCII table line by line, fetching `chunk_size` rows at a time.
+
+    Column widths come from the first chunk (the newest blocks, which have the
+    widest counts); a wider cell further down only stretches its own row.
+    Yields nothing if there are no rows.
+    """
+    rows = cur.fetchmany(chunk_size)
+    if not rows:
+        return
+    headers = [desc[0].upper() for desc in cur.description] # ['HEIGHT', 'BLOCK_HASH', ...]
+    formatted_rows = [format_row(row) for row in rows]
+    col_widths = _column_widths(formatted_rows, headers)
+    yield from _table_lines(formatted_rows, headers, col_widths)[:-1]
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from _data_lines([format_row(row) for row in rows], col_widths)
+    yield _separator(col_widths)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print per-block statistics.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute bitcoin_block_stats from the raw tables first")
+    parser.add_argument("--limit", type=int, default=EXPORT_CONFIG["report_limit"],
+                        help="newest blocks to show (0 for all; export.py writes full files)")
+    args = parser.parse_args(argv)
 
-def main():
     try:
         conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor()
 
-        # 1. Ensure the view exists
+        # 1. Ensure the stats table and view exist
         create_view(cur)
+        if args.rebuild:
+            rebuild_block_stats(cur)
         conn.commit()
+        cur.execute("SELECT COUNT(*) FROM bitcoin_blocks")
+        total = cur.fetchone()[0]
+        cur.close()
 
-        # 2. Query the data
+        # 2. Stream the precomputed stats through a server-side cursor
         print("🔍 Querying Aggregated Data...")
-        cur.execute("SELECT * FROM block_stats_view")
-        rows = cur.fetchall()
-        
-        # Get column names
-        headers = [desc[0].upper() for desc in cur.description] # ['HEIGHT', 'BLOCK_HASH', ...]
+        cur = conn.cursor(name="block_stats_report")
+        cur.execute("SELECT * FROM block_stats_view ORDER BY height DESC LIMIT %s", (args.limit or None,))
 
         # 3. Display
         print("\n📊 BLOCKCHAIN AGGREGATED STATS")
-        print(format_table(rows, headers))
-        print(f"\nTotal Blocks: {len(rows)}")
+        if not total:
+            print("No data found.")
+        for line in stream_table(cur, EXPORT_CONFIG["chunk_size"]):
+            print(line)
+        shown = min(total, args.limit) if args.limit else total
+        print(f"\nTotal Blocks: {total}" + (f" (newest {shown} shown)" if shown < total else ""))
 
         cur.close()
         conn.close()
@@ -0,0 +1,138 @@
+import argparse
+import tempfile
+
+import psycopg2
+
+import db_operations
+from archive import ArchiveRecorder, replay_archives
+from config import DB_CONFIG
+from db_pool import close_pool, configure_pool
+from dbSetup import setup_database
+from route_timings import pick_samples, route_queries, time_routes
+from synthetic_chain import make_block, paginate
+
+# Loads the same blocks into the "text" and "compact" layouts, each in its own
+# PostgreSQL schema (selected through search_path), then compares on-disk
+# size per table and the explorer route query timings.
+
+SCHEMAS = {"text": "explorer_text", "compact": "explorer_compact"}
+
+
+def schema_config(schema):
+    return dict(DB_CONFIG, options=f"-c search_path={schema}")
+
+
+def write_synthetic_archives(directory, blocks, txs_per_block):
+    """Sample blocks for when no recorded archives are at hand."""
+    recorder = ArchiveRecorder(directory)
+    previous = None
+    for height in range(blocks):
+        header, transactions = make_block(840_000 + height, txs_per_block, previous)
+        recorder.record_header(header)
+        for idx, page in paginate(transactions):
+            recorder.record_page(header['id'], idx, page)
+        recorder.finish_block(header['id'])
+        previous = header['id']
+    return directory
+
+
+def load_variant(variant, archives, workers):
+    """Rebuild the variant's schema and replay the archives into it."""
+    schema = SCHEMAS[variant]
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema};")
+    cur.close()
+    conn.close()
+
+    setup_database(variant=variant, db_config=schema_config(schema))
+    db_operations.set_schema_variant(variant)
+    configure_pool(schema_config(schema), max_size=max(workers, 1) + 1)
+    try:
+        return replay_archives(archives, write_mode="copy", workers=workers)
+    finally:
+        close_pool()
+
+
+def relation_sizes(cur, schema):
+    """{table: (heap + toast bytes, index bytes, total bytes)} for the bitcoin_* tables."""
+    cur.execute("""
+        SELECT c.relname, pg_table_size(c.oid), pg_indexes_size(c.oid), pg_total_relation_size(c.oid)
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind = 'r' AND c.relname LIKE 'bitcoin%%'
+        ORDER BY c.relname
+    """, (schema,))
+    return {name: (table, indexes, total) for name, table, indexes, total in cur.fetchall()}
+
+
+def measure_variant(variant, repeat):
+    schema = SCHEMAS[variant]
+    conn = psycopg2.connect(**schema_config(schema))
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("VACUUM ANALYZE;")
+        sizes = relation_sizes(cur, schema)
+        samples = pick_samples(cur)
+        queries = route_queries(samples)
+        if samples["address"] is None:
+            queries["lookups"] = queries["lookups"][:1]
+        return sizes, time_routes(cur, queries, repeat)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def print_report(sizes, timings):
+    mb = 1024 * 1024
+    print("\n💽 On-disk size per table (data + TOAST / indexes), MB")
+    print(f"{'TABLE':<26}{'TEXT':>20}{'COMPACT':>20}{'SAVED':>8}")
+    totals = {"text": 0, "compact": 0}
+    for table in sizes["text"]:
+        text = sizes["text"][table]
+        compact = sizes["compact"].get(table, (0, 0, 0))
+        totals["text"] += text[2]
+        totals["compact"] += compact[2]
+        saved = 1 - compact[2] / text[2] if text[2] else 0.0
+        print(f"{table:<26}{text[0] / mb:>10.2f} /{text[1] / mb:>7.2f}"
+              f"{compact[0] / mb:>11.2f} /{compact[1] / mb:>7.2f}{saved * 100:>7.0f}%")
+    saved = 1 - totals["compact"] / totals["text"] if totals["text"] else 0.0
+    print(f"{'total':<26}{totals['text'] / mb:>19.2f}{totals['compact'] / mb:>20.2f}{saved * 100:>7.0f}%")
+
+    print("\n⏱️  Query timings (best of N)")
+    print(f"{'ROUTE':<22}{'QUERY':<22}{'TEXT':>12}{'COMPACT':>12}{'SPEEDUP':>10}")
+    for route, rows in timings["text"].items():
+        for (label, ms_text, _), (_, ms_compact, _) in zip(rows, timings["compact"][route]):
+            speedup = ms_text / ms_compact if ms_compact else float("inf")
+            print(f"{route:<22}{label:<22}{ms_text:>9.3f} ms{ms_compact:>9.3f} ms{speedup:>9.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Storage size and query latency: text vs compact schema.")
+    parser.add_argument("archives", nargs="?", help="archive directory or glob (see dataFetch.py --record)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="BLOCKS",
+                        help="generate this many synthetic sample blocks instead of using archives")
+    parser.add_argument("--txs", type=int, default=2000, help="transactions per synthetic block")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if not args.archives and not args.synthetic:
+        parser.error("pass an archive directory or --synthetic BLOCKS")
+
+    with tempfile.TemporaryDirectory(prefix="compare_schemas_") as tmp:
+        archives = args.archives or write_synthetic_archives(tmp, args.synthetic, args.txs)
+        sizes, timings = {}, {}
+        for variant in ("text", "compact"):
+            print(f"\n📥 Loading the {variant} layout into schema {SCHEMAS[variant]}")
+            if not load_variant(variant, archives, args.workers):
+                return
+            sizes[variant], timings[variant] = measure_variant(variant, args.repeat)
+
+    print_report(sizes, timings)
+    print(f"\nSchemas {', '.join(SCHEMAS.values())} are left in place; DROP SCHEMA ... CASCADE when done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # Database and API Configuration
+import os
 
 DB_CONFIG = {
     "dbname": "postgres",
@@ -8,6 +9,147 @@ DB_CONFIG = {
     "port": "5432"
 }
 
+# Shared connection pool used by dataFetch workers and the Flask explorer.
+# max_size should be at least the ingester's worker count; timeout is the
+# longest a caller waits for a free connection before PoolTimeout is raised.
+DB_POOL_CONFIG = {
+    "min_size": 1,
+    "max_size": 10,
+    "timeout": 30.0,
+    "health_check_after": 30.0
+}
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
+
+# Base URL of the Esplora/Blockstream API. Override with BLOCKSTREAM_API_URL to
+# point the ingester at a local stub server (see stub_server.py).
+API_BASE_URL = os.environ.get("BLOCKSTREAM_API_URL", "https://blockstream.info/api").rstrip("/")
+
+# asyncio engine (async_fetch.py): at most `concurrency` requests in flight over
+# one keep-alive connection pool; the token bucket starts at `rate` req/s, halves
+# on every 429 and creeps back up by `rate_increase` per success.
+ASYNC_FETCH_CONFIG = {
+    "concurrency": 8,
+    "rate": 5.0,
+    "burst": 5,
+    "min_rate": 0.5,
+    "max_rate": 20.0,
+    "rate_increase": 0.05,
+    "max_retries": 5,
+    "timeout": 45
+}
+
+# Range sync pipeline (pipeline.py): worker counts per stage, bounded queue size
+# between stages, how many flattened pages the writer coalesces per COPY round
+# and how often (seconds) queue depths / stage throughput are printed.
+PIPELINE_CONFIG = {
+    "header_workers": 2,
+    "page_workers": 5,
+    "parse_workers": 2,
+    "queue_size": 32,
+    "write_batch_pages": 40,
+    "report_every": 10
+}
+
+# Optional on-disk cache for immutable API responses (blocks by hash and their
+# tx pages), so re-indexing after a schema rebuild is served from local disk.
+# Enable here or per run with `dataFetch.py --cache`.
+RESPONSE_CACHE_CONFIG = {
+    "enabled": False,
+    "path": ".api_cache",
+    "max_bytes": 2 * 1024 ** 3,
+    "compress_level": 6
+}
+
+# Explorer home page: blocks per page (keyset-paginated by height) and the
+# largest page a client may request with ?limit=.
+EXPLORER_CONFIG = {
+    "page_size": 50,
+    "max_page_size": 500,
+    "address_page_size": 50
+}
+
+# JSON API (explorer_api.py): transactions per /api/block/<hash>/txs page by
+# default and at most, and rows pulled per round trip from the server-side cursor.
+API_CONFIG = {
+    "page_size": 1000,
+    "max_page_size": 10000,
+    "fetch_size": 500
+}
+
+# In-process cache of rendered block/tx pages (page_cache.py). Pages for blocks
+# with at least `deep_confirmations` are kept until evicted or rolled back and
+# sent with a long Cache-Control max-age; shallower ones expire after
+# `near_tip_ttl` seconds because they may still be reorged out.
+PAGE_CACHE_CONFIG = {
+    "enabled": True,
+    "max_bytes": 64 * 1024 ** 2,
+    "near_tip_ttl": 30.0,
+    "deep_confirmations": 6,
+    "deep_max_age": 86400,
+    "tip_refresh": 5.0
+}
+
+# Tip follower (dataFetch.py --follow): seconds between tip polls, how many
+# gap heights below the indexed tip to backfill per poll (new blocks always go
+# first) and where the lag/status JSON is written for monitoring.
+FOLLOW_CONFIG = {
+    "poll_interval": 10.0,
+    "backfill_per_poll": 5,
+    "status_file": "follower_status.json"
+}
+
+# Metrics (metrics.py): the ingester serves /metrics (Prometheus) and
+# /metrics.json on `port` and/or rewrites `dump_file` every `dump_interval`
+# seconds when set here or via dataFetch.py --metrics-port / --metrics-file.
+# The explorer always serves /metrics and /debug/metrics.
+METRICS_CONFIG = {
+    "host": "127.0.0.1",
+    "port": None,
+    "dump_file": None,
+    "dump_interval": 15.0
+}
+
+# Failed-page retry queue (retry_queue.py): a page that could not be fetched or
+# stored is retried after base_delay * 2^(attempts - 1) seconds, capped at
+# max_delay, until max_attempts. sync_full_block waits up to `inline_wait`
+# seconds for its own queued pages before leaving them to later drains.
+RETRY_QUEUE_CONFIG = {
+    "base_delay": 30,
+    "max_delay": 1800,
+    "max_attempts": 10,
+    "batch_size": 50,
+    "inline_wait": 180
+}
+
+# Reorg handling (reorg.py): how far below the tip to search for the fork
+# point before giving up and asking for a manual rebuild.
+REORG_CONFIG = {
+    "max_depth": 100
+}
+
+# Storage layout created by dbSetup.py and expected by db_operations/app:
+#   "text"    - hashes, scripts and witnesses as hex TEXT/VARCHAR plus stored ASM
+#   "compact" - the same values as raw BYTEA, ASM rendered on demand (about half the size)
+# Override with EXPLORER_SCHEMA; it must match the schema the database was built with.
+SCHEMA_VARIANT = os.environ.get("EXPLORER_SCHEMA", "text")
+
+# Optional height-range partitioning of bitcoin_transactions/outputs/inputs/
+# witnesses (dbSetup.py --partitioned): one partition per `blocks_per_partition`
+# heights, created as ingestion reaches them. Enable with EXPLORER_PARTITIONED=1
+# when the database was built partitioned; keep `blocks_per_partition` unchanged
+# once partitions exist.
+PARTITION_CONFIG = {
+    "enabled": os.environ.get("EXPLORER_PARTITIONED", "0") == "1",
+    "blocks_per_partition": 10000
+}
+
+# Streaming exports (export.py) and the block_stats.py report: rows are pulled
+# through a server-side cursor `chunk_size` at a time. The ASCII report shows at
+# most `report_limit` blocks (newest first) unless --limit says otherwise.
+EXPORT_CONFIG = {
+    "chunk_size": 50000,
+    "report_limit": 100
+}
@@ -1,43 +1,130 @@
+import argparse
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from api_client import get_api_data
-from db_operations import insert_block_header, insert_transaction_batch, is_block_fully_synced
+import metrics
+from api_client import get_api_data, get_api_text
+from archive import get_recorder, replay_archives, start_recording
+from config import API_BASE_URL, METRICS_CONFIG, RETRY_QUEUE_CONFIG
+from db_pool import get_pool
+from reorg import resolve_reorg, resync_after_rollback
+from response_cache import configure_response_cache, format_cache_stats, get_response_cache
+from retry_queue import drain_retry_queue, format_retry_summary, queue_failed_page
+from db_operations import (
+    begin_block_sync, get_checkpoint, insert_transaction_batch, insert_transaction_batch_copy,
+    insert_block_transactions_copy, is_block_fully_synced, reset_exhausted_retries,
+    seconds_until_next_retry
+)
 
+# Write modes for sync_full_block:
+#   rows  - one INSERT per tx/vin/vout/witness (original path)
+#   copy  - each 25-tx page is loaded with COPY into staging tables and merged
+#   block - all pages are fetched first, then the whole block is loaded in one COPY
+WRITE_MODES = ("rows", "copy", "block")
+BATCH_WRITERS = {
+    "rows": insert_transaction_batch,
+    "copy": insert_transaction_batch_copy,
+}
 
-def fetch_and_store_batch(block_hash, idx, total_txs):
+BATCHES = metrics.counter("ingest_batches_total", "Tx pages processed, by outcome", ("result",))
+THROTTLE_SLEEP = metrics.counter("ingest_throttle_sleep_seconds_total",
+                                 "Seconds spent in the fixed between-batch sleep")
+BLOCK_SECONDS = metrics.histogram("ingest_block_seconds", "Wall time to sync one block", ("engine", "write_mode"),
+                                  buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600))
+
+
+def missing_tx_count(indices, total_txs):
+    """Number of transactions covered by the given page start indices."""
+    return sum(min(25, total_txs - idx) for idx in indices)
+
+
+def record_page(block_hash, idx, tx_data):
+    """Append a fetched page to the block's archive when --record is active.
+
+    Pages of blocks that are not being archived (queued or partly stored by an earlier run) are skipped.
+    """
+    recorder = get_recorder()
+    if recorder is not None and tx_data and recorder.is_recording(block_hash):
+        recorder.record_page(block_hash, idx, tx_data)
+
+
+def fetch_batch(block_hash, idx):
+    """Fetch a single page of transactions without storing it."""
+    url = f"{API_BASE_URL}/block/{block_hash}/txs/{idx}"
+    tx_data = get_api_data(url)
+    record_page(block_hash, idx, tx_data)
+    if tx_data:
+        BATCHES.inc(result="fetched")
+        return tx_data, None
+    BATCHES.inc(result="fetch_failed")
+    queue_failed_page(block_hash, idx, "fetch", "API limit or error")
+    return None, f"Batch starting at index {idx} failed (API limit or error); queued for retry"
+
+
+def fetch_and_store_batch(block_hash, idx, total_txs, write_mode="rows"):
     """Fetch and store a single batch of transactions."""
-    url = f"https://blockstream.info/api/block/{block_hash}/txs/{idx}"
+    url = f"{API_BASE_URL}/block/{block_hash}/txs/{idx}"
     
     # Fetch Data
     tx_data = get_api_data(url)
+    record_page(block_hash, idx, tx_data)
     
     if tx_data:
         try:
-            count = insert_transaction_batch(tx_data, block_hash, base_index=idx)
+            count = BATCH_WRITERS[write_mode](tx_data, block_hash, base_index=idx)
+            BATCHES.inc(result="stored")
             return count, None
         except Exception as e:
-            return 0, f"Batch store failed at index {idx}: {e}"
+            BATCHES.inc(result="store_failed")
+            queue_failed_page(block_hash, idx, "store", e)
+            return 0, f"Batch store failed at index {idx}: {e}; queued for retry"
     else:
-        return 0, f"Batch starting at index {idx} failed (API limit or error)"
+        BATCHES.inc(result="fetch_failed")
+        queue_failed_page(block_hash, idx, "fetch", "API limit or error")
+        return 0, f"Batch starting at index {idx} failed (API limit or error); queued for retry"
+
+
+def retry_block_pages(block, write_mode, pbar):
+    """Drain this block's queued pages, waiting out backoff for up to `inline_wait` seconds.
+
+    Returns True when the block is complete; otherwise its holes stay queued.
+    """
+    if seconds_until_next_retry(block['id']) is not None:
+        pbar.write(f"   🔁 Retrying queued pages of block #{block['height']} "
+                   f"(waiting up to {RETRY_QUEUE_CONFIG['inline_wait']}s for backoff)")
+        result = drain_retry_queue(write_mode, block_hash=block['id'], wait=RETRY_QUEUE_CONFIG["inline_wait"],
+                                   log=pbar.write, record=record_page)
+        pbar.write(f"   🔁 {result['recovered']}/{result['retried']} retried page(s) stored")
+    complete = is_block_fully_synced(block['id'], block['tx_count'])
+    if not complete:
+        pbar.write(f"   ⚠️ Block #{block['height']} still has missing pages; they remain in the retry queue")
+    return complete
+
 
+def sync_full_block(block, block_pbar=None, write_mode="rows"):
+    """Orchestrates parallel fetching and storage of all transactions in a block.
 
-def sync_full_block(block, block_pbar=None):
-    """Orchestrates parallel fetching and storage of all transactions in a block."""
+    Returns True once every page is stored, False if failed pages are left in the retry queue.
+    """
+    if write_mode not in WRITE_MODES:
+        raise ValueError(f"Unknown write mode: {write_mode}")
     block_hash = block['id']
     total_txs = block['tx_count']
     
-    if is_block_fully_synced(block_hash, total_txs):
+    # 1. Store Header and find the pages a previous run did not commit
+    indices = begin_block_sync(block)
+    if not indices:
         if block_pbar:
             block_pbar.write(f"✅ Block #{block['height']} is already fully indexed. Skipping.")
         return True
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.record_header(block, indices)
+    started = time.perf_counter()
 
-    # 1. Store Header
-    insert_block_header(block)
-
-    # 2. Setup Pagination
-    indices = list(range(0, total_txs, 25))
+    # 2. Setup Pagination (only the missing pages)
     total_stored = 0
+    fetched_pages = {}
 
     # 3. Parallel Batch Processing with rate limiting
     max_workers = 5  # Process 5 batches concurrently
@@ -45,6 +132,7 @@ def sync_full_block(block, block_pbar=None):
     # Create progress bar for transactions
     tx_pbar = tqdm(
         total=total_txs,
+        initial=total_txs - missing_tx_count(indices, total_txs),
         desc=f"Block #{block['height']}",
         unit="tx",
         leave=True,
@@ -54,17 +142,29 @@ def sync_full_block(block, block_pbar=None):
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Submit all tasks
-        future_to_idx = {
-            executor.submit(fetch_and_store_batch, block_hash, idx, total_txs): idx 
-            for idx in indices
-        }
+        if write_mode == "block":
+            future_to_idx = {
+                executor.submit(fetch_batch, block_hash, idx): idx
+                for idx in indices
+            }
+        else:
+            future_to_idx = {
+                executor.submit(fetch_and_store_batch, block_hash, idx, total_txs, write_mode): idx
+                for idx in indices
+            }
         
         # Process completed tasks as they finish
         for future in as_completed(future_to_idx):
             idx = future_to_idx[future]
             try:
-                count, error = future.result()
-                total_stored += count
+                if write_mode == "block":
+                    tx_data, error = future.result()
+                    if tx_data:
+                        fetched_pages[idx] = tx_data
+                    count = len(tx_data) if tx_data else 0
+                else:
+                    count, error = future.result()
+                    total_stored += count
                 tx_pbar.update(count)
                 
                 if error:
@@ -72,20 +172,313 @@ def sync_full_block(block, block_pbar=None):
                     
             except Exception as e:
                 tx_pbar.write(f"   ❌ Unexpected error at index {idx}: {e}")
+                queue_failed_page(block_hash, idx, "fetch", e)
             
             # Rate limiting: small delay between processing results
             time.sleep(1.2)  # Adjusted for parallel execution
+            THROTTLE_SLEEP.inc(1.2)
 
+    # 4. Whole-block mode: a single COPY round for everything fetched above
+    if write_mode == "block" and fetched_pages:
+        try:
+            total_stored = insert_block_transactions_copy(fetched_pages, block_hash)
+            BATCHES.inc(len(fetched_pages), result="stored")
+        except Exception as e:
+            BATCHES.inc(len(fetched_pages), result="store_failed")
+            tx_pbar.write(f"   ❌ Block store failed: {e}; pages queued for retry")
+            for idx in fetched_pages:
+                queue_failed_page(block_hash, idx, "store", e)
+
+    # 5. Pages that failed above are in the retry queue: give them a bounded wait now
+    complete = retry_block_pages(block, write_mode, tx_pbar)
+    if recorder is not None:
+        recorder.finish_block(block_hash, complete)
     tx_pbar.close()
-    return True
+    BLOCK_SECONDS.observe(time.perf_counter() - started, engine="threads", write_mode=write_mode)
+    return complete
+
 
 
+def sync_full_block_async(block, block_pbar=None, write_mode="rows"):
+    """Same contract as sync_full_block, but pages are fetched by the asyncio engine.
+
+    Pages arrive over one keep-alive session, paced by an adaptive token bucket
+    instead of fixed sleeps; DB writes run on a small thread pool meanwhile.
+    """
+    from async_fetch import fetch_block_pages
+
+    if write_mode not in WRITE_MODES:
+        raise ValueError(f"Unknown write mode: {write_mode}")
+    block_hash = block['id']
+    total_txs = block['tx_count']
+
+    indices = begin_block_sync(block)
+    if not indices:
+        if block_pbar:
+            block_pbar.write(f"✅ Block #{block['height']} is already fully indexed. Skipping.")
+        return True
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.record_header(block, indices)
+    started = time.perf_counter()
+
+    tx_pbar = tqdm(
+        total=total_txs,
+        initial=total_txs - missing_tx_count(indices, total_txs),
+        desc=f"Block #{block['height']}",
+        unit="tx",
+        leave=True,
+        position=1,
+        bar_format='{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]'
+    )
+
+    def store(tx_data, idx):
+        record_page(block_hash, idx, tx_data)
+        try:
+            count = BATCH_WRITERS[write_mode](tx_data, block_hash, base_index=idx)
+        except Exception:
+            BATCHES.inc(result="store_failed")
+            raise
+        BATCHES.inc(result="stored")
+        tx_pbar.update(count)
+        return count
 
-def main():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results, stats = fetch_block_pages(
+            block_hash, total_txs,
+            store=None if write_mode == "block" else store,
+            executor=executor,
+            indices=indices
+        )
+
+    fetched_pages = {}
+    for idx, result, stage, error in results:
+        if stage:
+            # Store failures were already counted by store()
+            if stage == "fetch":
+                BATCHES.inc(result="fetch_failed")
+            queue_failed_page(block_hash, idx, stage, error)
+            tx_pbar.write(f"   ❌ {error}; queued for retry")
+        elif write_mode == "block":
+            record_page(block_hash, idx, result)
+            BATCHES.inc(result="fetched")
+            fetched_pages[idx] = result
+            tx_pbar.update(len(result))
+
+    if fetched_pages:
+        try:
+            insert_block_transactions_copy(fetched_pages, block_hash)
+            BATCHES.inc(len(fetched_pages), result="stored")
+        except Exception as e:
+            BATCHES.inc(len(fetched_pages), result="store_failed")
+            tx_pbar.write(f"   ❌ Block store failed: {e}; pages queued for retry")
+            for idx in fetched_pages:
+                queue_failed_page(block_hash, idx, "store", e)
+
+    tx_pbar.write(f"   🌐 {stats['requests']} request(s), {stats['throttled']} throttled (429), "
+                  f"{stats['errors']} error(s), {stats['failed']} page(s) given up")
+    complete = retry_block_pages(block, write_mode, tx_pbar)
+    if recorder is not None:
+        recorder.finish_block(block_hash, complete)
+    tx_pbar.close()
+    BLOCK_SECONDS.observe(time.perf_counter() - started, engine="async", write_mode=write_mode)
+    return complete
+
+
+def print_pool_stats():
+    stats = get_pool().stats()
+    print(f"🔌 DB pool: {stats['connections_created']} connection(s) opened "
+          f"(avg setup {stats['connect_time_avg'] * 1000:.1f}ms, max {stats['connect_time_max'] * 1000:.1f}ms), "
+          f"{stats['checkouts']} checkouts, wait avg {stats['wait_time_avg'] * 1000:.1f}ms "
+          f"/ max {stats['wait_time_max'] * 1000:.1f}ms, {stats['timeouts']} timeout(s)")
+
+
+def print_cache_stats():
+    cache = get_response_cache()
+    if cache is not None:
+        print(format_cache_stats(cache.snapshot()))
+
+
+def print_retry_summary():
+    try:
+        print(format_retry_summary())
+    except Exception as e:
+        print(f"⚠️  Retry queue summary unavailable: {e}")
+
+
+def run_drain_retries(args):
+    """Retry every queued page, waiting out backoff of up to RETRY_QUEUE_CONFIG["max_delay"]."""
+    revived = reset_exhausted_retries()
+    if revived:
+        print(f"♻️  {revived} exhausted page(s) made due again")
+    result = drain_retry_queue("rows" if args.write_mode == "rows" else "copy",
+                               wait=RETRY_QUEUE_CONFIG["max_delay"], record=record_page)
+    print(f"🔁 {result['recovered']}/{result['retried']} retried page(s) stored, {result['failed']} failed again")
+
+
+def print_metrics_summary():
+    """One-line digest of the run's metrics: request latency, retries, DB throughput."""
+    snap = metrics.REGISTRY.snapshot()
+    http = snap["metrics"].get("fetch_http_request_seconds", [])
+    count = sum(s["count"] for s in http)
+    if count:
+        avg = sum(s["sum"] for s in http) / count
+        mb = sum(s["value"] for s in snap["metrics"].get("fetch_http_bytes_total", [])) / 1024 ** 2
+        retries = {s["reason"]: s["value"] for s in snap["metrics"].get("fetch_http_retries_total", [])}
+        print(f"📈 HTTP: {count} request(s), avg {avg * 1000:.0f}ms, {mb:.1f} MiB, "
+              f"{retries.get('rate_limited', 0)} rate-limited, "
+              f"{sum(retries.values()) - retries.get('rate_limited', 0)} other retries")
+    written = snap["metrics"].get("db_rows_written_total", [])
+    if written:
+        write_seconds = sum(s["sum"] for s in snap["metrics"].get("db_write_seconds", []))
+        rows = sum(s["value"] for s in written)
+        rate = rows / write_seconds if write_seconds else 0.0
+        print(f"📈 DB: {rows} row(s) in {write_seconds:.1f}s of writes ({rate:,.0f} rows/sec), "
+              f"{THROTTLE_SLEEP.total():.0f}s in between-batch sleeps")
+    failed = BATCHES.value(result="fetch_failed") + BATCHES.value(result="store_failed")
+    if failed:
+        print(f"📈 Batches: {failed} failed ({BATCHES.value(result='fetch_failed')} fetch, "
+              f"{BATCHES.value(result='store_failed')} store)")
+
+
+def start_metrics(args):
+    """Expose metrics over HTTP and/or a periodically rewritten JSON file."""
+    port = args.metrics_port or METRICS_CONFIG["port"]
+    path = args.metrics_file or METRICS_CONFIG["dump_file"]
+    if port:
+        metrics.serve(port)
+        print(f"📈 Metrics at http://{METRICS_CONFIG['host']}:{port}/metrics (and /metrics.json)")
+    if path:
+        metrics.start_json_dump(path)
+        print(f"📈 Metrics dumped to {path} every {METRICS_CONFIG['dump_interval']:.0f}s")
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sync Bitcoin blocks from Blockstream into PostgreSQL.")
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads",
+                        help="threads: ThreadPoolExecutor + fixed sleeps, async: asyncio + adaptive rate limit")
+    parser.add_argument("--write-mode", choices=WRITE_MODES, default="rows",
+                        help="rows: per-row INSERTs, copy: COPY per page, block: one COPY per block")
+    parser.add_argument("--from-height", type=int,
+                        help="sync a height range through the staged pipeline (always COPY writes)")
+    parser.add_argument("--to-height", type=int,
+                        help="last height of the range (default: current tip)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the range sync from the last committed checkpoint")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep running: sync new tip blocks as they arrive and backfill gaps "
+                             "(from --from-height if given)")
+    parser.add_argument("--poll-interval", type=float, help="seconds between tip polls in --follow mode")
+    parser.add_argument("--status-file", help="where --follow writes its lag/status JSON")
+    parser.add_argument("--cache", action="store_true",
+                        help="serve immutable API responses from the on-disk response cache")
+    parser.add_argument("--cache-dir", help="response cache directory (default from config)")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record every fetched header and tx page into per-block archives in DIR")
+    parser.add_argument("--record-compression", choices=("gzip", "zstd"), default="gzip")
+    parser.add_argument("--replay", metavar="DIR_OR_GLOB",
+                        help="ingest recorded archives without touching the network")
+    parser.add_argument("--replay-workers", type=int, default=4)
+    parser.add_argument("--header-workers", type=int)
+    parser.add_argument("--page-workers", type=int)
+    parser.add_argument("--drain-retries", action="store_true",
+                        help="only retry pages in the failed-page queue (including exhausted ones), then exit")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus /metrics and /metrics.json on this local port")
+    parser.add_argument("--metrics-file", help="rewrite a JSON metrics snapshot to this file periodically")
+    return parser.parse_args(argv)
+
+
+def run_range_sync(args):
+    from pipeline import CHECKPOINT_NAME, sync_height_range
+
+    from_height = args.from_height
+    if args.resume:
+        checkpoint = get_checkpoint(CHECKPOINT_NAME)
+        if checkpoint is not None:
+            from_height = checkpoint + 1
+            print(f"⏩ Resuming after checkpoint #{checkpoint}")
+        elif from_height is None:
+            print("❌ No checkpoint recorded yet; pass --from-height.")
+            return
+
+    to_height = args.to_height
+    if to_height is None:
+        tip = get_api_text(f"{API_BASE_URL}/blocks/tip/height")
+        if not tip:
+            print("❌ Could not determine the current tip height.")
+            return
+        to_height = int(tip)
+    if to_height < from_height:
+        print(f"✅ Nothing to do: checkpoint/--from-height ({from_height}) is past --to-height ({to_height}).")
+        return
+
+    sync_height_range(from_height, to_height,
+                      header_workers=args.header_workers, page_workers=args.page_workers)
+    print_pool_stats()
+    print_cache_stats()
+
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🚀 Starting Modular Parallel Ingestion...\n")
+    if args.cache or args.cache_dir:
+        configure_response_cache(path=args.cache_dir)
+    metrics_file = start_metrics(args)
+    try:
+        run_ingestion(args)
+    finally:
+        print_retry_summary()
+        print_metrics_summary()
+        if metrics_file:
+            metrics.write_json(metrics_file)
+
+
+def run_ingestion(args):
+    if args.drain_retries:
+        run_drain_retries(args)
+        return
+    if args.replay:
+        replay_archives(args.replay, write_mode="rows" if args.write_mode == "rows" else "copy",
+                        workers=args.replay_workers)
+        print_pool_stats()
+        return
+
+    if args.record:
+        start_recording(args.record, args.record_compression)
+        try:
+            run_sync(args)
+        finally:
+            recorder = get_recorder()
+            recorder.close()
+            print(recorder.summary())
+        return
+
+    run_sync(args)
+
+
+def run_follow(args):
+    from follower import follow_tip
+
+    sync = sync_full_block_async if args.engine == "async" else sync_full_block
+    follow_tip(lambda block: sync(block, write_mode=args.write_mode),
+               from_height=args.from_height, poll_interval=args.poll_interval,
+               status_file=args.status_file, write_mode=args.write_mode)
+    print_pool_stats()
+    print_cache_stats()
+
+
+def run_sync(args):
+    if args.follow:
+        run_follow(args)
+        return
+    if args.from_height is not None or args.resume:
+        run_range_sync(args)
+        return
     
     # Fetch latest blocks from Blockstream
-    blocks = get_api_data("https://blockstream.info/api/blocks")
+    blocks = get_api_data(f"{API_BASE_URL}/blocks")
     
     if blocks:
         # Filter to only process the last block (or change this to process more)
@@ -106,13 +499,21 @@ def main():
         
         for block in blocks_to_process:
             block_pbar.set_description(f"Processing Block #{block['height']}")
-            sync_full_block(block, block_pbar)
+            # The stored chain must be rolled back first if this block is on a competing branch
+            fork = resolve_reorg(block)
+            if fork is not None and not resync_after_rollback(fork, block['height']):
+                block_pbar.write(f"⚠️  Heights #{fork + 1}..#{block['height'] - 1} are not all synced yet "
+                                 f"(dataFetch.py --from-height {fork + 1} --to-height {block['height'] - 1})")
+            sync = sync_full_block_async if args.engine == "async" else sync_full_block
+            sync(block, block_pbar, write_mode=args.write_mode)
             block_pbar.update(1)
             # Short rest between blocks
             time.sleep(2)
         
         block_pbar.close()
         print("\n🎉 ALL DONE: Your relational database is fully synced.")
+        print_pool_stats()
+        print_cache_stats()
 
 
 if __name__ == "__main__":
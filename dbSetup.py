@@ -1,16 +1,272 @@
+import argparse
+import time
+
 import psycopg2
 
-from config import DB_CONFIG
+from config import DB_CONFIG, PARTITION_CONFIG, SCHEMA_VARIANT
+from db_operations import remove_height_range
+
+# Column types per schema variant (see SCHEMA_VARIANT in config.py). The
+# compact variant stores 32-byte hashes, scripts and witness items as raw
+# BYTEA and drops the *_asm columns; the explorer disassembles on demand.
+COLUMN_TYPES = {
+    "text": {"hash": "VARCHAR(64)", "script": "TEXT"},
+    "compact": {"hash": "BYTEA", "script": "BYTEA"},
+}
+
+# Cascading foreign keys between the detail tables. They are added after the
+# tables exist so a bulk initial load can skip them (--defer-indexes) and have
+# them built afterwards with build_indexes().
+FOREIGN_KEYS = [
+    ("bitcoin_transactions", "fk_transactions_block",
+     "FOREIGN KEY (block_hash) REFERENCES bitcoin_blocks(block_hash) ON DELETE CASCADE"),
+    ("bitcoin_outputs", "fk_outputs_transaction",
+     "FOREIGN KEY (txid) REFERENCES bitcoin_transactions(txid) ON DELETE CASCADE"),
+    ("bitcoin_inputs", "fk_inputs_transaction",
+     "FOREIGN KEY (txid) REFERENCES bitcoin_transactions(txid) ON DELETE CASCADE"),
+    ("bitcoin_witnesses", "fk_witnesses_input",
+     "FOREIGN KEY (txid, input_index) REFERENCES bitcoin_inputs(txid, input_index) ON DELETE CASCADE"),
+]
+
+# In the height-partitioned layout only the block FK is kept: a key between two
+# partitioned detail tables would stop their partitions from being dropped one
+# table at a time. db_operations removes detail rows by height instead.
+PARTITIONED_FOREIGN_KEYS = FOREIGN_KEYS[:1]
+
+# Secondary indexes backing the explorer routes and sync lookups:
+#   block page / is_block_fully_synced -> transactions by block_hash (in tx order)
+#   spend lookups                      -> inputs by (prev_txid, prev_vout)
+#   address lookups                    -> outputs by address, unspent outputs by address
+SECONDARY_INDEXES = [
+    ("idx_transactions_block", "bitcoin_transactions (block_hash, tx_index)"),
+    ("idx_inputs_prevout", "bitcoin_inputs (prev_txid, prev_vout)"),
+    ("idx_outputs_address", "bitcoin_outputs (address) WHERE address IS NOT NULL"),
+    ("idx_utxos_address", "bitcoin_utxos (address) WHERE address IS NOT NULL"),
+]
 
-def setup_database():
-    """Build the full relational schema: Blocks -> Transactions -> (Vins & Vouts)."""
-    print("Rebuilding database schema with Vin/Vout support...")
+def create_indexes(cur, partitioned=False):
+    """Create FKs and secondary indexes inside the current transaction (empty tables)."""
+    for table, name, definition in PARTITIONED_FOREIGN_KEYS if partitioned else FOREIGN_KEYS:
+        print(f"Adding constraint: {name}")
+        cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition};")
+    for name, definition in SECONDARY_INDEXES:
+        print(f"Creating index: {name}")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition};")
+
+def build_indexes(concurrently=True):
+    """Build deferred FKs and indexes on a loaded database.
+
+    Indexes are built with CREATE INDEX CONCURRENTLY (no write lock) unless
+    `concurrently` is False; FKs are added NOT VALID and then validated, which
+    only needs a SHARE UPDATE EXCLUSIVE lock while existing rows are checked.
+    Partitioned tables support neither, so their indexes and keys are built directly.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True  # CONCURRENTLY cannot run inside a transaction block
+    cur = conn.cursor()
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        cur.execute("SELECT relname FROM pg_class WHERE relkind = 'p'")
+        partitioned_tables = {row[0] for row in cur.fetchall()}
+        for name, definition in SECONDARY_INDEXES:
+            online = concurrently and definition.split()[0] not in partitioned_tables
+            # A failed concurrent build leaves an INVALID index behind; drop it and retry
+            cur.execute("""
+                SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+                WHERE c.relname = %s
+            """, (name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                print(f"✔️  Index {name} already exists")
+                continue
+            if row:
+                cur.execute(f"DROP INDEX {'CONCURRENTLY ' if online else ''}{name};")
+            start = time.perf_counter()
+            cur.execute(f"CREATE INDEX {'CONCURRENTLY ' if online else ''}{name} ON {definition};")
+            print(f"🔨 Index {name} built in {time.perf_counter() - start:.1f}s")
+
+        foreign_keys = PARTITIONED_FOREIGN_KEYS if "bitcoin_transactions" in partitioned_tables else FOREIGN_KEYS
+        for table, name, definition in foreign_keys:
+            cur.execute("SELECT convalidated FROM pg_constraint WHERE conname = %s", (name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                print(f"✔️  Constraint {name} already exists")
+                continue
+            start = time.perf_counter()
+            if table in partitioned_tables:
+                if row:
+                    cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name};")
+                cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition};")
+            else:
+                if not row:
+                    cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID;")
+                cur.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name};")
+            print(f"🔗 Constraint {name} validated in {time.perf_counter() - start:.1f}s")
+        print("✅ Deferred indexes and constraints are in place.")
+    finally:
+        cur.close()
+        conn.close()
+
+def create_sync_tables(cur, variant=SCHEMA_VARIANT):
+    """Per-block page bitmaps, the failed-page retry queue and named height checkpoints."""
+    print("Creating table: bitcoin_sync_state")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS bitcoin_sync_state (
+            block_hash {COLUMN_TYPES[variant]["hash"]} PRIMARY KEY REFERENCES bitcoin_blocks(block_hash) ON DELETE CASCADE,
+            height INTEGER NOT NULL,
+            tx_count INTEGER NOT NULL,
+            page_count INTEGER NOT NULL,
+            pages_done BYTEA NOT NULL,
+            pages_done_count INTEGER NOT NULL DEFAULT 0,
+            completed BOOLEAN NOT NULL DEFAULT FALSE,
+            linked BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sync_state_height ON bitcoin_sync_state (height);")
+
+    # Pages that failed to fetch or store, retried with exponential backoff
+    print("Creating table: bitcoin_retry_queue")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS bitcoin_retry_queue (
+            block_hash {COLUMN_TYPES[variant]["hash"]} REFERENCES bitcoin_blocks(block_hash) ON DELETE CASCADE,
+            base_index INTEGER,
+            height INTEGER NOT NULL,
+            stage VARCHAR(8) NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 1,
+            last_error TEXT,
+            next_attempt_at TIMESTAMPTZ NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (block_hash, base_index)
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_retry_queue_due ON bitcoin_retry_queue (next_attempt_at);")
+
+    print("Creating table: bitcoin_sync_checkpoint")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bitcoin_sync_checkpoint (
+            name VARCHAR(32) PRIMARY KEY,
+            last_height INTEGER NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+
+def create_utxo_table(cur, variant=SCHEMA_VARIANT):
+    """Live set of unspent outputs, maintained per block by db_operations."""
+    print("Creating table: bitcoin_utxos")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS bitcoin_utxos (
+            txid {COLUMN_TYPES[variant]["hash"]},
+            output_index INTEGER,
+            value BIGINT,
+            address VARCHAR(100),
+            height INTEGER,
+            PRIMARY KEY (txid, output_index)
+        );
+    """)
+
+def create_address_tables(cur, variant=SCHEMA_VARIANT):
+    """Per-address tx history and running totals, maintained per block by db_operations."""
+    print("Creating table: bitcoin_address_txs")
+    # Primary key order serves the history page: one address, newest first
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS bitcoin_address_txs (
+            address VARCHAR(100),
+            height INTEGER,
+            txid {COLUMN_TYPES[variant]["hash"]},
+            received_sats BIGINT NOT NULL DEFAULT 0,
+            spent_sats BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (address, height, txid)
+        );
+    """)
+
+    print("Creating table: bitcoin_address_stats")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bitcoin_address_stats (
+            address VARCHAR(100) PRIMARY KEY,
+            received_sats BIGINT NOT NULL DEFAULT 0,
+            spent_sats BIGINT NOT NULL DEFAULT 0,
+            tx_count BIGINT NOT NULL DEFAULT 0,
+            first_seen_height INTEGER,
+            last_seen_height INTEGER,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+
+def create_block_stats(cur, variant=SCHEMA_VARIANT):
+    """Incrementally maintained per-block stats table and the report view over it."""
+    print("Creating table: bitcoin_block_stats")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS bitcoin_block_stats (
+            block_hash {COLUMN_TYPES[variant]["hash"]} PRIMARY KEY REFERENCES bitcoin_blocks(block_hash) ON DELETE CASCADE,
+            height INTEGER NOT NULL,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            output_count BIGINT NOT NULL DEFAULT 0,
+            output_volume_sats BIGINT NOT NULL DEFAULT 0,
+            input_count BIGINT NOT NULL DEFAULT 0,
+            witness_count BIGINT NOT NULL DEFAULT 0,
+            fee_sats BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+
+    # The view keeps the original column order (plus the new counters) but
+    # reads the precomputed rows instead of aggregating every output.
+    print("Creating view: block_stats_view")
+    cur.execute("DROP VIEW IF EXISTS block_stats_view;")
+    cur.execute("""
+        CREATE VIEW block_stats_view AS
+        SELECT 
+            b.height,
+            b.block_hash,
+            b.timestamp,
+            COALESCE(s.tx_count, 0) AS transaction_count,
+            COALESCE(s.output_volume_sats, 0) AS total_volume_sats,
+            (COALESCE(s.output_volume_sats, 0) / 100000000.0) AS total_volume_btc,
+            COALESCE(s.output_count, 0) AS output_count,
+            COALESCE(s.input_count, 0) AS input_count,
+            COALESCE(s.witness_count, 0) AS witness_count,
+            COALESCE(s.fee_sats, 0) AS total_fee_sats
+        FROM 
+            bitcoin_blocks b
+        LEFT JOIN 
+            bitcoin_block_stats s ON b.block_hash = s.block_hash;
+    """)
+
+def setup_database(defer_indexes=False, variant=SCHEMA_VARIANT, db_config=None,
+                   partitioned=PARTITION_CONFIG["enabled"]):
+    """Build the full relational schema: Blocks -> Transactions -> (Vins & Vouts).
+
+    With `defer_indexes`, foreign keys and secondary indexes are left out for a
+    fast bulk initial load; run build_indexes() (`--build-indexes`) afterwards.
+    `variant` picks the "text" or "compact" column layout; `partitioned`
+    range-partitions the detail tables on block height.
+    """
+    layout = f"{variant}, height-partitioned" if partitioned else variant
+    print(f"Rebuilding database schema with Vin/Vout support ({layout} layout)...")
+    hash_type = COLUMN_TYPES[variant]["hash"]
+    script_type = COLUMN_TYPES[variant]["script"]
+    compact = variant == "compact"
+    # Partitioned detail tables: the partition key must be part of every
+    # primary key, and children carry their transaction's height
+    height_key = ", block_height" if partitioned else ""
+    height_column = "block_height INTEGER NOT NULL," if partitioned else ""
+    partition_by = " PARTITION BY RANGE (block_height)" if partitioned else ""
+    try:
+        conn = psycopg2.connect(**(db_config or DB_CONFIG))
         cur = conn.cursor()
         
         # We start by dropping in reverse order of dependencies
         print("Cleaning up old tables...")
+        cur.execute("DROP TABLE IF EXISTS bitcoin_sync_checkpoint CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS bitcoin_retry_queue CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS bitcoin_sync_state CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS bitcoin_utxos CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS bitcoin_address_txs CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS bitcoin_address_stats CASCADE;")
+        cur.execute("DROP VIEW IF EXISTS block_stats_view;")
+        cur.execute("DROP TABLE IF EXISTS bitcoin_block_stats CASCADE;")
         cur.execute("DROP TABLE IF EXISTS bitcoin_witnesses CASCADE;")
         cur.execute("DROP TABLE IF EXISTS bitcoin_inputs CASCADE;")
         cur.execute("DROP TABLE IF EXISTS bitcoin_outputs CASCADE;")
@@ -21,13 +277,13 @@ def setup_database():
         
         # 1. Blocks Table (Level 1)
         print("Creating table: bitcoin_blocks")
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE bitcoin_blocks (
-                block_hash VARCHAR(64) PRIMARY KEY,
-                previous_block_hash VARCHAR(64),
+                block_hash {hash_type} PRIMARY KEY,
+                previous_block_hash {hash_type},
                 height INTEGER UNIQUE NOT NULL,
                 version BIGINT,
-                merkle_root VARCHAR(64),
+                merkle_root {hash_type},
                 timestamp BIGINT NOT NULL,
                 bits VARCHAR(64),
                 nonce BIGINT
@@ -36,92 +292,127 @@ def setup_database():
         
         # 2. Transactions Table (Level 2)
         print("Creating table: bitcoin_transactions")
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE bitcoin_transactions (
-                txid VARCHAR(64) PRIMARY KEY,
-                block_hash VARCHAR(64) REFERENCES bitcoin_blocks(block_hash) ON DELETE CASCADE,
-                block_height INTEGER,
+                txid {hash_type},
+                block_hash {hash_type},
+                block_height INTEGER{" NOT NULL" if partitioned else ""},
                 tx_index INTEGER,
                 version INTEGER,
                 locktime BIGINT,
-                is_coinbase BOOLEAN
-            );
+                is_coinbase BOOLEAN,
+                fee BIGINT,
+                PRIMARY KEY (txid{height_key})
+            ){partition_by};
         """)
 
 
 
         # 3. Outputs Table (Detail of Transaction - "Money Created")
         print("Creating table: bitcoin_outputs")
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE bitcoin_outputs (
-                txid VARCHAR(64) REFERENCES bitcoin_transactions(txid) ON DELETE CASCADE,
+                txid {hash_type},
                 output_index INTEGER,
                 value BIGINT,
-                script_pubkey TEXT,
-                script_pubkey_asm TEXT,
+                script_pubkey {script_type},
+                {"" if compact else "script_pubkey_asm TEXT,"}
                 script_pubkey_type VARCHAR(50),
                 address VARCHAR(100),
-                PRIMARY KEY (txid, output_index)
-            );
+                spent_by_txid {hash_type},
+                spent_by_input_index INTEGER,
+                spent_height INTEGER,
+                {height_column}
+                PRIMARY KEY (txid, output_index{height_key})
+            ){partition_by};
         """)
 
 
         # 4. Inputs Table (Detail of Transaction - "Money Spent")
         print("Creating table: bitcoin_inputs")
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE bitcoin_inputs (
-                txid VARCHAR(64) REFERENCES bitcoin_transactions(txid) ON DELETE CASCADE,
+                txid {hash_type},
                 input_index INTEGER,
-                prev_txid VARCHAR(64),
+                prev_txid {hash_type},
                 prev_vout BIGINT,
-                script_sig TEXT,
-                script_sig_asm TEXT,
+                script_sig {script_type},
+                {"" if compact else "script_sig_asm TEXT,"}
                 sequence BIGINT,
                 is_coinbase BOOLEAN,
-                PRIMARY KEY (txid, input_index)
-            );
+                prev_value BIGINT,
+                prev_address VARCHAR(100),
+                {height_column}
+                PRIMARY KEY (txid, input_index{height_key})
+            ){partition_by};
         """)
 
         # 5. Witnesses Table (SegWit witness data)
         print("Creating table: bitcoin_witnesses")
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE bitcoin_witnesses (
-                txid VARCHAR(64),
+                txid {hash_type},
                 input_index INTEGER,
                 witness_index INTEGER,
-                witness_data TEXT,
-                PRIMARY KEY (txid, input_index, witness_index),
-                FOREIGN KEY (txid, input_index) REFERENCES bitcoin_inputs(txid, input_index) ON DELETE CASCADE
-            );
+                witness_data {script_type},
+                {height_column}
+                PRIMARY KEY (txid, input_index, witness_index{height_key})
+            ){partition_by};
         """)
 
-        # 6. Aggregated View
-        print("Creating view: block_stats_view")
-        cur.execute("""
-            CREATE OR REPLACE VIEW block_stats_view AS
-            SELECT 
-                b.height,
-                b.block_hash,
-                b.timestamp,
-                COUNT(DISTINCT t.txid) AS transaction_count,
-                COALESCE(SUM(o.value), 0) AS total_volume_sats,
-                (COALESCE(SUM(o.value), 0) / 100000000.0) AS total_volume_btc
-            FROM 
-                bitcoin_blocks b
-            LEFT JOIN 
-                bitcoin_transactions t ON b.block_hash = t.block_hash
-            LEFT JOIN 
-                bitcoin_outputs o ON t.txid = o.txid
-            GROUP BY 
-                b.height, b.block_hash, b.timestamp;
-        """)
+        # 6. Live UTXO set (spent-by links live on bitcoin_outputs) and address index
+        create_utxo_table(cur, variant)
+        create_address_tables(cur, variant)
+
+        # 7. Foreign keys and secondary indexes
+        if defer_indexes:
+            print("⏸️  Deferring foreign keys and secondary indexes (run with --build-indexes after loading)")
+        else:
+            create_indexes(cur, partitioned)
+
+        # 8. Sync progress tracking (resumable ingestion)
+        create_sync_tables(cur, variant)
+
+        # 9. Per-block statistics, maintained at ingest time
+        create_block_stats(cur, variant)
         
         conn.commit()
         cur.close()
         conn.close()
         print("✅ Full Relational Blockchain Schema is ready!")
+        if variant != SCHEMA_VARIANT:
+            print(f"⚠️  Set EXPLORER_SCHEMA={variant} for dataFetch.py and app.py to use this layout")
+        if partitioned != PARTITION_CONFIG["enabled"]:
+            print(f"⚠️  Set EXPLORER_PARTITIONED={int(partitioned)} for dataFetch.py and app.py to use this layout")
     except Exception as e:
         print(f"❌ Database setup failed: {e}")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or finish the explorer's database schema.")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="rebuild the schema without FKs/secondary indexes for a bulk initial load")
+    parser.add_argument("--compact", action="store_true",
+                        help="use the compact BYTEA layout for hashes, scripts and witnesses")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="range-partition the transaction, output, input and witness tables by block height")
+    parser.add_argument("--clear-heights", nargs=2, type=int, metavar=("LOW", "HIGH"),
+                        help="remove blocks LOW..HIGH and their data (drops whole partitions where possible)")
+    parser.add_argument("--build-indexes", action="store_true",
+                        help="build deferred FKs and indexes on the existing schema (does not drop data)")
+    parser.add_argument("--no-concurrently", action="store_true",
+                        help="with --build-indexes, use plain CREATE INDEX (faster, blocks writes)")
+    args = parser.parse_args(argv)
+
+    if args.build_indexes:
+        build_indexes(concurrently=not args.no_concurrently)
+    elif args.clear_heights:
+        low, high = args.clear_heights
+        removed = remove_height_range(low, high)
+        print(f"🧹 Removed {len(removed)} block(s) at heights #{low}..#{high}")
+    else:
+        setup_database(defer_indexes=args.defer_indexes,
+                       variant="compact" if args.compact else SCHEMA_VARIANT,
+                       partitioned=args.partitioned or PARTITION_CONFIG["enabled"])
+
 if __name__ == "__main__":
-    setup_database()
+    main()
@@ -1,107 +1,201 @@
 import hashlib
+import io
 import psycopg2
 from datetime import datetime
-from config import DB_CONFIG
+import metrics
+from config import DB_CONFIG, PARTITION_CONFIG, RETRY_QUEUE_CONFIG, SCHEMA_VARIANT
+from db_pool import pooled_connection
 
 def get_db_connection():
+    """Open a dedicated (unpooled) connection, e.g. for DDL or one-off scripts."""
     return psycopg2.connect(**DB_CONFIG)
 
+PAGE_SIZE = 25
+
+# Write-path metrics: time spent writing each table (INSERT loop or COPY +
+# merge), rows handed to the database, and block-completion bookkeeping.
+DB_WRITE_SECONDS = metrics.histogram("db_write_seconds", "Time writing one table's rows for a batch",
+                                     ("table", "mode"))
+DB_ROWS = metrics.counter("db_rows_written_total", "Rows submitted (duplicates skipped by ON CONFLICT included)",
+                          ("table", "mode"))
+DB_FINISH_SECONDS = metrics.histogram("db_finish_pages_seconds",
+                                      "Page bookkeeping, spend linking and address indexing per write")
+
+# --- Schema variant -----------------------------------------------------------
+# In the compact schema hashes, scripts and witness items are BYTEA and the ASM
+# columns do not exist. Values cross this module's boundary as the API's hex
+# strings either way; encode_hex()/decode_hex() convert at the edge.
+COMPACT = SCHEMA_VARIANT == "compact"
+
+
+def set_schema_variant(variant):
+    """Switch the write path between the "text" and "compact" layouts."""
+    global COMPACT
+    if variant not in ("text", "compact"):
+        raise ValueError(f"Unknown schema variant: {variant}")
+    COMPACT = variant == "compact"
+
+
+def encode_hex(value):
+    """API hex string -> the stored representation (bytes in the compact schema)."""
+    if value is None or not COMPACT:
+        return value
+    return bytes.fromhex(value)
+
+
+def decode_hex(value):
+    """Stored hash/script value -> hex string, whatever the schema variant."""
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, str) and value.startswith("\\x"):
+        return value[2:]   # BYTEA that came back inside a JSON document
+    return value
+
+
+# --- Height partitioning --------------------------------------------------------
+# In the partitioned layout the four detail tables are range-partitioned on
+# block_height (outputs, inputs and witnesses carry the column too). Partitions
+# are created when a header first reaches their range; queries about one block
+# pin every detail table to its partition, and removing a height range drops
+# whole partitions where it can. The layout is fixed per process by
+# EXPLORER_PARTITIONED; explorer_data and export import this flag as well.
+PARTITIONED = PARTITION_CONFIG["enabled"]
+PARTITIONED_TABLES = ("bitcoin_transactions", "bitcoin_outputs", "bitcoin_inputs", "bitcoin_witnesses")
+
+
+def partition_bounds(height):
+    """[start, end) of the partition holding `height`."""
+    size = PARTITION_CONFIG["blocks_per_partition"]
+    start = height - height % size
+    return start, start + size
+
+
+def partition_name(table, start):
+    return f"{table}_h{start:07d}"
+
+
+def _ensure_partitions(cur, height):
+    """Create the four partitions covering `height` if they are missing. Returns True if created."""
+    start, end = partition_bounds(height)
+    cur.execute("SELECT to_regclass(%s)", (partition_name(PARTITIONED_TABLES[-1], start),))
+    if cur.fetchone()[0] is not None:
+        return False
+    # Concurrent writers reaching a new range at once create it only once
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('explorer_partitions'))")
+    for table in PARTITIONED_TABLES:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {partition_name(table, start)}
+            PARTITION OF {table} FOR VALUES FROM ({start}) TO ({end})
+        """)
+    print(f"🧱 Created height partitions #{start}..#{end - 1}")
+    return True
+
+
+def _list_partitions(cur):
+    """Start heights of the existing detail-table partitions, ascending."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'bitcoin_transactions'::regclass
+    """)
+    return sorted(int(name.rsplit("_h", 1)[1]) for (name,) in cur.fetchall())
+
+
+def _block_partition(*aliases):
+    """SQL pinning `t` (the block %(block)s's transactions) and the given aliases to its partition.
+
+    Empty in the unpartitioned layout; lets the planner prune every other partition.
+    """
+    if not PARTITIONED:
+        return ""
+    pins = ["t.block_height = (SELECT height FROM bitcoin_blocks WHERE block_hash = %(block)s)"]
+    pins += [f"{alias}.block_height = t.block_height" for alias in aliases]
+    return "AND " + " AND ".join(pins)
+
+
 def is_block_fully_synced(block_hash, total_txs):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT COUNT(*) FROM bitcoin_transactions WHERE block_hash = %s", (block_hash,))
-        count = cur.fetchone()[0]
-        return count >= total_txs
-    finally:
-        cur.close()
-        conn.close()
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            block_hash = encode_hex(block_hash)
+            cur.execute("SELECT completed FROM bitcoin_sync_state WHERE block_hash = %s", (block_hash,))
+            state = cur.fetchone()
+            if state is not None:
+                return state[0]
+            # Blocks ingested before page tracking existed: fall back to counting
+            cur.execute("SELECT COUNT(*) FROM bitcoin_transactions WHERE block_hash = %s", (block_hash,))
+            count = cur.fetchone()[0]
+            return count >= total_txs
+        finally:
+            cur.close()
 
 def insert_block_header(block):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            INSERT INTO bitcoin_blocks (
-                block_hash, previous_block_hash, height, version, 
-                merkle_root, timestamp, bits, nonce
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) 
-            ON CONFLICT (block_hash) DO NOTHING
-        """, (
-            block['id'], block.get('previousblockhash'), block['height'], 
-            block.get('version'), block.get('merkle_root'),
-            block['timestamp'], block.get('bits'), block.get('nonce')
-        ))
-        conn.commit()
-    finally:
-        cur.close()
-        conn.close()
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            _insert_block_header(cur, block)
+            conn.commit()
+        finally:
+            cur.close()
+
+
+def _insert_block_header(cur, block):
+    if PARTITIONED:
+        _ensure_partitions(cur, block['height'])
+    cur.execute("""
+        INSERT INTO bitcoin_blocks (
+            block_hash, previous_block_hash, height, version, 
+            merkle_root, timestamp, bits, nonce
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s) 
+        ON CONFLICT (block_hash) DO NOTHING
+    """, (
+        encode_hex(block['id']), encode_hex(block.get('previousblockhash')), block['height'],
+        block.get('version'), encode_hex(block.get('merkle_root')),
+        block['timestamp'], block.get('bits'), block.get('nonce')
+    ))
 
 
 def insert_transaction_batch(transactions, block_hash, base_index=0):
     if not transactions:
         return 0
     
-    conn = get_db_connection()
+    with pooled_connection() as conn:
+        return _insert_transaction_batch(conn, transactions, block_hash, base_index)
+
+
+def _insert_transaction_batch(conn, transactions, block_hash, base_index):
+    rows = flatten_transactions(transactions, block_hash, base_index)
     cur = conn.cursor()
+    # Only rows actually inserted (not skipped by ON CONFLICT) count towards the block's stats
+    delta = dict.fromkeys(BLOCK_STAT_COLUMNS, 0)
     try:
-        for i, tx in enumerate(transactions):
-            # Calculate absolute index in the block
-            tx_index = base_index + i
-            
-            # Determine if it's a coinbase transaction
-            is_coinbase = any(vin.get('is_coinbase', False) for vin in tx.get('vin', []))
-            
-            status = tx.get('status', {})
-
-            cur.execute("""
-                INSERT INTO bitcoin_transactions (
-                    txid, block_hash, block_height, tx_index, version, locktime, is_coinbase
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT (txid) DO NOTHING
-            """, (
-                tx['txid'], block_hash, status.get('block_height'), tx_index,
-                tx.get('version'), tx.get('locktime'), is_coinbase
-            ))
-
-
-            # 2. Store Outputs
-            for n, vout in enumerate(tx.get('vout', [])):
-                cur.execute("""
-                    INSERT INTO bitcoin_outputs (
-                        txid, output_index, value, script_pubkey, script_pubkey_asm,
-                        script_pubkey_type, address
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING
-                """, (
-                    tx['txid'], n, vout.get('value'), 
-                    vout.get('scriptpubkey'), vout.get('scriptpubkey_asm'),
-                    vout.get('scriptpubkey_type'), vout.get('scriptpubkey_address')
-                ))
-
-
-            # 3. Store Inputs (Level 3)
-            for n, vin in enumerate(tx.get('vin', [])):
-                cur.execute("""
-                    INSERT INTO bitcoin_inputs (
-                        txid, input_index, prev_txid, prev_vout, 
-                        script_sig, script_sig_asm, sequence, is_coinbase
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING
-                """, (
-                    tx['txid'], n, 
-                    vin.get('txid'), vin.get('vout'),
-                    vin.get('scriptsig'), vin.get('scriptsig_asm'),
-                    vin.get('sequence'), vin.get('is_coinbase', False)
-                ))
-
-                # 4. Store Witness Data (if present)
-                witness_items = vin.get('witness', [])
-                for witness_idx, witness_data in enumerate(witness_items):
-                    cur.execute("""
-                        INSERT INTO bitcoin_witnesses (
-                            txid, input_index, witness_index, witness_data
-                        ) VALUES (%s, %s, %s, %s) ON CONFLICT DO NOTHING
-                    """, (tx['txid'], n, witness_idx, witness_data))
+        # One INSERT per row, parents first: transactions, outputs, inputs, witnesses
+        for key, table, columns in copy_tables():
+            sql = f"""
+                INSERT INTO {table} ({", ".join(columns)})
+                VALUES ({", ".join(["%s"] * len(columns))}) ON CONFLICT DO NOTHING
+            """
+            amount = {"transactions": "fee", "outputs": "value"}.get(key)
+            amount = columns.index(amount) if amount else None
+            with DB_WRITE_SECONDS.time(table=table, mode="rows"):
+                for row in rows[key]:
+                    cur.execute(sql, row)
+                    if not cur.rowcount:
+                        continue
+                    if key == "transactions":
+                        delta["tx_count"] += 1
+                        delta["fee_sats"] += row[amount] or 0
+                    elif key == "outputs":
+                        delta["output_count"] += 1
+                        delta["output_volume_sats"] += row[amount] or 0
+                    elif key == "inputs":
+                        delta["input_count"] += 1
+                    else:
+                        delta["witness_count"] += 1
+            DB_ROWS.inc(len(rows[key]), table=table, mode="rows")
 
+        _apply_block_stats(cur, {encode_hex(block_hash): delta})
+        _finish_pages(cur, [(block_hash, base_index)])
         conn.commit()
 
 
@@ -111,4 +205,866 @@ def insert_transaction_batch(transactions, block_hash, base_index=0):
         raise e
     finally:
         cur.close()
-        conn.close()
+
+
+# --- Incremental block statistics ---------------------------------------------
+# bitcoin_block_stats is maintained in the same transaction as every batch
+# write, from the rows that were actually inserted, so reports never have to
+# aggregate the raw tables.
+BLOCK_STAT_COLUMNS = ("tx_count", "fee_sats", "output_count", "output_volume_sats",
+                      "input_count", "witness_count")
+
+
+def _apply_block_stats(cur, deltas):
+    """Add {block_hash: {stat: delta}} onto bitcoin_block_stats (keys in stored form)."""
+    assignments = ", ".join(f"{c} = bitcoin_block_stats.{c} + EXCLUDED.{c}" for c in BLOCK_STAT_COLUMNS)
+    for block_hash, delta in deltas.items():
+        if not any(delta.get(c) for c in BLOCK_STAT_COLUMNS):
+            continue
+        values = {c: delta.get(c, 0) for c in BLOCK_STAT_COLUMNS}
+        values["block_hash"] = block_hash
+        cur.execute(f"""
+            INSERT INTO bitcoin_block_stats (block_hash, height, {", ".join(BLOCK_STAT_COLUMNS)})
+            SELECT b.block_hash, b.height, {", ".join(f"%({c})s" for c in BLOCK_STAT_COLUMNS)}
+            FROM bitcoin_blocks b WHERE b.block_hash = %(block_hash)s
+            ON CONFLICT (block_hash) DO UPDATE SET {assignments}, updated_at = now()
+        """, values)
+
+
+# --- Bulk (COPY) write path ---------------------------------------------------
+# Rows are flattened into per-table column buffers, streamed into session-local
+# staging tables with COPY FROM STDIN and then merged into the real tables with
+# the same ON CONFLICT DO NOTHING semantics as the per-row path above.
+# Order matters: parents are merged before the rows that reference them.
+COPY_TABLES = [
+    ("transactions", "bitcoin_transactions",
+     ("txid", "block_hash", "block_height", "tx_index", "version", "locktime", "is_coinbase", "fee")),
+    ("outputs", "bitcoin_outputs",
+     ("txid", "output_index", "value", "script_pubkey", "script_pubkey_asm",
+      "script_pubkey_type", "address")),
+    ("inputs", "bitcoin_inputs",
+     ("txid", "input_index", "prev_txid", "prev_vout", "script_sig", "script_sig_asm",
+      "sequence", "is_coinbase", "prev_value", "prev_address")),
+    ("witnesses", "bitcoin_witnesses",
+     ("txid", "input_index", "witness_index", "witness_data")),
+]
+
+# The compact schema has no stored ASM columns
+ASM_COLUMNS = ("script_pubkey_asm", "script_sig_asm")
+COMPACT_COPY_TABLES = [
+    (key, table, tuple(c for c in columns if c not in ASM_COLUMNS))
+    for key, table, columns in COPY_TABLES
+]
+
+
+def copy_tables():
+    """(key, table, columns) for the active schema variant and layout, in merge order."""
+    tables = COMPACT_COPY_TABLES if COMPACT else COPY_TABLES
+    if PARTITIONED:
+        # Child rows carry their transaction's height as the partition key
+        tables = [(key, table, columns if key == "transactions" else columns + ("block_height",))
+                  for key, table, columns in tables]
+    return tables
+
+# What each merged table contributes to bitcoin_block_stats:
+# (RETURNING list, aggregates over the inserted rows, stat columns they feed)
+MERGE_STATS = {
+    "transactions": ("txid, fee", "COUNT(*), COALESCE(SUM(ins.fee), 0)", ("tx_count", "fee_sats")),
+    "outputs": ("txid, value", "COUNT(*), COALESCE(SUM(ins.value), 0)",
+                ("output_count", "output_volume_sats")),
+    "inputs": ("txid", "COUNT(*)", ("input_count",)),
+    "witnesses": ("txid", "COUNT(*)", ("witness_count",)),
+}
+
+
+def flatten_transactions(transactions, block_hash, base_index=0, rows=None):
+    """Flatten API transactions into column-ordered row lists, one list per table.
+
+    Rows match copy_tables(): in the compact schema hashes, scripts and witness
+    items are converted to bytes here and the ASM strings are dropped; in the
+    partitioned layout child rows end with the block height.
+    """
+    if rows is None:
+        rows = {key: [] for key, _, _ in COPY_TABLES}
+    compact = COMPACT
+    partitioned = PARTITIONED
+    block_key = encode_hex(block_hash)
+
+    for i, tx in enumerate(transactions):
+        txid = tx['txid']
+        vins = tx.get('vin', [])
+        is_coinbase = any(vin.get('is_coinbase', False) for vin in vins)
+        status = tx.get('status', {})
+        height = (status.get('block_height'),) if partitioned else ()
+        if compact:
+            txid = bytes.fromhex(txid)
+
+        rows["transactions"].append((
+            txid, block_key, status.get('block_height'), base_index + i,
+            tx.get('version'), tx.get('locktime'), is_coinbase, tx.get('fee')
+        ))
+
+        for n, vout in enumerate(tx.get('vout', [])):
+            if compact:
+                rows["outputs"].append((
+                    txid, n, vout.get('value'), bytes.fromhex(vout.get('scriptpubkey') or ''),
+                    vout.get('scriptpubkey_type'), vout.get('scriptpubkey_address')
+                ) + height)
+            else:
+                rows["outputs"].append((
+                    txid, n, vout.get('value'),
+                    vout.get('scriptpubkey'), vout.get('scriptpubkey_asm'),
+                    vout.get('scriptpubkey_type'), vout.get('scriptpubkey_address')
+                ) + height)
+
+        for n, vin in enumerate(vins):
+            # Blockstream embeds the spent output, so input values need no lookup
+            prevout = vin.get('prevout') or {}
+            if compact:
+                prev_txid = vin.get('txid')
+                rows["inputs"].append((
+                    txid, n, bytes.fromhex(prev_txid) if prev_txid else None, vin.get('vout'),
+                    bytes.fromhex(vin.get('scriptsig') or ''),
+                    vin.get('sequence'), vin.get('is_coinbase', False),
+                    prevout.get('value'), prevout.get('scriptpubkey_address')
+                ) + height)
+            else:
+                rows["inputs"].append((
+                    txid, n, vin.get('txid'), vin.get('vout'),
+                    vin.get('scriptsig'), vin.get('scriptsig_asm'),
+                    vin.get('sequence'), vin.get('is_coinbase', False),
+                    prevout.get('value'), prevout.get('scriptpubkey_address')
+                ) + height)
+            for witness_idx, witness_data in enumerate(vin.get('witness', []) or []):
+                if compact:
+                    witness_data = bytes.fromhex(witness_data)
+                rows["witnesses"].append((txid, n, witness_idx, witness_data) + height)
+
+    return rows
+
+
+def _copy_value(value):
+    """Encode one value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, (bytes, memoryview)):
+        # bytea hex input; the backslash itself is escaped for COPY
+        return "\\\\x" + bytes(value).hex()
+    text = str(value)
+    if "\\" in text or "\t" in text or "\n" in text or "\r" in text:
+        text = (text.replace("\\", "\\\\").replace("\t", "\\t")
+                    .replace("\n", "\\n").replace("\r", "\\r"))
+    return text
+
+
+def _copy_buffer(rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+def copy_flattened_rows(cur, rows):
+    """COPY flattened rows into staging tables and merge them into the real tables.
+
+    Block stats are incremented from the rows the merge actually inserted.
+    Runs inside the caller's transaction; the caller commits or rolls back.
+    """
+    deltas = {}
+    staged = []
+    for key, table, columns in copy_tables():
+        if not rows.get(key):
+            continue
+        stage = f"stage_{table}"
+        column_list = ", ".join(columns)
+        returning, aggregates, stat_names = MERGE_STATS[key]
+        with DB_WRITE_SECONDS.time(table=table, mode="copy"):
+            cur.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {stage}
+                (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+            """)
+            cur.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN", _copy_buffer(rows[key]))
+            staged.append(stage)
+
+            # Inserted rows are attributed to blocks through the staged transactions
+            cur.execute(f"""
+                WITH ins AS (
+                    INSERT INTO {table} ({column_list})
+                    SELECT {column_list} FROM {stage}
+                    ON CONFLICT DO NOTHING
+                    RETURNING {returning}
+                )
+                SELECT tx.block_hash, {aggregates}
+                FROM ins
+                JOIN (SELECT DISTINCT txid, block_hash FROM stage_bitcoin_transactions) tx ON tx.txid = ins.txid
+                GROUP BY tx.block_hash
+            """)
+        DB_ROWS.inc(len(rows[key]), table=table, mode="copy")
+        for block_hash, *values in cur.fetchall():
+            delta = deltas.setdefault(decode_hex(block_hash), {})
+            for name, value in zip(stat_names, values):
+                delta[name] = delta.get(name, 0) + int(value)
+
+    _apply_block_stats(cur, {encode_hex(h): d for h, d in deltas.items()})
+    for stage in staged:
+        cur.execute(f"TRUNCATE {stage}")
+
+
+def insert_transaction_batch_copy(transactions, block_hash, base_index=0):
+    """Bulk equivalent of insert_transaction_batch using COPY + staging merge."""
+    if not transactions:
+        return 0
+    return insert_block_transactions_copy({base_index: transactions}, block_hash)
+
+
+def insert_block_transactions_copy(pages, block_hash):
+    """Write several pages ({base_index: transactions}) in a single COPY round.
+
+    Used to load a whole block at once after all of its pages have been fetched.
+    """
+    rows = None
+    total = 0
+    for base_index, transactions in sorted(pages.items()):
+        rows = flatten_transactions(transactions, block_hash, base_index, rows)
+        total += len(transactions)
+    if not total:
+        return 0
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            copy_flattened_rows(cur, rows)
+            _finish_pages(cur, [(block_hash, base_index) for base_index in pages])
+            conn.commit()
+            return total
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+def insert_flattened_rows(rows, pages=()):
+    """Write pre-flattened rows in one transaction (COPY path).
+
+    `pages` lists the (block_hash, base_index) pages the rows came from; they
+    are marked done in the same transaction, and blocks they complete get their
+    spends linked. Returns the hashes of blocks that became complete.
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            copy_flattened_rows(cur, rows)
+            completed = _finish_pages(cur, pages)
+            conn.commit()
+            return completed
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+def merge_flattened_rows(target, rows):
+    """Append one flatten_transactions() result onto another, in place."""
+    for key, values in rows.items():
+        target.setdefault(key, []).extend(values)
+    return target
+
+
+# --- Sync state / checkpoints -------------------------------------------------
+# bitcoin_sync_state keeps one row per block with a bitmap of its 25-tx pages
+# (bit n of pages_done = page starting at tx n * 25). Pages are marked in the
+# same transaction that writes their rows, so a crash never leaves a page
+# marked done without its data, and a restart only refetches missing pages.
+
+def begin_block_sync(block):
+    """Store the header and its sync-state row; return base indices still missing."""
+    page_count = (block['tx_count'] + PAGE_SIZE - 1) // PAGE_SIZE
+    block_key = encode_hex(block['id'])
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            _insert_block_header(cur, block)
+            cur.execute("""
+                INSERT INTO bitcoin_sync_state (block_hash, height, tx_count, page_count, pages_done)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (block_hash) DO NOTHING
+            """, (block_key, block['height'], block['tx_count'], page_count,
+                  psycopg2.Binary(bytes((page_count + 7) // 8))))
+            cur.execute("""
+                INSERT INTO bitcoin_block_stats (block_hash, height) VALUES (%s, %s)
+                ON CONFLICT (block_hash) DO NOTHING
+            """, (block_key, block['height']))
+            cur.execute("""
+                SELECT i * %s
+                FROM bitcoin_sync_state s, generate_series(0, s.page_count - 1) AS i
+                WHERE s.block_hash = %s AND get_bit(s.pages_done, i) = 0
+                ORDER BY i
+            """, (PAGE_SIZE, block_key))
+            missing = [row[0] for row in cur.fetchall()]
+            conn.commit()
+            return missing
+        finally:
+            cur.close()
+
+
+def _mark_pages_done(cur, pages):
+    """Flip page bits inside the caller's transaction; return newly completed block hashes."""
+    completed = []
+    for block_hash, base_index in pages:
+        page = base_index // PAGE_SIZE
+        cur.execute("""
+            UPDATE bitcoin_sync_state s
+            SET pages_done = set_bit(s.pages_done, %(page)s, 1),
+                pages_done_count = s.pages_done_count + 1 - get_bit(s.pages_done, %(page)s),
+                completed = s.pages_done_count + 1 - get_bit(s.pages_done, %(page)s) >= s.page_count,
+                updated_at = now()
+            FROM (
+                SELECT completed FROM bitcoin_sync_state
+                WHERE block_hash = %(block_hash)s FOR UPDATE
+            ) AS before
+            WHERE s.block_hash = %(block_hash)s
+            RETURNING s.completed AND NOT before.completed
+        """, {"page": page, "block_hash": encode_hex(block_hash)})
+        row = cur.fetchone()
+        if row and row[0] and block_hash not in completed:
+            completed.append(block_hash)
+    return completed
+
+
+def _finish_pages(cur, pages):
+    """Mark pages done; link spends and index addresses of every block this completes."""
+    with DB_FINISH_SECONDS.time():
+        completed = _mark_pages_done(cur, pages)
+        _dequeue_pages(cur, pages)
+        for block_hash in completed:
+            block_key = encode_hex(block_hash)
+            if _apply_block_spends(cur, block_key):
+                _apply_address_index(cur, block_key)
+    return completed
+
+
+# --- Spent-output links / UTXO set --------------------------------------------
+# When a block's last page is committed its inputs are linked to the outputs
+# they spend (spent_by_* on bitcoin_outputs) and bitcoin_utxos is updated, in
+# the same transaction. Links are made in both directions so blocks may
+# complete in any order: a block's inputs mark older outputs spent, and its
+# own outputs pick up spends from blocks that completed before it. The UTXO
+# set only reflects the indexed range of the chain.
+
+def _apply_block_spends(cur, block_key):
+    """Link one block's spends; no-op if it is already linked. Returns True if applied."""
+    cur.execute("""
+        UPDATE bitcoin_sync_state SET linked = TRUE
+        WHERE block_hash = %s AND NOT linked
+        RETURNING height
+    """, (block_key,))
+    if cur.fetchone() is None:
+        return False
+
+    # Outputs (in this or any stored block) spent by this block's inputs
+    cur.execute(f"""
+        UPDATE bitcoin_outputs o
+        SET spent_by_txid = i.txid, spent_by_input_index = i.input_index, spent_height = t.block_height
+        FROM bitcoin_transactions t
+        JOIN bitcoin_inputs i ON i.txid = t.txid
+        WHERE t.block_hash = %(block)s AND NOT i.is_coinbase {_block_partition("i")}
+          AND o.txid = i.prev_txid AND o.output_index = i.prev_vout
+    """, {"block": block_key})
+    # This block's outputs already spent by blocks linked before it
+    cur.execute(f"""
+        UPDATE bitcoin_outputs o
+        SET spent_by_txid = i.txid, spent_by_input_index = i.input_index, spent_height = st.block_height
+        FROM bitcoin_transactions t, bitcoin_inputs i
+        JOIN bitcoin_transactions st ON st.txid = i.txid
+        JOIN bitcoin_sync_state ss ON ss.block_hash = st.block_hash AND ss.linked
+        WHERE t.block_hash = %(block)s AND o.txid = t.txid AND o.spent_by_txid IS NULL {_block_partition("o")}
+          AND i.prev_txid = o.txid AND i.prev_vout = o.output_index
+    """, {"block": block_key})
+    cur.execute(f"""
+        DELETE FROM bitcoin_utxos u
+        USING bitcoin_transactions t, bitcoin_inputs i
+        WHERE t.block_hash = %(block)s AND i.txid = t.txid AND NOT i.is_coinbase {_block_partition("i")}
+          AND u.txid = i.prev_txid AND u.output_index = i.prev_vout
+    """, {"block": block_key})
+    cur.execute(f"""
+        INSERT INTO bitcoin_utxos (txid, output_index, value, address, height)
+        SELECT o.txid, o.output_index, o.value, o.address, t.block_height
+        FROM bitcoin_transactions t JOIN bitcoin_outputs o ON o.txid = t.txid
+        WHERE t.block_hash = %(block)s AND o.spent_by_txid IS NULL {_block_partition("o")}
+          AND o.script_pubkey_type IS DISTINCT FROM 'op_return'
+        ON CONFLICT DO NOTHING
+    """, {"block": block_key})
+    return True
+
+
+def _unlink_block_spends(cur, block_key):
+    """Undo _apply_block_spends for one block (used before rolling it back)."""
+    cur.execute("""
+        UPDATE bitcoin_sync_state SET linked = FALSE
+        WHERE block_hash = %s AND linked
+        RETURNING height
+    """, (block_key,))
+    if cur.fetchone() is None:
+        return False
+
+    # Outputs of other blocks this block spent become unspent again (and
+    # return to the UTXO set if their own block is linked)
+    cur.execute(f"""
+        WITH freed AS (
+            UPDATE bitcoin_outputs o
+            SET spent_by_txid = NULL, spent_by_input_index = NULL, spent_height = NULL
+            FROM bitcoin_transactions t
+            JOIN bitcoin_inputs i ON i.txid = t.txid
+            WHERE t.block_hash = %(block)s AND NOT i.is_coinbase {_block_partition("i")}
+              AND o.txid = i.prev_txid AND o.output_index = i.prev_vout
+            RETURNING o.txid, o.output_index, o.value, o.address, o.script_pubkey_type
+        )
+        INSERT INTO bitcoin_utxos (txid, output_index, value, address, height)
+        SELECT f.txid, f.output_index, f.value, f.address, ft.block_height
+        FROM freed f
+        JOIN bitcoin_transactions ft ON ft.txid = f.txid
+        JOIN bitcoin_sync_state fs ON fs.block_hash = ft.block_hash AND fs.linked
+        WHERE ft.block_hash <> %(block)s AND f.script_pubkey_type IS DISTINCT FROM 'op_return'
+        ON CONFLICT DO NOTHING
+    """, {"block": block_key})
+    cur.execute(f"""
+        DELETE FROM bitcoin_utxos u USING bitcoin_transactions t
+        WHERE t.block_hash = %(block)s AND u.txid = t.txid {_block_partition()}
+    """, {"block": block_key})
+    return True
+
+
+# --- Failed-page retry queue ---------------------------------------------------
+# A page that could not be fetched or stored is queued with a backoff time;
+# retry_queue.drain_retry_queue() re-fetches due pages. A page leaves the queue
+# in the transaction that marks it done, whichever write path stored it.
+
+def _dequeue_pages(cur, pages):
+    for block_hash, base_index in pages:
+        cur.execute("DELETE FROM bitcoin_retry_queue WHERE block_hash = %s AND base_index = %s",
+                    (encode_hex(block_hash), base_index))
+
+
+def enqueue_failed_page(block_hash, base_index, stage, error):
+    """Queue (or re-queue with a longer backoff) a page that failed to `stage` ("fetch"/"store")."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO bitcoin_retry_queue AS q
+                    (block_hash, base_index, height, stage, last_error, next_attempt_at)
+                SELECT b.block_hash, %(idx)s, b.height, %(stage)s, %(error)s,
+                       now() + make_interval(secs => %(base)s)
+                FROM bitcoin_blocks b WHERE b.block_hash = %(block)s
+                ON CONFLICT (block_hash, base_index) DO UPDATE SET
+                    attempts = q.attempts + 1,
+                    stage = EXCLUDED.stage,
+                    last_error = EXCLUDED.last_error,
+                    next_attempt_at = now() + make_interval(secs => LEAST(%(max)s, %(base)s * power(2, q.attempts))),
+                    updated_at = now()
+                RETURNING attempts
+            """, {"block": encode_hex(block_hash), "idx": base_index, "stage": stage, "error": str(error)[:500],
+                  "base": RETRY_QUEUE_CONFIG["base_delay"], "max": RETRY_QUEUE_CONFIG["max_delay"]})
+            row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else None
+        finally:
+            cur.close()
+
+
+def get_due_retries(limit, block_hash=None):
+    """[(block_hash, base_index, attempts)] whose backoff has elapsed, oldest due first."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT block_hash, base_index, attempts FROM bitcoin_retry_queue
+                WHERE next_attempt_at <= now() AND attempts < %(max)s
+                  AND (%(block)s IS NULL OR block_hash = %(block)s)
+                ORDER BY next_attempt_at
+                LIMIT %(limit)s
+            """, {"max": RETRY_QUEUE_CONFIG["max_attempts"], "limit": limit,
+                  "block": encode_hex(block_hash) if block_hash else None})
+            return [(decode_hex(h), idx, attempts) for h, idx, attempts in cur.fetchall()]
+        finally:
+            cur.close()
+
+
+def reset_exhausted_retries():
+    """Make pages that reached max_attempts due again with a fresh backoff; returns how many."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                UPDATE bitcoin_retry_queue SET attempts = 0, next_attempt_at = now(), updated_at = now()
+                WHERE attempts >= %s
+            """, (RETRY_QUEUE_CONFIG["max_attempts"],))
+            conn.commit()
+            return cur.rowcount
+        finally:
+            cur.close()
+
+
+def seconds_until_next_retry(block_hash=None):
+    """Seconds until the next retryable page is due (<= 0: due now), or None if none is queued."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT EXTRACT(EPOCH FROM MIN(next_attempt_at) - now()) FROM bitcoin_retry_queue
+                WHERE attempts < %(max)s AND (%(block)s IS NULL OR block_hash = %(block)s)
+            """, {"max": RETRY_QUEUE_CONFIG["max_attempts"],
+                  "block": encode_hex(block_hash) if block_hash else None})
+            seconds = cur.fetchone()[0]
+            return float(seconds) if seconds is not None else None
+        finally:
+            cur.close()
+
+
+def get_retry_queue_summary():
+    """Counts of queued pages: pending (will retry), due now, exhausted (max_attempts reached)."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT COUNT(*) FILTER (WHERE attempts < %(max)s),
+                       COUNT(*) FILTER (WHERE attempts < %(max)s AND next_attempt_at <= now()),
+                       COUNT(*) FILTER (WHERE attempts >= %(max)s),
+                       COUNT(DISTINCT block_hash), MIN(height), MAX(height)
+                FROM bitcoin_retry_queue
+            """, {"max": RETRY_QUEUE_CONFIG["max_attempts"]})
+            pending, due, exhausted, blocks, low, high = cur.fetchone()
+            return {"pending": pending, "due": due, "exhausted": exhausted, "blocks": blocks,
+                    "min_height": low, "max_height": high}
+        finally:
+            cur.close()
+
+
+# --- Address index --------------------------------------------------------------
+# bitcoin_address_txs holds one row per (address, tx) with what the tx paid to
+# and spent from the address; bitcoin_address_stats keeps running totals. Both
+# are written once per block when it completes, under the same `linked` flag
+# as the spend links. Spent amounts come from the inputs' embedded prevout, so
+# they do not depend on the spent output's block being indexed.
+def _block_address_flows():
+    """Per (address, tx) received/spent sums of the block %(block)s."""
+    return f"""
+    WITH flows AS (
+        SELECT o.address, t.block_height AS height, o.txid,
+               SUM(o.value) AS received_sats, 0 AS spent_sats
+        FROM bitcoin_transactions t JOIN bitcoin_outputs o ON o.txid = t.txid
+        WHERE t.block_hash = %(block)s AND o.address IS NOT NULL {_block_partition("o")}
+        GROUP BY o.address, t.block_height, o.txid
+        UNION ALL
+        SELECT i.prev_address, t.block_height, i.txid, 0, SUM(i.prev_value)
+        FROM bitcoin_transactions t JOIN bitcoin_inputs i ON i.txid = t.txid
+        WHERE t.block_hash = %(block)s AND i.prev_address IS NOT NULL {_block_partition("i")}
+        GROUP BY i.prev_address, t.block_height, i.txid
+    )
+    SELECT address, height, txid,
+           SUM(received_sats)::BIGINT AS received_sats, SUM(spent_sats)::BIGINT AS spent_sats
+    FROM flows
+    GROUP BY address, height, txid
+"""
+
+
+def _apply_address_index(cur, block_key):
+    cur.execute(f"""
+        WITH per_tx AS ({_block_address_flows()}),
+        ins AS (
+            INSERT INTO bitcoin_address_txs (address, height, txid, received_sats, spent_sats)
+            SELECT address, height, txid, received_sats, spent_sats FROM per_tx
+            ON CONFLICT DO NOTHING
+            RETURNING address, height, received_sats, spent_sats
+        )
+        INSERT INTO bitcoin_address_stats AS s
+            (address, received_sats, spent_sats, tx_count, first_seen_height, last_seen_height)
+        SELECT address, SUM(received_sats), SUM(spent_sats), COUNT(*), MIN(height), MAX(height)
+        FROM ins GROUP BY address
+        ON CONFLICT (address) DO UPDATE SET
+            received_sats = s.received_sats + EXCLUDED.received_sats,
+            spent_sats = s.spent_sats + EXCLUDED.spent_sats,
+            tx_count = s.tx_count + EXCLUDED.tx_count,
+            first_seen_height = LEAST(s.first_seen_height, EXCLUDED.first_seen_height),
+            last_seen_height = GREATEST(s.last_seen_height, EXCLUDED.last_seen_height),
+            updated_at = now()
+    """, {"block": block_key})
+
+
+def _unlink_address_index(cur, block_key):
+    """Subtract one block from the address index (its rows must still exist)."""
+    cur.execute(f"""
+        WITH per_tx AS ({_block_address_flows()}),
+        removed AS (
+            DELETE FROM bitcoin_address_txs a USING per_tx p
+            WHERE a.address = p.address AND a.height = p.height AND a.txid = p.txid
+            RETURNING a.address, a.received_sats, a.spent_sats
+        )
+        UPDATE bitcoin_address_stats s
+        SET received_sats = s.received_sats - r.received_sats,
+            spent_sats = s.spent_sats - r.spent_sats,
+            tx_count = s.tx_count - r.tx_count,
+            updated_at = now()
+        FROM (
+            SELECT address, SUM(received_sats) AS received_sats, SUM(spent_sats) AS spent_sats,
+                   COUNT(*) AS tx_count
+            FROM removed GROUP BY address
+        ) r
+        WHERE s.address = r.address
+        RETURNING s.address
+    """, {"block": block_key})
+    touched = [row[0] for row in cur.fetchall()]
+    if touched:
+        # Re-derive first/last seen from the remaining history (primary key range scans)
+        cur.execute("""
+            UPDATE bitcoin_address_stats s SET
+                first_seen_height = (SELECT MIN(height) FROM bitcoin_address_txs a WHERE a.address = s.address),
+                last_seen_height = (SELECT MAX(height) FROM bitcoin_address_txs a WHERE a.address = s.address)
+            WHERE s.address = ANY(%s)
+        """, (touched,))
+        cur.execute("DELETE FROM bitcoin_address_stats WHERE address = ANY(%s) AND tx_count = 0", (touched,))
+
+
+def apply_block_spends(block_hash):
+    """Link a fully synced block's spends now (e.g. blocks synced before linking existed)."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            block_key = encode_hex(block_hash)
+            cur.execute("SELECT completed FROM bitcoin_sync_state WHERE block_hash = %s", (block_key,))
+            row = cur.fetchone()
+            if not row or not row[0]:
+                return False
+            applied = _apply_block_spends(cur, block_key)
+            if applied:
+                _apply_address_index(cur, block_key)
+            conn.commit()
+            return applied
+        finally:
+            cur.close()
+
+
+def unlink_block_spends(block_hash):
+    """Remove a block's spend links (restoring the UTXOs it spent) and its address index rows."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            block_key = encode_hex(block_hash)
+            unlinked = _unlink_block_spends(cur, block_key)
+            if unlinked:
+                _unlink_address_index(cur, block_key)
+            conn.commit()
+            return unlinked
+        finally:
+            cur.close()
+
+
+# --- Rollback -----------------------------------------------------------------
+# Listeners (e.g. the explorer's page cache) are told which height the chain
+# was rolled back to.
+ROLLBACK_CHANNEL = "explorer_rollback"
+
+
+def get_block_hash(height):
+    """Hex hash of the stored block at `height`, or None."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT block_hash FROM bitcoin_blocks WHERE height = %s", (height,))
+            row = cur.fetchone()
+            return decode_hex(row[0]) if row else None
+        finally:
+            cur.close()
+
+
+def get_indexed_height():
+    """Height of the highest fully synced block, or None."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT height FROM bitcoin_sync_state WHERE completed
+                ORDER BY height DESC LIMIT 1
+            """)
+            row = cur.fetchone()
+            return row[0] if row else None
+        finally:
+            cur.close()
+
+
+def get_missing_heights(from_height, to_height, limit=None):
+    """Heights in [from_height, to_height] without a fully synced block, ascending."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT h FROM generate_series(%s, %s) AS h
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM bitcoin_blocks b
+                    JOIN bitcoin_sync_state s ON s.block_hash = b.block_hash
+                    WHERE b.height = h AND s.completed
+                )
+                ORDER BY h
+                LIMIT %s
+            """, (from_height, to_height, limit))
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+
+
+def get_tip_height():
+    """Height of the highest stored block, or None for an empty database."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT MAX(height) FROM bitcoin_blocks")
+            return cur.fetchone()[0]
+        finally:
+            cur.close()
+
+
+def get_lowest_height():
+    """Height of the lowest stored block, or None for an empty database."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT MIN(height) FROM bitcoin_blocks")
+            return cur.fetchone()[0]
+        finally:
+            cur.close()
+
+
+def get_contiguous_height(from_height):
+    """Highest height h such that every height in [from_height, h] has a fully synced block.
+
+    Returns from_height - 1 when from_height itself is missing. The scan walks
+    the completed heights up from `from_height` to the first gap, so callers
+    keep a checkpoint to start from.
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT CASE
+                    WHEN NOT EXISTS (
+                        SELECT 1 FROM bitcoin_sync_state WHERE completed AND height = %(low)s
+                    ) THEN %(low)s - 1
+                    ELSE (
+                        SELECT MIN(s.height) FROM bitcoin_sync_state s
+                        WHERE s.completed AND s.height >= %(low)s
+                          AND NOT EXISTS (
+                              SELECT 1 FROM bitcoin_sync_state n
+                              WHERE n.completed AND n.height = s.height + 1
+                          )
+                    )
+                END
+            """, {"low": from_height})
+            return cur.fetchone()[0]
+        finally:
+            cur.close()
+
+
+def rollback_to_height(height):
+    """Remove every block above `height` in a single transaction (see remove_height_range)."""
+    return remove_height_range(height + 1)
+
+
+def remove_height_range(low, high=None):
+    """Remove the blocks at heights low..high (open-ended without `high`) in one transaction.
+
+    Spend links and address index rows are undone newest block first, the blocks are deleted (their
+    transactions, inputs, outputs, witnesses, sync state and stats go with them
+    through ON DELETE CASCADE, or with their partitions in the partitioned
+    layout), checkpoints at or above `low` are lowered and a NOTIFY is sent on
+    ROLLBACK_CHANNEL. Returns the removed block hashes.
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT 1 FROM pg_constraint WHERE conname = 'fk_transactions_block'")
+            if cur.fetchone() is None:
+                raise RuntimeError("Rollback needs the cascading foreign keys; run dbSetup.py --build-indexes first")
+            cur.execute("""
+                SELECT block_hash FROM bitcoin_blocks
+                WHERE height >= %(low)s AND (%(high)s::INTEGER IS NULL OR height <= %(high)s)
+                ORDER BY height DESC FOR UPDATE
+            """, {"low": low, "high": high})
+            removed = [row[0] for row in cur.fetchall()]
+            for block_key in removed:
+                if _unlink_block_spends(cur, block_key):
+                    _unlink_address_index(cur, block_key)
+            _delete_height_range(cur, low, high)
+            cur.execute("""
+                UPDATE bitcoin_sync_checkpoint SET last_height = %s, updated_at = now()
+                WHERE last_height >= %s
+            """, (low - 1, low))
+            cur.execute("SELECT pg_notify(%s, %s)", (ROLLBACK_CHANNEL, str(low - 1)))
+            conn.commit()
+            return [decode_hex(block_key) for block_key in removed]
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+def _delete_height_range(cur, low, high=None):
+    """Delete the blocks at heights low..high and everything stored under them.
+
+    In the partitioned layout partitions lying entirely inside the range are
+    dropped instead of emptied row by row (children first), and the remaining
+    detail rows are deleted by height so the cascade has nothing left to scan.
+    """
+    if PARTITIONED:
+        covered = [start for start in _list_partitions(cur)
+                   if start >= low and (high is None or partition_bounds(start)[1] - 1 <= high)]
+        for start in covered:
+            for table in reversed(PARTITIONED_TABLES):
+                cur.execute(f"DROP TABLE {partition_name(table, start)}")
+        if covered:
+            print(f"🧱 Dropped {len(covered)} height partition(s) from #{covered[0]}")
+        for table in reversed(PARTITIONED_TABLES):
+            cur.execute(f"""
+                DELETE FROM {table}
+                WHERE block_height >= %(low)s AND (%(high)s::INTEGER IS NULL OR block_height <= %(high)s)
+            """, {"low": low, "high": high})
+    cur.execute("""
+        DELETE FROM bitcoin_blocks
+        WHERE height >= %(low)s AND (%(high)s::INTEGER IS NULL OR height <= %(high)s)
+    """, {"low": low, "high": high})
+
+
+def get_checkpoint(name):
+    """Last height below which every block of the named sync is committed, or None."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT last_height FROM bitcoin_sync_checkpoint WHERE name = %s", (name,))
+            row = cur.fetchone()
+            return row[0] if row else None
+        finally:
+            cur.close()
+
+
+def save_checkpoint(name, height):
+    """Advance (never rewind) the named checkpoint to `height`."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO bitcoin_sync_checkpoint (name, last_height) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE
+                SET last_height = GREATEST(bitcoin_sync_checkpoint.last_height, EXCLUDED.last_height),
+                    updated_at = now()
+            """, (name, height))
+            conn.commit()
+        finally:
+            cur.close()
@@ -0,0 +1,246 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+import metrics
+from config import DB_CONFIG, DB_POOL_CONFIG
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool shared by the ingester and the explorer.
+
+    Connections are created lazily up to `max_size`; callers block for at most
+    `timeout` seconds when the pool is exhausted. Connections that sat idle for
+    longer than `health_check_after` seconds are pinged before being handed out.
+    """
+
+    def __init__(self, db_config, min_size=1, max_size=10, timeout=30.0, health_check_after=30.0):
+        if min_size > max_size:
+            raise ValueError("min_size cannot exceed max_size")
+        self.db_config = dict(db_config)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(conn, last_used_monotonic)]
+        self._size = 0           # open connections, idle + checked out
+        self._in_use = 0
+        self._closed = False
+
+        self._connections_created = 0
+        self._connect_time_total = 0.0
+        self._connect_time_max = 0.0
+        self._checkouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._health_check_failures = 0
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        start = time.perf_counter()
+        conn = psycopg2.connect(**self.db_config)
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self._connections_created += 1
+            self._connect_time_total += elapsed
+            self._connect_time_max = max(self._connect_time_max, elapsed)
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot."""
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        conn, last_used = None, None
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1  # reserve the slot, connect outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+            self._in_use += 1
+            waited = time.perf_counter() - start
+            self._checkouts += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._health_check_failures += 1
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """Return a connection; broken or discarded connections are closed."""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                to_close = conn
+            else:
+                self._idle.append((conn, time.monotonic()))
+                to_close = None
+            self._cond.notify()
+
+        if to_close is not None:
+            self._close_quietly(to_close)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Snapshot of pool sizing and timing counters (seconds)."""
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "health_check_failures": self._health_check_failures,
+                "connections_created": self._connections_created,
+                "connect_time_total": round(self._connect_time_total, 6),
+                "connect_time_avg": round(self._connect_time_total / self._connections_created, 6)
+                if self._connections_created else 0.0,
+                "connect_time_max": round(self._connect_time_max, 6),
+                "wait_time_total": round(self._wait_time_total, 6),
+                "wait_time_avg": round(self._wait_time_total / self._checkouts, 6)
+                if self._checkouts else 0.0,
+                "wait_time_max": round(self._wait_time_max, 6),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_stat(name):
+    """Gauge reader: a stat of the shared pool, None until it exists."""
+    return lambda: _pool.stats()[name] if _pool is not None else None
+
+
+for _name, _help in (("size", "Open connections"), ("in_use", "Connections checked out"),
+                     ("checkouts", "Checkouts since start"), ("timeouts", "Checkouts that timed out"),
+                     ("wait_time_total", "Seconds spent waiting for a connection")):
+    metrics.gauge(f"db_pool_{_name}", _help, _pool_stat(_name))
+
+
+def get_pool():
+    """Return the process-wide pool, creating it from config on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **DB_POOL_CONFIG)
+    return _pool
+
+
+def configure_pool(db_config=None, **overrides):
+    """Replace the process-wide pool, e.g. to size it for a worker count."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        settings = dict(DB_POOL_CONFIG, **overrides)
+        _pool = ConnectionPool(db_config or DB_CONFIG, **settings)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def pooled_connection():
+    """Check a connection out of the shared pool for the duration of a block.
+
+    The connection is rolled back if left mid-transaction and returned to the
+    pool; connections that broke while in use are discarded.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except psycopg2.InterfaceError:
+        pool.putconn(conn, discard=True)
+        raise
+    except psycopg2.OperationalError:
+        pool.putconn(conn, discard=conn.closed != 0)
+        raise
+    except BaseException:
+        pool.putconn(conn)
+        raise
+    else:
+        pool.putconn(conn)
@@ -0,0 +1,132 @@
+import json
+import time
+
+from flask import Blueprint, Response, abort, jsonify, request, stream_with_context
+
+from config import API_CONFIG
+from db_pool import pooled_connection
+from explorer_data import QUERY_SECONDS, db_key, load_transaction, present
+
+# Machine-readable explorer endpoints. Block transaction lists are streamed
+# from a server-side (named) cursor as chunked JSON, so memory stays flat
+# however large the block, and paginated by tx_index (?after=&limit=).
+
+api = Blueprint("api", __name__, url_prefix="/api")
+
+BLOCK_SUMMARY = """
+    SELECT b.*, s.tx_count, s.fee_sats, s.output_count, s.output_volume_sats,
+           s.input_count, s.witness_count
+    FROM bitcoin_blocks b
+    LEFT JOIN bitcoin_block_stats s ON s.block_hash = b.block_hash
+    WHERE b.block_hash = %s;
+"""
+BLOCK_EXISTS = "SELECT height FROM bitcoin_blocks WHERE block_hash = %s;"
+BLOCK_TXS_PAGE = """
+    SELECT txid, tx_index, block_height, version, locktime, is_coinbase, fee
+    FROM bitcoin_transactions
+    WHERE block_hash = %s AND block_height = %s AND tx_index > %s
+    ORDER BY tx_index
+    LIMIT %s;
+"""
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return jsonify({"error": "not found"}), 404
+
+
+def _fetch_one(name, sql, params):
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            with QUERY_SECONDS.time(query=name):
+                cur.execute(sql, params)
+                row = cur.fetchone()
+            return dict(zip([d[0] for d in cur.description], row)) if row else None
+        finally:
+            cur.close()
+
+
+@api.route('/block/<block_hash>')
+def block(block_hash):
+    """Block header with its precomputed stats and a link to its transactions."""
+    row = _fetch_one("api_block_summary", BLOCK_SUMMARY, (db_key(block_hash),))
+    if row is None:
+        abort(404)
+    row = present(row)
+    row["txs_url"] = f"/api/block/{row['block_hash']}/txs"
+    return jsonify(row)
+
+
+@api.route('/block/<block_hash>/txs')
+def block_txs(block_hash):
+    """Stream one page of a block's transactions in tx_index order.
+
+    The response ends with `next`, the URL of the following page (or null).
+    """
+    key = db_key(block_hash)
+    limit = request.args.get('limit', API_CONFIG['page_size'], type=int)
+    limit = max(1, min(limit, API_CONFIG['max_page_size']))
+    after = request.args.get('after', -1, type=int)
+    row = _fetch_one("api_block_exists", BLOCK_EXISTS, (key,))
+    if row is None:
+        abort(404)
+    height = row["height"]
+    path = request.path
+
+    def generate():
+        count, last_index, more = 0, after, False
+        yield '{"block_hash": %s, "txs": [' % json.dumps(block_hash.lower())
+        with pooled_connection() as conn:
+            # Named cursor: PostgreSQL holds the result, we pull fetch_size rows at a time
+            cur = conn.cursor(name="api_block_txs")
+            cur.itersize = API_CONFIG['fetch_size']
+            started = time.perf_counter()
+            try:
+                cur.execute(BLOCK_TXS_PAGE, (key, height, after, limit + 1))
+                columns = None
+                chunk = []
+                for row in cur:
+                    if count == limit:
+                        more = True   # the extra row only tells us another page exists
+                        break
+                    if columns is None:
+                        columns = [d[0] for d in cur.description]
+                    tx = present(dict(zip(columns, row)))
+                    chunk.append(("," if count else "") + json.dumps(tx))
+                    count += 1
+                    last_index = tx['tx_index']
+                    if len(chunk) >= API_CONFIG['fetch_size']:
+                        yield "".join(chunk)
+                        chunk = []
+                if chunk:
+                    yield "".join(chunk)
+            finally:
+                cur.close()
+                # Whole stream, client write time included: the cursor is open throughout
+                QUERY_SECONDS.observe(time.perf_counter() - started, query="api_block_txs_stream")
+        next_url = f"{path}?after={last_index}&limit={limit}" if more else None
+        yield '], "count": %d, "next": %s}' % (count, json.dumps(next_url))
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+@api.route('/tx/<txid>')
+def transaction(txid):
+    """Transaction with nested vin (incl. witness) and vout, in one query.
+
+    `?height=` (the block height, when known) narrows the lookup to one partition.
+    """
+    key = db_key(txid)
+    height = request.args.get('height', type=int)
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            tx, vouts, vins = load_transaction(cur, key, height)
+        finally:
+            cur.close()
+    if tx is None:
+        abort(404)
+    tx["vin"] = vins
+    tx["vout"] = vouts
+    return jsonify(tx)
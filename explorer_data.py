@@ -0,0 +1,101 @@
+from flask import abort
+
+import metrics
+from db_operations import PARTITIONED, decode_hex, encode_hex
+from script_asm import disassemble
+
+# Queries and row presentation shared by the HTML explorer (app.py) and the
+# JSON API (explorer_api.py). Rows leave here with hex strings for hashes and
+# scripts whatever the schema variant.
+
+QUERY_SECONDS = metrics.histogram("explorer_query_seconds", "Explorer database query time (incl. fetch)",
+                                  ("query",))
+
+# Detail pages are one round trip each: the server nests child rows as JSON.
+# Witness items are grouped per input in SQL rather than in Python. Every
+# detail table is also matched on height so that, in the partitioned layout,
+# only the partition holding the block or transaction is read.
+BLOCK_DETAIL = """
+    SELECT to_jsonb(b) AS block,
+           COALESCE((
+               SELECT json_agg(json_build_object(
+                          'txid', t.txid, 'tx_index', t.tx_index, 'version', t.version,
+                          'locktime', t.locktime, 'is_coinbase', t.is_coinbase)
+                      ORDER BY t.tx_index)
+               FROM bitcoin_transactions t WHERE t.block_hash = b.block_hash AND t.block_height = b.height
+           ), '[]') AS transactions
+    FROM bitcoin_blocks b
+    WHERE b.block_hash = %s;
+"""
+
+def _same_partition(alias):
+    return f"AND {alias}.block_height = t.block_height" if PARTITIONED else ""
+
+
+TX_DETAIL = f"""
+    SELECT to_jsonb(t) AS tx,
+           COALESCE((
+               SELECT json_agg(o ORDER BY o.output_index)
+               FROM bitcoin_outputs o WHERE o.txid = t.txid {_same_partition("o")}
+           ), '[]') AS vouts,
+           COALESCE((
+               SELECT json_agg(to_jsonb(i) || jsonb_build_object('witness', COALESCE(w.items, '[]'::jsonb))
+                               ORDER BY i.input_index)
+               FROM bitcoin_inputs i
+               LEFT JOIN (
+                   SELECT wi.input_index, jsonb_agg(wi.witness_data ORDER BY wi.witness_index) AS items
+                   FROM bitcoin_witnesses wi WHERE wi.txid = t.txid {_same_partition("wi")}
+                   GROUP BY wi.input_index
+               ) w ON w.input_index = i.input_index
+               WHERE i.txid = t.txid {_same_partition("i")}
+           ), '[]') AS vins
+    FROM bitcoin_transactions t
+    WHERE t.txid = %(txid)s AND (%(height)s::INTEGER IS NULL OR t.block_height = %(height)s);
+"""
+
+
+def db_key(value):
+    """Hash from the URL -> stored key; malformed hashes are a 404 in any layout."""
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        abort(404)
+    return encode_hex(value.lower())
+
+
+def present(row):
+    """Hex-encode BYTEA columns and render ASM the compact schema does not store."""
+    row = {k: decode_hex(v) for k, v in row.items()}
+    for script, asm in (("script_pubkey", "script_pubkey_asm"), ("script_sig", "script_sig_asm")):
+        if script in row and asm not in row:
+            row[asm] = disassemble(row[script])
+    return row
+
+
+def load_block(cur, key):
+    """(block, transactions) for a stored block key, or (None, None)."""
+    with QUERY_SECONDS.time(query="block_detail"):
+        cur.execute(BLOCK_DETAIL, (key,))
+        row = cur.fetchone()
+    if row is None:
+        return None, None
+    return present(row[0]), [present(tx) for tx in row[1]]
+
+
+def load_transaction(cur, key, height=None):
+    """(tx, vouts, vins) for a stored txid, vins carrying their `witness` list, or (None, None, None).
+
+    A known `height` (e.g. from a block page link) spares the partitioned layout
+    a probe of every partition.
+    """
+    with QUERY_SECONDS.time(query="tx_detail"):
+        cur.execute(TX_DETAIL, {"txid": key, "height": height})
+        row = cur.fetchone()
+    if row is None:
+        return None, None, None
+    vins = []
+    for vin in row[2]:
+        vin = present(vin)
+        vin['witness'] = [decode_hex(item) for item in vin['witness']]
+        vins.append(vin)
+    return present(row[0]), [present(v) for v in row[1]], vins
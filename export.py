@@ -0,0 +1,170 @@
+import argparse
+import csv
+import os
+import time
+from decimal import Decimal
+
+import psycopg2
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional; CSV export always works
+    pyarrow = None
+
+from config import DB_CONFIG, EXPORT_CONFIG
+from db_operations import PARTITIONED, decode_hex
+
+# Streams block stats and the raw detail tables out of PostgreSQL for offline
+# analytics. Rows come through a server-side (named) cursor `chunk_size` at a
+# time and each chunk is written before the next is fetched, so memory stays
+# bounded by the chunk size whatever the height range. Raw tables are exported
+# in storage order with their block height attached; hashes and scripts are
+# hex strings in either schema variant.
+
+HEIGHT_RANGE = ("(%(low)s::INTEGER IS NULL OR {column} >= %(low)s)"
+                " AND (%(high)s::INTEGER IS NULL OR {column} <= %(high)s)")
+
+
+def _child_query(table, alias):
+    """Detail rows with their transaction's height (stored on the row in the partitioned layout)."""
+    if PARTITIONED:
+        return f"SELECT {alias}.* FROM {table} {alias} WHERE {HEIGHT_RANGE.format(column=f'{alias}.block_height')}"
+    return f"""
+        SELECT {alias}.*, t.block_height FROM {table} {alias}
+        JOIN bitcoin_transactions t ON t.txid = {alias}.txid
+        WHERE {HEIGHT_RANGE.format(column='t.block_height')}
+    """
+
+
+EXPORT_QUERIES = {
+    "block_stats": f"SELECT * FROM block_stats_view WHERE {HEIGHT_RANGE.format(column='height')} ORDER BY height",
+    "transactions": f"SELECT * FROM bitcoin_transactions WHERE {HEIGHT_RANGE.format(column='block_height')}",
+    "outputs": _child_query("bitcoin_outputs", "o"),
+    "inputs": _child_query("bitcoin_inputs", "i"),
+    "witnesses": _child_query("bitcoin_witnesses", "w"),
+}
+
+EXTENSIONS = {"csv": "csv", "parquet": "parquet", "arrow": "arrow"}
+
+# PostgreSQL type OIDs -> Arrow types; anything else (text, varchar, bytea as hex) is a string
+ARROW_TYPES = {16: "bool_", 20: "int64", 21: "int16", 23: "int32", 700: "float32", 701: "float64", 1700: "float64"}
+
+
+def _clean(value):
+    """Hex for BYTEA, float for NUMERIC; everything else as fetched."""
+    if isinstance(value, Decimal):
+        return float(value)
+    return decode_hex(value)
+
+
+class _CsvWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([c.name for c in columns])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ArrowWriter:
+    """Writes each chunk as one record batch (Parquet row group or Arrow IPC batch)."""
+
+    def __init__(self, path, columns, fmt):
+        if pyarrow is None:
+            raise RuntimeError(f"{fmt} export requires the pyarrow package")
+        self.schema = pyarrow.schema([
+            (c.name, getattr(pyarrow, ARROW_TYPES.get(c.type_code, "string"))()) for c in columns
+        ])
+        self.fmt = fmt
+        self.sink = None
+        if fmt == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self.sink = pyarrow.OSFile(path, "wb")
+            self.writer = pyarrow.ipc.new_file(self.sink, self.schema)
+
+    def write(self, rows):
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self.fmt == "parquet":
+            self.writer.write_table(pyarrow.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+
+def export_table(conn, name, path, fmt="csv", low=None, high=None, chunk_size=None):
+    """Stream one export (see EXPORT_QUERIES) into `path`; returns the row count."""
+    chunk_size = chunk_size or EXPORT_CONFIG["chunk_size"]
+    cur = conn.cursor(name=f"export_{name}")
+    writer = None
+    tmp = f"{path}.part"
+    count = 0
+    try:
+        cur.execute(EXPORT_QUERIES[name], {"low": low, "high": high})
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if writer is None:
+                # The description is only known after the first fetch of a named cursor
+                columns = cur.description
+                writer = _CsvWriter(tmp, columns) if fmt == "csv" else _ArrowWriter(tmp, columns, fmt)
+            if not rows:
+                break
+            writer.write([[_clean(v) for v in row] for row in rows])
+            count += len(rows)
+        writer.close()
+        writer = None
+        os.replace(tmp, path)
+        return count
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        cur.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream block stats and raw tables to CSV, Parquet or Arrow files.")
+    parser.add_argument("tables", nargs="*", default=["block_stats"],
+                        help=f"what to export: {', '.join(EXPORT_QUERIES)} (default: block_stats)")
+    parser.add_argument("--format", choices=list(EXTENSIONS), default="csv")
+    parser.add_argument("--out", default="exports", help="output directory (one file per table)")
+    parser.add_argument("--from-height", type=int, default=None, help="first height to export")
+    parser.add_argument("--to-height", type=int, default=None, help="last height to export")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CONFIG["chunk_size"],
+                        help="rows fetched and written per chunk (bounds memory)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.tables if name not in EXPORT_QUERIES]
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(unknown)}")
+    if args.format != "csv" and pyarrow is None:
+        parser.error(f"--format {args.format} requires the pyarrow package")
+
+    os.makedirs(args.out, exist_ok=True)
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        for name in args.tables:
+            path = os.path.join(args.out, f"{name}.{EXTENSIONS[args.format]}")
+            start = time.perf_counter()
+            count = export_table(conn, name, path, args.format, args.from_height, args.to_height, args.chunk_size)
+            conn.rollback()   # end the read transaction between tables
+            elapsed = time.perf_counter() - start
+            rate = count / elapsed if elapsed else 0
+            print(f"📤 {name}: {count:,} rows -> {path} in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import json
+import os
+import signal
+import threading
+import time
+
+from api_client import get_api_data, get_api_text
+from config import API_BASE_URL, FOLLOW_CONFIG
+from db_operations import (
+    get_checkpoint, get_contiguous_height, get_indexed_height, get_lowest_height, get_missing_heights,
+    get_tip_height, is_block_fully_synced, save_checkpoint
+)
+from reorg import resolve_reorg, resync_after_rollback
+from retry_queue import drain_retry_queue
+
+# The follower's checkpoint: every height from its start (--from-height, or the
+# lowest stored block) up to this one is fully synced. Gaps are searched above
+# it and lag is measured from it; rollbacks lower it.
+CHECKPOINT_PREFIX = "follow_from_"
+
+
+class TipFollower:
+    """Long-running sync that keeps the database at the chain tip.
+
+    Each poll costs one request (/blocks/tip/height) when nothing changed. New
+    heights above the stored tip are synced first, oldest to newest, then up
+    to `backfill_per_poll` gaps above the contiguous checkpoint (e.g. a height
+    whose header fetch failed), then queued failed pages whose
+    backoff has elapsed. SIGTERM/SIGINT only set a flag that is checked
+    between blocks, so the block being written always finishes.
+    """
+
+    def __init__(self, sync_block, from_height=None, poll_interval=None, backfill_per_poll=None,
+                 status_file=None, write_mode="copy"):
+        self.sync_block = sync_block
+        self.write_mode = write_mode     # for queued pages retried between polls
+        self.from_height = from_height
+        self.poll_interval = poll_interval or FOLLOW_CONFIG["poll_interval"]
+        self.backfill_per_poll = (backfill_per_poll if backfill_per_poll is not None
+                                  else FOLLOW_CONFIG["backfill_per_poll"])
+        self.status_file = status_file if status_file is not None else FOLLOW_CONFIG["status_file"]
+        self.stop_event = threading.Event()
+
+        self.tip_height = None
+        self.indexed_height = None    # highest height with no gaps below it
+        self.highest_height = None    # highest fully synced block
+        self.behind_since = None
+        self.blocks_synced = 0
+        self.reorgs = 0
+        self.retried_pages = 0
+        self.last_block_latency = None   # seconds from block timestamp to commit
+        self.last_error = None
+
+    def stop(self, signum=None, frame=None):
+        if not self.stop_event.is_set():
+            print("\n🛑 Stop requested; finishing the block in flight...")
+        self.stop_event.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    # --- lag reporting ------------------------------------------------------
+
+    def status(self):
+        lag_blocks = None
+        if self.tip_height is not None:
+            lag_blocks = self.tip_height - (self.indexed_height if self.indexed_height is not None else -1)
+        return {
+            "tip_height": self.tip_height,
+            "indexed_height": self.indexed_height,
+            "highest_height": self.highest_height,
+            "lag_blocks": lag_blocks,
+            # How long the index has been behind the tip without catching up
+            "lag_seconds": round(time.time() - self.behind_since, 1) if self.behind_since else 0.0,
+            "last_block_latency_seconds": self.last_block_latency,
+            "blocks_synced": self.blocks_synced,
+            "reorgs": self.reorgs,
+            "retried_pages": self.retried_pages,
+            "last_error": self.last_error,
+            "updated_at": int(time.time()),
+        }
+
+    def write_status(self):
+        status = self.status()
+        if self.status_file:
+            tmp = f"{self.status_file}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(status, f, indent=2)
+            os.replace(tmp, self.status_file)
+        return status
+
+    def contiguous_height(self):
+        """Highest height with every height from the follower's start up to it synced (None if empty)."""
+        start = self.from_height if self.from_height is not None else get_lowest_height()
+        if start is None:
+            return None
+        name = f"{CHECKPOINT_PREFIX}{start}"
+        checkpoint = get_checkpoint(name)
+        low = checkpoint + 1 if checkpoint is not None and checkpoint >= start else start
+        height = get_contiguous_height(low)
+        if height >= start and height != checkpoint:
+            save_checkpoint(name, height)
+        return height
+
+    def _update_lag(self):
+        self.indexed_height = self.contiguous_height()
+        self.highest_height = get_indexed_height()
+        behind = self.tip_height is not None and (self.indexed_height or -1) < self.tip_height
+        if behind and self.behind_since is None:
+            self.behind_since = time.time()
+        elif not behind:
+            self.behind_since = None
+
+    # --- syncing ------------------------------------------------------------
+
+    def poll_tip(self):
+        tip = get_api_text(f"{API_BASE_URL}/blocks/tip/height")
+        return int(tip) if tip else None
+
+    def sync_height(self, height):
+        """Fetch and store the block at `height`. Returns True when fully synced."""
+        block_hash = get_api_text(f"{API_BASE_URL}/block-height/{height}")
+        block = get_api_data(f"{API_BASE_URL}/block/{block_hash}") if block_hash else None
+        if not block:
+            raise RuntimeError(f"Header for height {height} could not be fetched")
+        fork = resolve_reorg(block)
+        if fork is not None:
+            self.reorgs += 1
+            # Heights left incomplete here are picked up by the gap backfill
+            resync_after_rollback(fork, height)
+        self.sync_block(block)
+        if not is_block_fully_synced(block['id'], block['tx_count']):
+            return False
+        self.blocks_synced += 1
+        self.last_block_latency = round(time.time() - block['timestamp'], 1)
+        return True
+
+    def heights_to_sync(self):
+        """New heights above the stored tip first, then a bounded batch of gaps below it."""
+        stored_tip = get_tip_height()
+        if stored_tip is None:
+            start = self.from_height if self.from_height is not None else self.tip_height
+            return list(range(start, self.tip_height + 1))
+        new = list(range(stored_tip + 1, self.tip_height + 1))
+        contiguous = self.contiguous_height()
+        gaps = []
+        if self.backfill_per_poll and contiguous is not None and contiguous < stored_tip:
+            gaps = get_missing_heights(contiguous + 1, stored_tip, self.backfill_per_poll)
+        return new + gaps
+
+    def run_once(self):
+        self.tip_height = self.poll_tip()
+        if self.tip_height is None:
+            self.last_error = "Could not fetch the tip height"
+            return 0
+        self._update_lag()
+        synced = 0
+        for height in self.heights_to_sync():
+            if self.stop_event.is_set():
+                break
+            try:
+                if self.sync_height(height):
+                    synced += 1
+                    self.last_error = None
+                else:
+                    self.last_error = f"Block #{height} left incomplete; retrying next poll"
+            except Exception as e:
+                self.last_error = f"#{height}: {e}"
+                print(f"   ❌ {self.last_error}")
+            self._update_lag()
+            self.write_status()
+        if not self.stop_event.is_set():
+            retried = drain_retry_queue(self.write_mode)
+            if retried["retried"]:
+                self.retried_pages += retried["recovered"]
+                print(f"   🔁 {retried['recovered']}/{retried['retried']} queued page(s) stored")
+                self._update_lag()
+        return synced
+
+    def run(self):
+        print(f"👀 Following the tip every {self.poll_interval:.0f}s "
+              f"(status in {self.status_file or 'stdout only'}); SIGTERM to stop")
+        while not self.stop_event.is_set():
+            synced = self.run_once()
+            status = self.write_status()
+            if synced or status["lag_blocks"]:
+                print(f"   ⛓️ tip #{status['tip_height']} indexed #{status['indexed_height']} "
+                      f"lag {status['lag_blocks']} block(s) / {status['lag_seconds']:.0f}s")
+            self.stop_event.wait(self.poll_interval)
+        self.write_status()
+        print(f"👋 Follower stopped after {self.blocks_synced} block(s), {self.reorgs} reorg(s)")
+
+
+def follow_tip(sync_block, **options):
+    """Run a TipFollower in the foreground until SIGTERM/SIGINT."""
+    follower = TipFollower(sync_block, **options)
+    follower.install_signal_handlers()
+    follower.run()
+    return follower
@@ -0,0 +1,283 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_CONFIG
+
+# Process-wide counters and histograms for the ingester and the explorer.
+# Modules declare their metrics at import time (declaring the same name twice
+# returns the existing metric) and update them from any thread. The registry
+# renders as Prometheus text (`/metrics`) or as a JSON snapshot with derived
+# rates and bucket-estimated percentiles.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"expected labels {label_names}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_labels(label_names, key, extra=None):
+    pairs = list(zip(label_names, key)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.label_names, labels), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in items]
+
+    def snapshot(self, uptime):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            {**dict(zip(self.label_names, key)), "value": value,
+             "per_sec": round(value / uptime, 3) if uptime else 0.0}
+            for key, value in items
+        ]
+
+
+class Histogram:
+    """Bucketed observations (count, sum, per-bucket counts) per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # key -> [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the `with` block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _quantile(self, counts, total, q):
+        """Upper bound of the bucket holding the q-quantile (None if in +Inf)."""
+        rank = q * total
+        seen = 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        lines = []
+        for key, (counts, total_sum, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total_sum}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+    def snapshot(self, uptime):
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        return [
+            {**dict(zip(self.label_names, key)), "count": count, "sum": round(total_sum, 6),
+             "avg": round(total_sum / count, 6) if count else 0.0,
+             "p50_le": self._quantile(counts, count, 0.5), "p99_le": self._quantile(counts, count, 0.99),
+             "per_sec": round(count / uptime, 3) if uptime else 0.0}
+            for key, (counts, total_sum, count) in items
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.started_at = time.time()
+        self._metrics = {}
+        self._gauges = {}   # name -> (help, fn returning a number)
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, label_names, **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, label_names, **options)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(label_names):
+                raise ValueError(f"metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def gauge(self, name, help_text, fn):
+        """A value read from `fn()` at collection time (e.g. pool or cache stats)."""
+        with self._lock:
+            self._gauges[name] = (help_text, fn)
+
+    def _read_gauges(self):
+        with self._lock:
+            gauges = dict(self._gauges)
+        values = {}
+        for name, (help_text, fn) in gauges.items():
+            try:
+                values[name] = (help_text, fn())
+            except Exception:
+                continue   # a collector must never break the scrape
+        return values
+
+    def render_prometheus(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for name, (help_text, value) in sorted(self._read_gauges().items()):
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        uptime = time.time() - self.started_at
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return {
+            "uptime_seconds": round(uptime, 1),
+            "generated_at": int(time.time()),
+            "metrics": {m.name: m.snapshot(uptime) for m in metrics},
+            "gauges": {name: value for name, (_, value) in sorted(self._read_gauges().items())},
+        }
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, label_names=()):
+    return REGISTRY.counter(name, help_text, label_names)
+
+
+def histogram(name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.histogram(name, help_text, label_names, buckets)
+
+
+def gauge(name, help_text, fn):
+    REGISTRY.gauge(name, help_text, fn)
+
+
+# --- Exposure -------------------------------------------------------------------
+
+def write_json(path, registry=REGISTRY):
+    """Write the current snapshot to `path` atomically; returns the snapshot."""
+    snapshot = registry.snapshot()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp, path)
+    return snapshot
+
+
+def start_json_dump(path, interval=None, registry=REGISTRY):
+    """Rewrite `path` every `interval` seconds from a daemon thread; returns its stop event."""
+    interval = interval or METRICS_CONFIG["dump_interval"]
+    stop_event = threading.Event()
+
+    def loop():
+        while not stop_event.wait(interval):
+            try:
+                write_json(path, registry)
+            except OSError as e:
+                print(f"⚠️  Metrics dump to {path} failed: {e}")
+
+    threading.Thread(target=loop, name="metrics-dump", daemon=True).start()
+    return stop_event
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = self.registry.render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(self.registry.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # scrapes every few seconds would drown the progress bars
+
+
+def serve(port, host=None):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+    server = ThreadingHTTPServer((host or METRICS_CONFIG["host"], port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,169 @@
+import hashlib
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+import metrics
+from config import DB_CONFIG, PAGE_CACHE_CONFIG
+from db_operations import ROLLBACK_CHANNEL, get_tip_height
+
+
+class CachedPage:
+    __slots__ = ("body", "etag", "height", "expires_at", "deep")
+
+    def __init__(self, body, height, expires_at, deep):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.height = height
+        self.expires_at = expires_at
+        self.deep = deep
+
+
+class PageCache:
+    """Byte-bounded LRU of rendered explorer pages.
+
+    Every entry remembers the block height it shows, so a rollback to height H
+    drops exactly the pages for blocks above H. Near-tip entries also expire
+    after `near_tip_ttl` seconds.
+    """
+
+    def __init__(self, max_bytes, near_tip_ttl, deep_confirmations, tip_refresh=5.0):
+        self.max_bytes = max_bytes
+        self.near_tip_ttl = near_tip_ttl
+        self.deep_confirmations = deep_confirmations
+        self.tip_refresh = tip_refresh
+        self._entries = OrderedDict()   # key -> CachedPage, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._tip = (None, 0.0)         # (height, fetched at)
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                      "expirations": 0, "invalidations": 0}
+
+    def tip_height(self):
+        """Stored tip height, re-read from the database at most every `tip_refresh` seconds."""
+        height, fetched_at = self._tip
+        if time.monotonic() - fetched_at > self.tip_refresh:
+            height = get_tip_height()
+            self._tip = (height, time.monotonic())
+        return height
+
+    def is_deep(self, height):
+        tip = self.tip_height()
+        return tip is not None and height is not None and tip - height + 1 >= self.deep_confirmations
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at < time.monotonic():
+                self._drop(key)
+                self.stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key, body, height, mutable=False):
+        """Cache a rendered page (bytes) for a block at `height`; returns the entry.
+
+        `mutable` pages (e.g. a tx with unspent outputs, whose spend status can
+        change with any new block) always get the near-tip TTL.
+        """
+        deep = not mutable and self.is_deep(height)
+        expires_at = None if deep else time.monotonic() + self.near_tip_ttl
+        entry = CachedPage(body, height, expires_at, deep)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            self.stats["stores"] += 1
+            while self._bytes > self.max_bytes:
+                old_key = next(iter(self._entries))
+                self._drop(old_key)
+                self.stats["evictions"] += 1
+        return entry
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def invalidate_above(self, height):
+        """Forget every page for a block above `height` (after a rollback)."""
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e.height is None or e.height > height]
+            for key in stale:
+                self._drop(key)
+            self.stats["invalidations"] += len(stale)
+            self._tip = (None, 0.0)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._tip = (None, 0.0)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+def listen_for_rollbacks(cache, db_config=None, stop_event=None):
+    """LISTEN on the rollback channel and invalidate `cache`; runs until stop_event is set."""
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(**(db_config or DB_CONFIG))
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {ROLLBACK_CHANNEL};")
+            # Anything cached before LISTEN took effect may predate a rollback
+            cache.clear()
+            while not stop_event.is_set():
+                if select.select([conn], [], [], 5.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    cache.invalidate_above(int(notify.payload))
+        except Exception as e:
+            print(f"⚠️  Page cache listener error: {e}; reconnecting")
+            stop_event.wait(5.0)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """The process-wide page cache (with its rollback listener), or None when disabled."""
+    global _cache
+    if _cache is None and PAGE_CACHE_CONFIG["enabled"]:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PageCache(PAGE_CACHE_CONFIG["max_bytes"], PAGE_CACHE_CONFIG["near_tip_ttl"],
+                                   PAGE_CACHE_CONFIG["deep_confirmations"], PAGE_CACHE_CONFIG["tip_refresh"])
+                threading.Thread(target=listen_for_rollbacks, args=(_cache,),
+                                 name="page-cache-listener", daemon=True).start()
+                for name in ("hits", "misses", "evictions", "invalidations", "entries", "bytes", "hit_ratio"):
+                    metrics.gauge(f"page_cache_{name}", f"Page cache {name.replace('_', ' ')}",
+                                  lambda name=name: _cache.snapshot()[name])
+    return _cache
@@ -0,0 +1,356 @@
+import queue
+import threading
+import time
+
+import metrics
+from api_client import get_api_data, get_api_text
+from archive import get_recorder
+from config import API_BASE_URL, PIPELINE_CONFIG, RETRY_QUEUE_CONFIG
+from reorg import is_continuous
+from retry_queue import drain_retry_queue, queue_failed_page
+from db_operations import (
+    begin_block_sync, flatten_transactions, insert_flattened_rows, is_block_fully_synced,
+    merge_flattened_rows, save_checkpoint
+)
+
+PAGE_SIZE = 25
+CHECKPOINT_NAME = "range_sync"
+_STOP = object()
+
+BATCHES = metrics.counter("ingest_batches_total", "Tx pages processed, by outcome", ("result",))
+
+
+class StageStats:
+    """Thread-safe counters for one pipeline stage."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, items=1, errors=0):
+        with self._lock:
+            self.items += items
+            self.errors += errors
+            self.busy_seconds += elapsed
+
+    def snapshot(self, wall_seconds):
+        with self._lock:
+            capacity = self.workers * wall_seconds
+            return {
+                "workers": self.workers,
+                "items": self.items,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "items_per_sec": round(self.items / wall_seconds, 2) if wall_seconds else 0.0,
+                # Share of the stage's worker time spent doing work; the stage
+                # closest to 1.0 is the bottleneck.
+                "utilization": round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+            }
+
+
+class RangeSyncPipeline:
+    """Staged producer/consumer sync of a block height range.
+
+        heights -> [header fetchers] -> page_q -> [tx-page fetchers] -> parse_q
+                -> [parse/flatten] -> write_q -> [DB writer]
+
+    Stages are thread pools joined by bounded queues, so network fetches for
+    later blocks overlap with flattening and COPY writes of earlier ones.
+    """
+
+    def __init__(self, from_height, to_height, header_workers=None, page_workers=None,
+                 parse_workers=None, queue_size=None, write_batch_pages=None, report_every=None,
+                 checkpoint_name=CHECKPOINT_NAME):
+        settings = PIPELINE_CONFIG
+        self.from_height = from_height
+        self.to_height = to_height
+        self.checkpoint_name = checkpoint_name   # None: track progress without saving it
+        self.write_batch_pages = write_batch_pages or settings["write_batch_pages"]
+        self.report_every = report_every if report_every is not None else settings["report_every"]
+        queue_size = queue_size or settings["queue_size"]
+
+        self.height_q = queue.Queue()
+        self.page_q = queue.Queue(maxsize=queue_size)
+        self.parse_q = queue.Queue(maxsize=queue_size)
+        self.write_q = queue.Queue(maxsize=queue_size)
+        self.queues = {"heights": self.height_q, "pages": self.page_q,
+                       "parse": self.parse_q, "write": self.write_q}
+
+        self.stages = {
+            "headers": StageStats("headers", header_workers or settings["header_workers"]),
+            "pages": StageStats("pages", page_workers or settings["page_workers"]),
+            "parse": StageStats("parse", parse_workers or settings["parse_workers"]),
+            "write": StageStats("write", 1),
+        }
+
+        self.blocks = {}            # block_hash -> header, for blocks in flight
+        self.completed = []         # heights fully written
+        self.skipped = []           # heights already indexed
+        self.failures = []          # human-readable error lines
+        self.checkpoint = from_height - 1
+        self._finished_heights = set()
+        self._state_lock = threading.Lock()
+        self._started = None
+        self._done = threading.Event()
+
+    # --- stage bodies -------------------------------------------------------
+
+    def _fetch_header(self, height, emit):
+        block_hash = get_api_text(f"{API_BASE_URL}/block-height/{height}")
+        block = get_api_data(f"{API_BASE_URL}/block/{block_hash}") if block_hash else None
+        if not block:
+            raise RuntimeError(f"Header for height {height} could not be fetched")
+        # Rolling back under concurrent writers is unsafe; leave reorgs to the tip sync
+        if not is_continuous(block):
+            raise RuntimeError(f"Block #{height} does not extend the stored chain (reorg); "
+                               "run the tip sync or follower to roll it back")
+        # Stores the header and returns only pages not committed by an earlier run
+        missing = begin_block_sync(block)
+        if not missing:
+            with self._state_lock:
+                self.skipped.append(height)
+            self._finish_height(height)
+            return
+        with self._state_lock:
+            self.blocks[block['id']] = block
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record_header(block, missing)
+        for idx in missing:
+            emit((block, idx))
+
+    def _fetch_page(self, item, emit):
+        block, idx = item
+        tx_data = get_api_data(f"{API_BASE_URL}/block/{block['id']}/txs/{idx}")
+        if not tx_data:
+            BATCHES.inc(result="fetch_failed")
+            queue_failed_page(block['id'], idx, "fetch", "API limit or error")
+            raise RuntimeError(f"Block #{block['height']} page {idx} failed (API limit or error)")
+        self._record_page(block['id'], idx, tx_data)
+        emit((block, idx, tx_data))
+
+    def _parse_page(self, item, emit):
+        block, idx, tx_data = item
+        emit((block, idx, flatten_transactions(tx_data, block['id'], idx), len(tx_data)))
+
+    def _write_pages(self, items):
+        """Merge a run of flattened pages and write them in one COPY transaction."""
+        rows = {}
+        for _, _, page_rows, _ in items:
+            merge_flattened_rows(rows, page_rows)
+        completed = insert_flattened_rows(rows, pages=[(b['id'], idx) for b, idx, _, _ in items])
+
+        recorder = get_recorder()
+        for block_hash in completed:
+            with self._state_lock:
+                block = self.blocks.pop(block_hash)
+                self.completed.append(block['height'])
+            if recorder is not None:
+                recorder.finish_block(block_hash)
+            self._finish_height(block['height'])
+
+    def retry_failed_pages(self, wait=None):
+        """Drain the queued pages of this run's blocks, then advance the checkpoint over blocks it completed.
+
+        Pages queued by other runs are left for `dataFetch.py --drain-retries`: their blocks have no
+        open archive here and lie outside this run's checkpoint range.
+        """
+        wait = RETRY_QUEUE_CONFIG["inline_wait"] if wait is None else wait
+        deadline = time.monotonic() + wait
+        result = {"retried": 0, "recovered": 0, "failed": 0}
+        with self._state_lock:
+            pending = list(self.blocks.values())
+        for block in pending:
+            drained = drain_retry_queue("copy", block_hash=block['id'], wait=max(deadline - time.monotonic(), 0.0),
+                                        record=self._record_page)
+            for key, value in drained.items():
+                result[key] += value
+        for block in pending:
+            if is_block_fully_synced(block['id'], block['tx_count']):
+                with self._state_lock:
+                    self.blocks.pop(block['id'], None)
+                    self.completed.append(block['height'])
+                recorder = get_recorder()
+                if recorder is not None:
+                    recorder.finish_block(block['id'])
+                self._finish_height(block['height'])
+        return result
+
+    @staticmethod
+    def _record_page(block_hash, idx, tx_data):
+        recorder = get_recorder()
+        if recorder is not None and recorder.is_recording(block_hash):
+            recorder.record_page(block_hash, idx, tx_data)
+
+    def _finish_height(self, height):
+        """Advance the checkpoint across every contiguous finished height."""
+        with self._state_lock:
+            self._finished_heights.add(height)
+            advanced = False
+            while self.checkpoint + 1 in self._finished_heights:
+                self.checkpoint += 1
+                self._finished_heights.discard(self.checkpoint)
+                advanced = True
+            checkpoint = self.checkpoint
+        if advanced and self.checkpoint_name:
+            save_checkpoint(self.checkpoint_name, checkpoint)
+
+    # --- plumbing -----------------------------------------------------------
+
+    def _worker(self, stats, in_q, out_q, fn):
+        blocked = [0.0]
+
+        def emit(value):
+            # Time spent waiting on a full downstream queue is backpressure,
+            # not work, so it is excluded from this stage's busy time.
+            start = time.perf_counter()
+            out_q.put(value)
+            blocked[0] += time.perf_counter() - start
+
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                return
+            blocked[0] = 0.0
+            start = time.perf_counter()
+            try:
+                fn(item, emit)
+                stats.record(time.perf_counter() - start - blocked[0])
+            except Exception as e:
+                stats.record(time.perf_counter() - start - blocked[0], errors=1)
+                with self._state_lock:
+                    self.failures.append(f"{stats.name}: {e}")
+
+    def _writer(self):
+        stats = self.stages["write"]
+        stopping = False
+        while not stopping:
+            item = self.write_q.get()
+            if item is _STOP:
+                return
+            items = [item]
+            # Greedily coalesce whatever is already queued into the same COPY round
+            while len(items) < self.write_batch_pages:
+                try:
+                    item = self.write_q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                items.append(item)
+
+            start = time.perf_counter()
+            try:
+                self._write_pages(items)
+                stats.record(time.perf_counter() - start, items=len(items))
+                BATCHES.inc(len(items), result="stored")
+            except Exception as e:
+                stats.record(time.perf_counter() - start, items=0, errors=len(items))
+                BATCHES.inc(len(items), result="store_failed")
+                for block, idx, _, _ in items:
+                    queue_failed_page(block['id'], idx, "store", e)
+                with self._state_lock:
+                    pages = ", ".join(f"#{b['height']}@{idx}" for b, idx, _, _ in items)
+                    self.failures.append(f"write: {pages}: {e}")
+
+    def _start_pool(self, name, in_q, out_q, fn):
+        stats = self.stages[name]
+        threads = [
+            threading.Thread(target=self._worker, args=(stats, in_q, out_q, fn),
+                             name=f"{name}-{i}", daemon=True)
+            for i in range(stats.workers)
+        ]
+        for t in threads:
+            t.start()
+        return threads
+
+    @staticmethod
+    def _drain(threads, downstream_q, downstream_workers):
+        for t in threads:
+            t.join()
+        for _ in range(downstream_workers):
+            downstream_q.put(_STOP)
+
+    def _monitor(self):
+        while not self._done.wait(self.report_every):
+            print(self.format_snapshot())
+
+    def snapshot(self):
+        """Queue depths and per-stage throughput/utilization since start."""
+        wall = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            "elapsed_seconds": round(wall, 3),
+            "queue_depths": {name: q.qsize() for name, q in self.queues.items()},
+            "stages": {name: s.snapshot(wall) for name, s in self.stages.items()},
+            "blocks_completed": len(self.completed),
+            "blocks_skipped": len(self.skipped),
+            "checkpoint": self.checkpoint,
+            "failures": len(self.failures),
+        }
+
+    def format_snapshot(self, snap=None):
+        snap = snap or self.snapshot()
+        depths = " ".join(f"{k}={v}" for k, v in snap["queue_depths"].items())
+        stages = " | ".join(
+            f"{name} {s['items_per_sec']:.1f}/s {s['utilization'] * 100:.0f}%"
+            for name, s in snap["stages"].items()
+        )
+        return f"   ⏱️ {snap['elapsed_seconds']:.0f}s queues[{depths}] {stages}"
+
+    def bottleneck(self, snap=None):
+        snap = snap or self.snapshot()
+        return max(snap["stages"].items(), key=lambda kv: kv[1]["utilization"])[0]
+
+    def run(self):
+        self._started = time.perf_counter()
+        for height in range(self.from_height, self.to_height + 1):
+            self.height_q.put(height)
+        for _ in range(self.stages["headers"].workers):
+            self.height_q.put(_STOP)
+
+        monitor = None
+        if self.report_every:
+            monitor = threading.Thread(target=self._monitor, name="pipeline-monitor", daemon=True)
+            monitor.start()
+
+        headers = self._start_pool("headers", self.height_q, self.page_q, self._fetch_header)
+        pages = self._start_pool("pages", self.page_q, self.parse_q, self._fetch_page)
+        parsers = self._start_pool("parse", self.parse_q, self.write_q, self._parse_page)
+        writer = threading.Thread(target=self._writer, name="write-0", daemon=True)
+        writer.start()
+
+        self._drain(headers, self.page_q, self.stages["pages"].workers)
+        self._drain(pages, self.parse_q, self.stages["parse"].workers)
+        self._drain(parsers, self.write_q, 1)
+        writer.join()
+
+        self._done.set()
+        if monitor:
+            monitor.join()
+        return self.snapshot()
+
+
+def sync_height_range(from_height, to_height, **options):
+    """Run the staged pipeline over [from_height, to_height] and print a summary."""
+    pipeline = RangeSyncPipeline(from_height, to_height, **options)
+    print(f"🚚 Pipeline sync of heights {from_height}..{to_height}")
+    snap = pipeline.run()
+    if pipeline.blocks:
+        print(f"🔁 {len(pipeline.blocks)} block(s) have failed pages; draining the retry queue")
+        retried = pipeline.retry_failed_pages()
+        print(f"   🔁 {retried['recovered']}/{retried['retried']} retried page(s) stored")
+        snap = pipeline.snapshot()
+
+    print(pipeline.format_snapshot(snap))
+    print(f"\n📦 {snap['blocks_completed']} block(s) written, {snap['blocks_skipped']} already indexed, "
+          f"{snap['failures']} failure(s) in {snap['elapsed_seconds']:.1f}s")
+    print(f"🐢 Bottleneck stage: {pipeline.bottleneck(snap)}")
+    print(f"📍 Checkpoint: every block up to #{snap['checkpoint']} is committed")
+    for line in pipeline.failures:
+        print(f"   ❌ {line}")
+    return pipeline
@@ -0,0 +1,70 @@
+from api_client import get_api_text
+from config import API_BASE_URL, REORG_CONFIG
+from db_operations import get_block_hash, rollback_to_height
+
+# A header fetched from the API is checked against the stored chain before it
+# is written: its previousblockhash must be the stored block one height below
+# and no different block may already be stored at its height. Otherwise the
+# stored chain is walked down until it agrees with the API again (the fork
+# point) and everything above is rolled back; resync_after_rollback() then
+# syncs the winning chain's blocks up to the one that exposed the reorg.
+
+
+class ReorgTooDeep(RuntimeError):
+    """No common ancestor within REORG_CONFIG["max_depth"] blocks."""
+
+
+def is_continuous(block):
+    """True if `block` extends (or already is part of) the stored chain."""
+    stored_here = get_block_hash(block['height'])
+    if stored_here is not None and stored_here != block['id']:
+        return False
+    stored_prev = get_block_hash(block['height'] - 1)
+    return stored_prev is None or stored_prev == block.get('previousblockhash')
+
+
+def find_fork_point(height, max_depth=None):
+    """Highest height <= `height` where the stored block matches the API's chain."""
+    max_depth = max_depth or REORG_CONFIG["max_depth"]
+    for h in range(height, max(height - max_depth, -1), -1):
+        stored = get_block_hash(h)
+        if stored is None:
+            return h
+        remote = get_api_text(f"{API_BASE_URL}/block-height/{h}")
+        if remote is None:
+            raise RuntimeError(f"Could not fetch the hash at height {h} while searching for the fork point")
+        if stored == remote:
+            return h
+    raise ReorgTooDeep(f"No common ancestor within {max_depth} blocks below #{height}")
+
+
+def resolve_reorg(block):
+    """Roll back the stored chain if `block` does not extend it.
+
+    Returns the fork height when a rollback happened, otherwise None.
+    """
+    if is_continuous(block):
+        return None
+    fork = find_fork_point(block['height'] - 1)
+    removed = rollback_to_height(fork)
+    print(f"🔀 Reorg at #{block['height']}: rolled back {len(removed)} block(s) above #{fork}")
+    for block_hash in removed:
+        print(f"   🗑️  {block_hash}")
+    return fork
+
+
+def resync_after_rollback(fork, height):
+    """Sync the winning chain's blocks fork+1..height-1 after a rollback.
+
+    Run before storing the block at `height` that exposed the reorg, so the
+    rolled-back range does not stay empty. Returns True when all of them are
+    fully synced; leftovers are in the retry queue or get backfilled later.
+    """
+    if height - 1 <= fork:
+        return True
+    from pipeline import sync_height_range   # pipeline imports this module
+
+    print(f"🔁 Re-syncing #{fork + 1}..#{height - 1} from the winning chain")
+    # The range sync's own checkpoint is not advanced over an unrelated range
+    pipeline = sync_height_range(fork + 1, height - 1, checkpoint_name=None)
+    return len(pipeline.completed) + len(pipeline.skipped) == height - 1 - fork
@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from config import RESPONSE_CACHE_CONFIG
+
+# Only responses that can never change are cached: a block fetched by hash
+# and the transaction pages of that block.
+IMMUTABLE_PATH = re.compile(r"/block/[0-9a-fA-F]{64}(/txs/\d+)?$")
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache for immutable API responses.
+
+    Entries are stored gzip-compressed under sha256(url) and evicted least
+    recently used first once the cache exceeds `max_bytes` on disk. File
+    mtimes carry the LRU order across runs.
+    """
+
+    def __init__(self, path, max_bytes, compress_level=6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._index = OrderedDict()   # key -> compressed size, oldest first
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                      "bytes_saved": 0, "bytes_on_disk": 0}
+        os.makedirs(path, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def cacheable(url):
+        return IMMUTABLE_PATH.search(url.split("?", 1)[0]) is not None
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + ".json.gz")
+
+    def _load_index(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                if not name.endswith(".json.gz"):
+                    continue
+                st = os.stat(os.path.join(dirpath, name))
+                entries.append((st.st_mtime, name[:-len(".json.gz")], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+        self.stats["bytes_on_disk"] = self._bytes
+
+    def get(self, url):
+        """Return the decoded JSON for url, or None on a miss."""
+        key = self._key(url)
+        with self._lock:
+            known = key in self._index
+            if known:
+                self._index.move_to_end(key)
+        if known:
+            try:
+                path = self._file(key)
+                with open(path, "rb") as f:
+                    raw = gzip.decompress(f.read())
+                os.utime(path)
+                data = json.loads(raw)
+                with self._lock:
+                    self.stats["hits"] += 1
+                    self.stats["bytes_saved"] += len(raw)
+                return data
+            except (OSError, ValueError):
+                self._forget(key)
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, url, raw):
+        """Store the raw (uncompressed) response body for url."""
+        key = self._key(url)
+        path = self._file(key)
+        blob = gzip.compress(raw, compresslevel=self.compress_level)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._bytes += len(blob) - self._index.pop(key, 0)
+            self._index[key] = len(blob)
+            self.stats["stores"] += 1
+            self._evict()
+            self.stats["bytes_on_disk"] = self._bytes
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+
+    def _forget(self, key):
+        with self._lock:
+            self._bytes -= self._index.pop(key, 0)
+            self.stats["bytes_on_disk"] = self._bytes
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["entries"] = len(self._index)
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """The process-wide cache, or None when caching is disabled."""
+    global _cache
+    if _cache is None and RESPONSE_CACHE_CONFIG["enabled"]:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(RESPONSE_CACHE_CONFIG["path"], RESPONSE_CACHE_CONFIG["max_bytes"],
+                                       RESPONSE_CACHE_CONFIG["compress_level"])
+    return _cache
+
+
+def configure_response_cache(path=None, max_bytes=None):
+    """Enable the cache for this process, overriding config values if given."""
+    global _cache
+    with _cache_lock:
+        _cache = ResponseCache(
+            path or RESPONSE_CACHE_CONFIG["path"],
+            max_bytes or RESPONSE_CACHE_CONFIG["max_bytes"],
+            RESPONSE_CACHE_CONFIG["compress_level"],
+        )
+    return _cache
+
+
+def format_cache_stats(stats):
+    return (f"💾 Response cache: {stats['hits']} hit(s) / {stats['misses']} miss(es) "
+            f"({stats['hit_ratio'] * 100:.1f}% hit ratio), {stats['bytes_saved'] / 1e6:.1f} MB not re-downloaded, "
+            f"{stats['entries']} entries / {stats['bytes_on_disk'] / 1e6:.1f} MB on disk, "
+            f"{stats['evictions']} eviction(s)")
@@ -0,0 +1,85 @@
+import time
+
+import metrics
+from api_client import get_api_data
+from config import API_BASE_URL, RETRY_QUEUE_CONFIG
+from db_operations import (
+    enqueue_failed_page, get_due_retries, get_retry_queue_summary, insert_transaction_batch,
+    insert_transaction_batch_copy, seconds_until_next_retry
+)
+
+# Pages that failed to fetch or store are persisted in bitcoin_retry_queue
+# (see db_operations) instead of being dropped. Each failure pushes the page's
+# next attempt further out (exponential backoff); drain_retry_queue() re-fetches
+# and stores whatever is due. A stored page leaves the queue in the same
+# transaction that marks it done, so draining is safe to repeat or run twice.
+
+ENQUEUED = metrics.counter("retry_queue_enqueued_total", "Pages queued for retry after a failure", ("stage",))
+RECOVERED = metrics.counter("retry_queue_recovered_total", "Queued pages stored on a retry")
+
+WRITERS = {
+    "rows": insert_transaction_batch,
+    "copy": insert_transaction_batch_copy,
+    "block": insert_transaction_batch_copy,   # retries are single pages either way
+}
+
+
+def queue_failed_page(block_hash, base_index, stage, error):
+    """Persist a failed page; returns its attempt count."""
+    ENQUEUED.inc(stage=stage)
+    return enqueue_failed_page(block_hash, base_index, stage, error)
+
+
+def retry_page(block_hash, base_index, write_mode="copy", record=None):
+    """Fetch and store one queued page. Returns True on success, re-queues it otherwise.
+
+    `record(block_hash, base_index, tx_data)` is called with the fetched page (archiving).
+    """
+    tx_data = get_api_data(f"{API_BASE_URL}/block/{block_hash}/txs/{base_index}")
+    if tx_data and record is not None:
+        record(block_hash, base_index, tx_data)
+    if not tx_data:
+        queue_failed_page(block_hash, base_index, "fetch", "API limit or error")
+        return False
+    try:
+        WRITERS[write_mode](tx_data, block_hash, base_index=base_index)
+    except Exception as e:
+        queue_failed_page(block_hash, base_index, "store", e)
+        return False
+    RECOVERED.inc()
+    return True
+
+
+def drain_retry_queue(write_mode="copy", block_hash=None, wait=0.0, log=print, record=None):
+    """Retry due pages (optionally of one block) until none is due.
+
+    With `wait` > 0, also sleeps for pages whose backoff ends within `wait`
+    seconds from now. Returns {"retried", "recovered", "failed"}.
+    """
+    deadline = time.monotonic() + wait
+    result = {"retried": 0, "recovered": 0, "failed": 0}
+    while True:
+        due = get_due_retries(RETRY_QUEUE_CONFIG["batch_size"], block_hash)
+        if due:
+            for page_hash, base_index, attempts in due:
+                result["retried"] += 1
+                if retry_page(page_hash, base_index, write_mode, record):
+                    result["recovered"] += 1
+                else:
+                    result["failed"] += 1
+                    log(f"   🔁 Page {page_hash[:16]}…@{base_index} failed again (attempt {attempts + 1})")
+            continue
+        delay = seconds_until_next_retry(block_hash)
+        remaining = deadline - time.monotonic()
+        if delay is None or delay > remaining:
+            return result
+        time.sleep(max(delay, 0.0) + 0.1)
+
+
+def format_retry_summary(summary=None):
+    summary = summary or get_retry_queue_summary()
+    if not (summary["pending"] or summary["exhausted"]):
+        return "🔁 Retry queue: empty"
+    return (f"🔁 Retry queue: {summary['pending']} page(s) pending ({summary['due']} due now), "
+            f"{summary['exhausted']} exhausted, across {summary['blocks']} block(s) "
+            f"#{summary['min_height']}..#{summary['max_height']}; drain with dataFetch.py --drain-retries")
@@ -0,0 +1,125 @@
+import argparse
+import json
+
+import psycopg2
+
+from app import BLOCK_LIST_LATEST, BLOCK_LIST_OLDER
+from config import DB_CONFIG
+from db_operations import decode_hex
+from dbSetup import SECONDARY_INDEXES
+from explorer_data import BLOCK_DETAIL, TX_DETAIL
+
+# Times every query behind the explorer routes (plus the spend and address
+# lookups the indexes are meant for) with the secondary indexes in place and
+# then with them dropped inside a transaction that is rolled back.
+# DROP INDEX takes an exclusive lock until the rollback: run this against a
+# copy or a quiet database, not a live explorer.
+
+SPEND_LOOKUP = "SELECT txid, input_index FROM bitcoin_inputs WHERE prev_txid = %s AND prev_vout = %s;"
+ADDRESS_LOOKUP = "SELECT txid, output_index, value FROM bitcoin_outputs WHERE address = %s;"
+
+
+def pick_samples(cur):
+    """Representative parameters: the busiest block, its largest tx, a spent outpoint, an address."""
+    cur.execute("""
+        SELECT block_hash, height FROM bitcoin_block_stats
+        ORDER BY tx_count DESC LIMIT 1
+    """)
+    row = cur.fetchone()
+    if row is None:
+        raise SystemExit("❌ No indexed blocks to time against; run dataFetch.py first.")
+    block_hash, height = row
+    cur.execute("""
+        SELECT i.txid, COUNT(*) FROM bitcoin_inputs i
+        JOIN bitcoin_transactions t USING (txid)
+        WHERE t.block_hash = %s GROUP BY i.txid ORDER BY COUNT(*) DESC LIMIT 1
+    """, (block_hash,))
+    txid = cur.fetchone()[0]
+    cur.execute("""
+        SELECT prev_txid, prev_vout FROM bitcoin_inputs
+        WHERE txid = %s AND NOT is_coinbase LIMIT 1
+    """, (txid,))
+    prevout = cur.fetchone() or (txid, 0)
+    cur.execute("SELECT address FROM bitcoin_outputs WHERE txid = %s AND address IS NOT NULL LIMIT 1", (txid,))
+    address = (cur.fetchone() or [None])[0]
+    return {"block_hash": block_hash, "height": height, "txid": txid, "prevout": prevout, "address": address}
+
+
+def route_queries(samples, page_size=50):
+    return {
+        "index": [
+            ("latest page", BLOCK_LIST_LATEST, (page_size + 1,)),
+            ("older page", BLOCK_LIST_OLDER, (samples["height"], page_size + 1)),
+        ],
+        "block_details": [
+            ("block + txs", BLOCK_DETAIL, (samples["block_hash"],)),
+        ],
+        "transaction_details": [
+            ("tx + vins/vouts", TX_DETAIL, {"txid": samples["txid"], "height": samples["height"]}),
+        ],
+        "lookups": [
+            ("spend of outpoint", SPEND_LOOKUP, tuple(samples["prevout"])),
+            ("outputs by address", ADDRESS_LOOKUP, (samples["address"],)),
+        ],
+    }
+
+
+def time_query(cur, sql, params, repeat):
+    """Best-of-N execution time (ms) from EXPLAIN ANALYZE, plus the top plan node."""
+    best, node = None, None
+    for _ in range(repeat):
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql.strip().rstrip(";"), params)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        elapsed = plan[0]["Execution Time"]
+        if best is None or elapsed < best:
+            best, node = elapsed, plan[0]["Plan"]
+    # Report the first scan node so Seq Scan vs Index Scan is visible
+    while node.get("Plans") and "Scan" not in node["Node Type"]:
+        node = node["Plans"][0]
+    return best, node["Node Type"]
+
+
+def time_routes(cur, queries, repeat):
+    return {
+        route: [(label, *time_query(cur, sql, params, repeat)) for label, sql, params in items]
+        for route, items in queries.items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Explorer query timings with and without secondary indexes.")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query (best is reported)")
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    try:
+        samples = pick_samples(cur)
+        queries = route_queries(samples)
+        if samples["address"] is None:
+            queries["lookups"] = queries["lookups"][:1]
+
+        after = time_routes(cur, queries, args.repeat)
+
+        # "Before": same queries with the secondary indexes dropped, then rolled back
+        for name, _ in SECONDARY_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name};")
+        before = time_routes(cur, queries, args.repeat)
+        conn.rollback()
+    finally:
+        cur.close()
+        conn.close()
+
+    print(f"⏱️  Query timings (best of {args.repeat}) for block #{samples['height']}, tx {decode_hex(samples['txid'])[:16]}...\n")
+    print(f"{'ROUTE':<22}{'QUERY':<22}{'NO INDEXES':>14}{'INDEXED':>12}{'SPEEDUP':>10}  PLAN")
+    for route, rows in after.items():
+        for (label, ms_after, node_after), (_, ms_before, node_before) in zip(rows, before[route]):
+            speedup = ms_before / ms_after if ms_after else float("inf")
+            print(f"{route:<22}{label:<22}{ms_before:>11.3f} ms{ms_after:>9.3f} ms{speedup:>9.1f}x  "
+                  f"{node_before} → {node_after}")
+
+
+if __name__ == "__main__":
+    main()
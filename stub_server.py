@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline stand-in for the Blockstream API. Serves recorded JSON from a fixture
+# directory laid out like the URL space:
+#
+#   <root>/blocks.json                   -> GET /api/blocks
+#   <root>/block/<hash>.json             -> GET /api/block/<hash>
+#   <root>/block/<hash>/txs/<idx>.json   -> GET /api/block/<hash>/txs/<idx>
+#
+# Point the ingester at it with BLOCKSTREAM_API_URL=http://127.0.0.1:<port>/api.
+# `--throttle-every N` answers every Nth request with 429 + Retry-After so the
+# async engine's adaptive rate limiter can be exercised without the network.
+
+API_PREFIX = "/api"
+
+
+def fixture_path(root, url_path):
+    """Map an API path to its fixture file, refusing anything outside root."""
+    if not url_path.startswith(API_PREFIX + "/"):
+        return None
+    relative = url_path[len(API_PREFIX) + 1:].strip("/")
+    path = os.path.realpath(os.path.join(root, relative + ".json"))
+    if not path.startswith(os.path.realpath(root) + os.sep):
+        return None
+    return path
+
+
+def make_handler(root, throttle_every=0, retry_after=1):
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def do_GET(self):
+            with lock:
+                counter["n"] += 1
+                throttled = throttle_every and counter["n"] % throttle_every == 0
+            if throttled:
+                self._send(429, b"Too Many Requests", {"Retry-After": str(retry_after)})
+                return
+
+            path = fixture_path(root, self.path.split("?", 1)[0])
+            if path is None or not os.path.isfile(path):
+                self._send(404, b"Not Found")
+                return
+            with open(path, "rb") as f:
+                self._send(200, f.read(), {"Content-Type": "application/json"})
+
+        def _send(self, status, body, headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return StubHandler
+
+
+def write_fixture(root, url_path, data):
+    path = fixture_path(root, url_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def record_block(root, block_hash):
+    """Record a block header and all its tx pages from the live API into root."""
+    from api_client import get_api_data
+    from config import API_BASE_URL
+
+    block = get_api_data(f"{API_BASE_URL}/block/{block_hash}")
+    if not block:
+        raise RuntimeError(f"Could not fetch block {block_hash}")
+    write_fixture(root, f"{API_PREFIX}/block/{block_hash}", block)
+    for idx in range(0, block['tx_count'], 25):
+        page = get_api_data(f"{API_BASE_URL}/block/{block_hash}/txs/{idx}")
+        if page is None:
+            raise RuntimeError(f"Could not fetch page {idx} of block {block_hash}")
+        write_fixture(root, f"{API_PREFIX}/block/{block_hash}/txs/{idx}", page)
+    return block
+
+
+def record_blocks(root, block_hashes):
+    blocks = [record_block(root, block_hash) for block_hash in block_hashes]
+    write_fixture(root, f"{API_PREFIX}/blocks", sorted(blocks, key=lambda b: -b['height']))
+    print(f"📼 Recorded {len(blocks)} block(s) into {root}")
+
+
+def serve(root, host="127.0.0.1", port=8099, throttle_every=0, retry_after=1):
+    server = ThreadingHTTPServer((host, port), make_handler(root, throttle_every, retry_after))
+    print(f"🧪 Serving recorded Blockstream JSON from {root} at http://{host}:{port}{API_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or serve Blockstream API fixtures.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="record blocks from the live API")
+    rec.add_argument("--root", default="fixtures")
+    rec.add_argument("block_hashes", nargs="+")
+
+    srv = sub.add_parser("serve", help="serve recorded fixtures")
+    srv.add_argument("--root", default="fixtures")
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8099)
+    srv.add_argument("--throttle-every", type=int, default=0)
+    srv.add_argument("--retry-after", type=int, default=1)
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record_blocks(args.root, args.block_hashes)
+    else:
+        serve(args.root, args.host, args.port, args.throttle_every, args.retry_after)
+
+
+if __name__ == "__main__":
+    main()
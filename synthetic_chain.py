@@ -0,0 +1,109 @@
+import os
+import random
+
+# Synthetic, Blockstream-shaped block and transaction JSON used by the benchmarks.
+# The shapes mirror what /api/block/{hash} and /api/block/{hash}/txs/{idx} return.
+
+PAGE_SIZE = 25
+
+
+def random_hash():
+    return os.urandom(32).hex()
+
+
+def make_output(value=None):
+    """A P2WPKH output with a fake (but well-formed looking) address."""
+    program = os.urandom(20).hex()
+    return {
+        "scriptpubkey": "0014" + program,
+        "scriptpubkey_asm": f"OP_0 OP_PUSHBYTES_20 {program}",
+        "scriptpubkey_type": "v0_p2wpkh",
+        "scriptpubkey_address": "bc1q" + program[:38],
+        "value": value if value is not None else random.randint(546, 50_000_000),
+    }
+
+
+def make_input(witness_items=2, witness_size=72):
+    return {
+        "txid": random_hash(),
+        "vout": random.randint(0, 3),
+        "prevout": make_output(),
+        "scriptsig": "",
+        "scriptsig_asm": "",
+        "witness": [os.urandom(witness_size).hex() for _ in range(witness_items)],
+        "is_coinbase": False,
+        "sequence": 4294967293,
+    }
+
+
+def make_coinbase_input(height):
+    # BIP34 height push: minimal little-endian bytes, sign bit clear (3 bytes on mainnet today)
+    size = max(1, (height.bit_length() + 8) // 8)
+    push = height.to_bytes(size, "little").hex()
+    script = f"{size:02x}" + push + os.urandom(16).hex()
+    return {
+        "txid": "0" * 64,
+        "vout": 4294967295,
+        "prevout": None,
+        "scriptsig": script,
+        "scriptsig_asm": f"OP_PUSHBYTES_{size} {push}",
+        "witness": ["00" * 32],
+        "is_coinbase": True,
+        "sequence": 4294967295,
+    }
+
+
+def make_transaction(height, block_hash, n_inputs=2, n_outputs=2,
+                     witness_items=2, witness_size=72, coinbase=False):
+    if coinbase:
+        vin = [make_coinbase_input(height)]
+    else:
+        vin = [make_input(witness_items, witness_size) for _ in range(n_inputs)]
+    vout = [make_output() for _ in range(n_outputs)]
+    fee = 0 if coinbase else random.randint(200, 20_000)
+    return {
+        "txid": random_hash(),
+        "version": 2,
+        "locktime": 0,
+        "vin": vin,
+        "vout": vout,
+        "size": 110 + 150 * len(vin) + 31 * len(vout),
+        "weight": 4 * (110 + 68 * len(vin) + 31 * len(vout)),
+        "fee": fee,
+        "status": {
+            "confirmed": True,
+            "block_height": height,
+            "block_hash": block_hash,
+        },
+    }
+
+
+def make_block(height, tx_count, previous_block_hash=None, **tx_kwargs):
+    """Return (header, transactions) for a synthetic block of `tx_count` txs."""
+    block_hash = random_hash()
+    header = {
+        "id": block_hash,
+        "height": height,
+        "version": 0x20000000,
+        "timestamp": 1_700_000_000 + height * 600,
+        "tx_count": tx_count,
+        "size": 0,
+        "weight": 0,
+        "merkle_root": random_hash(),
+        "previousblockhash": previous_block_hash or random_hash(),
+        "mediantime": 1_700_000_000 + height * 600 - 3600,
+        "nonce": random.randint(0, 2 ** 32 - 1),
+        "bits": 386089497,
+        "difficulty": 1,
+    }
+    transactions = [
+        make_transaction(height, block_hash, coinbase=(i == 0), **tx_kwargs)
+        for i in range(tx_count)
+    ]
+    return header, transactions
+
+
+def paginate(transactions, page_size=PAGE_SIZE):
+    """Yield (base_index, page) pairs the way the txs/{idx} endpoint serves them."""
+    for idx in range(0, len(transactions), page_size):
+        yield idx, transactions[idx:idx + page_size]
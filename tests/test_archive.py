@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import archive
+
+BLOCK = {"id": "h100", "height": 100, "tx_count": 60}   # pages 0, 25, 50
+PAGE = [{"txid": "t"}]
+
+
+class ArchiveRecorderTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.recorder = archive.ArchiveRecorder(self.directory)
+
+    def files(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_complete_block_is_published(self):
+        self.assertTrue(self.recorder.record_header(BLOCK, [0, 25, 50]))
+        self.assertTrue(self.recorder.is_recording("h100"))
+        for idx in (0, 25, 50):
+            self.recorder.record_page("h100", idx, PAGE)
+        self.recorder.finish_block("h100", complete=True)
+
+        self.assertEqual(self.files(), ["100-h100.ndjson.gz"])
+        header, pages = archive.read_archive(os.path.join(self.directory, "100-h100.ndjson.gz"))
+        self.assertEqual((header, sorted(pages)), (BLOCK, [0, 25, 50]))
+
+    def test_resumed_block_is_not_archived(self):
+        self.assertFalse(self.recorder.record_header(BLOCK, [50]))
+        self.assertFalse(self.recorder.is_recording("h100"))
+        self.assertEqual(self.recorder.blocks_resumed, [100])
+        self.assertEqual(self.files(), [])
+
+    def test_incomplete_block_is_dropped(self):
+        self.recorder.record_header(BLOCK, [0, 25, 50])
+        self.recorder.record_page("h100", 0, PAGE)
+        self.recorder.finish_block("h100", complete=False)
+
+        self.assertEqual(self.files(), [])
+        self.assertEqual(self.recorder.blocks_incomplete, [100])
+
+    def test_close_drops_unfinished_blocks(self):
+        self.recorder.record_header(BLOCK, [0, 25, 50])
+        self.recorder.close()
+
+        self.assertEqual(self.files(), [])
+        self.assertEqual(self.recorder.blocks_written, 0)
+        self.assertIn("1 incomplete block(s) dropped (#100)", self.recorder.summary())
+
+
+class ReplayArchiveTest(unittest.TestCase):
+    def test_truncated_archive_fails(self):
+        with mock.patch.object(archive, "read_archive", return_value=(BLOCK, {0: PAGE, 25: PAGE})), \
+                mock.patch.object(archive, "begin_block_sync", return_value=[0, 25, 50]), \
+                mock.patch.object(archive, "insert_flattened_rows") as insert:
+            with self.assertRaisesRegex(ValueError, "lacks 1 missing page"):
+                archive.replay_archive("100-h100.ndjson.gz")
+        insert.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from unittest import mock
+
+import pipeline
+
+
+class RetryFailedPagesTest(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = pipeline.RangeSyncPipeline(100, 101, checkpoint_name=None)
+        self.pipeline.blocks = {
+            "h100": {"id": "h100", "height": 100, "tx_count": 30},
+            "h101": {"id": "h101", "height": 101, "tx_count": 30},
+        }
+        self.drain = mock.Mock(return_value={"retried": 1, "recovered": 1, "failed": 0})
+        patches = [
+            mock.patch.object(pipeline, "drain_retry_queue", self.drain),
+            mock.patch.object(pipeline, "is_block_fully_synced", side_effect=lambda h, n: h == "h100"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_only_this_runs_blocks_are_drained(self):
+        result = self.pipeline.retry_failed_pages(wait=0)
+
+        self.assertEqual([c.kwargs["block_hash"] for c in self.drain.call_args_list], ["h100", "h101"])
+        self.assertEqual(result, {"retried": 2, "recovered": 2, "failed": 0})
+        self.assertEqual(self.pipeline.completed, [100])
+        self.assertEqual(list(self.pipeline.blocks), ["h101"])
+
+
+if __name__ == "__main__":
+    unittest.main()
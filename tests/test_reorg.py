@@ -0,0 +1,69 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import follower
+import pipeline
+import reorg
+
+# Stored chain 100..104; the API's chain agrees up to 101 and then switches to
+# a competing branch, so the fork is three blocks deep below #105.
+STORED = {h: f"s{h}" for h in range(100, 105)}
+REMOTE = {h: (f"s{h}" if h <= 101 else f"a{h}") for h in range(100, 106)}
+
+
+def remote_text(url):
+    if "/block-height/" in url:
+        return REMOTE.get(int(url.rsplit("/", 1)[1]))
+    return None
+
+
+class DeepReorgTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = mock.Mock()
+        self.calls.rollback_to_height.return_value = ["s104", "s103", "s102"]
+        self.calls.sync_height_range.return_value = SimpleNamespace(completed=[102, 103, 104], skipped=[])
+        patches = [
+            mock.patch.object(reorg, "get_block_hash", side_effect=STORED.get),
+            mock.patch.object(reorg, "get_api_text", side_effect=remote_text),
+            mock.patch.object(reorg, "rollback_to_height", self.calls.rollback_to_height),
+            mock.patch.object(pipeline, "sync_height_range", self.calls.sync_height_range),
+            mock.patch.object(follower, "get_api_text", side_effect=remote_text),
+            mock.patch.object(follower, "get_api_data", side_effect=lambda url: self.header(105)),
+            mock.patch.object(follower, "is_block_fully_synced", return_value=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    @staticmethod
+    def header(height):
+        return {"id": REMOTE[height], "height": height, "previousblockhash": REMOTE[height - 1],
+                "tx_count": 1, "timestamp": 1_700_000_000}
+
+    def test_fork_point_is_below_every_replaced_block(self):
+        self.assertEqual(reorg.find_fork_point(104), 101)
+
+    def test_follower_resyncs_winning_chain_before_the_detecting_block(self):
+        tip_follower = follower.TipFollower(self.calls.sync_block, status_file="")
+
+        self.assertTrue(tip_follower.sync_height(105))
+
+        self.assertEqual(self.calls.mock_calls, [
+            mock.call.rollback_to_height(101),
+            mock.call.sync_height_range(102, 104, checkpoint_name=None),
+            mock.call.sync_block(self.header(105)),
+        ])
+        self.assertEqual(tip_follower.reorgs, 1)
+
+    def test_incomplete_resync_is_reported(self):
+        self.calls.sync_height_range.return_value = SimpleNamespace(completed=[102], skipped=[103])
+        self.assertFalse(reorg.resync_after_rollback(101, 105))
+
+    def test_one_block_reorg_needs_no_resync(self):
+        self.assertTrue(reorg.resync_after_rollback(104, 105))
+        self.calls.sync_height_range.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()